@@ -1,5 +1,5 @@
 from functools import lru_cache
-from typing import Final
+from typing import Final, Literal
 
 from pydantic import PostgresDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -22,6 +22,16 @@ class Settings(BaseSettings):
     DB_USER: str = "postgres"
     DB_PASSWORD: str = "postgres"
 
+    # Connection pool (размер по умолчанию делит бюджет соединений между воркерами)
+    WEB_CONCURRENCY: int = 1  # Количество процессов приложения (как у uvicorn/gunicorn)
+    DB_MAX_CONNECTIONS: int = 30  # Бюджет соединений с БД на все процессы
+    DB_POOL_SIZE: int | None = None  # Постоянных соединений (None - треть доли процесса)
+    DB_MAX_OVERFLOW: int | None = None  # Дополнительных соединений (None - остаток доли)
+    DB_POOL_TIMEOUT: float = 30.0  # Ожидание свободного соединения (сек)
+    DB_POOL_RECYCLE: int = 1800  # Пересоздание соединений (сек)
+    DB_POOL_PRE_PING: bool = True  # Проверка соединения перед выдачей
+    DB_POOL_LATENCY_WINDOW: int = 1024  # Замеров времени ожидания для перцентилей
+
     # Application settings
     APP_NAME: str = "FastAPI Gemini Clone"
     DEBUG: bool = False
@@ -34,6 +44,126 @@ class Settings(BaseSettings):
     # API keys
     API_KEY: str | None = None
 
+    # LLM провайдер: "gemini" или офлайн "fake" для бенчмарков
+    LLM_PROVIDER: Literal["gemini", "fake"] = "gemini"
+    FAKE_PROVIDER_TTFT_MS: int = 300  # Задержка до первого чанка
+    FAKE_PROVIDER_INTER_TOKEN_MS: int = 20  # Задержка между чанками
+    FAKE_PROVIDER_ERROR_RATE: float = 0.0  # Доля запросов, завершающихся 503
+    FAKE_PROVIDER_CHUNK_SIZE: int = 16  # Размер чанка в символах
+    FAKE_PROVIDER_RESPONSE_WORDS: int = 200  # Длина ответа в словах
+    FAKE_PROVIDER_SEED: int = 42
+
+    # Объединение чанков в SSE события (можно переопределить в запросе)
+    SSE_COALESCE_WINDOW_MS: int = 30
+    SSE_COALESCE_MAX_BYTES: int = 2048
+
+    # Возобновляемые потоки ответа (Last-Event-ID)
+    STREAM_RESUME_BUFFER_EVENTS: int = 2048  # Размер кольцевого буфера событий на поток
+    STREAM_RESUME_GRACE_SECONDS: float = 15.0  # Ожидание переподключения до отмены генерации
+    STREAM_RESUME_RETENTION_SECONDS: float = 60.0  # Хранение завершённого потока
+
+    # Подписки на генерации чата (другие вкладки и устройства)
+    CHAT_HUB_QUEUE_SIZE: int = 256  # Очередь событий на подписчика, при переполнении он отключается
+    CHAT_HUB_KEEPALIVE_SECONDS: float = 15.0  # Интервал keepalive комментариев
+
+    # WebSocket транспорт чатов
+    WS_AUTH_TIMEOUT_SECONDS: float = 10.0  # Ожидание кадра auth после подключения
+    WS_MAX_CONCURRENT_STREAMS: int = 4  # Одновременных ответов на соединение
+    WS_SETTINGS_TTL_SECONDS: float = 30.0  # Кэш настроек пользователя в соединении
+
+    # Пакетная обработка промптов
+    BATCH_MAX_ITEMS: int = 5000  # Максимум промптов в одном задании
+    BATCH_CONCURRENCY: int = 8  # Одновременных запросов к модели по умолчанию
+    BATCH_MAX_CONCURRENCY: int = 32  # Верхняя граница конкурентности задания
+    BATCH_INSERT_SIZE: int = 200  # Строк messages в одном INSERT
+    BATCH_JOB_RETENTION_SECONDS: int = 3600  # Хранение завершённого задания
+
+    # Checkpoint частичного ответа во время стриминга (0 - отключить условие)
+    STREAM_CHECKPOINT_TOKENS: int = 200  # Каждые N токенов
+    STREAM_CHECKPOINT_INTERVAL_MS: int = 2000  # Или каждые T миллисекунд
+    STREAM_ORPHAN_TIMEOUT_SECONDS: int = 900  # Время без checkpoint'ов, после которого streaming ответ считается зависшим
+    STREAM_ORPHAN_SWEEP_INTERVAL_SECONDS: int = 300  # Период проверки зависших ответов
+
+    # Write-behind запись сообщений: одна транзакция на пачку со всех запросов
+    MESSAGE_WRITE_BEHIND_ENABLED: bool = False
+    MESSAGE_WRITE_BEHIND_MAX_ROWS: int = 500  # Сброс при наборе пачки
+    MESSAGE_WRITE_BEHIND_FLUSH_MS: int = 5  # Или раз в интервал (мс)
+
+    # Gemini client pool
+    GEMINI_CLIENT_POOL_SIZE: int = 256  # Максимум клиентов (уникальных ключей) в пуле
+    GEMINI_CLIENT_TTL_SECONDS: int = 1800  # Время простоя до вытеснения клиента
+
+    # Кэш проверок API ключей (по отпечатку ключа)
+    API_KEY_VALIDATION_CACHE_SIZE: int = 1024
+    API_KEY_VALIDATION_TTL_SECONDS: int = 600  # Валидный ключ
+    API_KEY_INVALID_TTL_SECONDS: int = 60  # Отклонённый ключ
+
+    # Conversation context
+    CONTEXT_TOKEN_BUDGET: int = 8000  # Бюджет истории по умолчанию (токены)
+    CONTEXT_MODEL_TOKEN_BUDGETS: dict[str, int] = {
+        "gemini-2.5-flash-lite": 8000,
+        "gemini-2.5-flash": 16000,
+        "gemini-3-flash-preview": 16000,
+    }
+    CONTEXT_MAX_MESSAGES: int = 200  # Максимум сообщений, читаемых из БД
+    CONTEXT_CACHE_SIZE: int = 1024  # Количество чатов в кэше истории
+
+    # Выдача сообщений чата
+    CHAT_MESSAGES_WINDOW: int = 50  # Последних сообщений в GET /chats/{id}, остальные - через /messages
+
+    # Completion cache (точные совпадения запросов)
+    COMPLETION_CACHE_ENABLED: bool = False
+    COMPLETION_CACHE_MAX_ENTRIES: int = 1024
+    COMPLETION_CACHE_TTL_SECONDS: int = 300  # TTL по умолчанию
+    COMPLETION_CACHE_MODEL_TTLS: dict[str, int] = {}  # TTL по моделям (0 - выключен)
+
+    # Объединение одинаковых одновременных запросов к Gemini
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # Планировщик upstream запросов (лимиты на каждый API ключ)
+    SCHEDULER_ENABLED: bool = True
+    GEMINI_RPM_LIMIT: int = 60  # Запросов в минуту на ключ
+    GEMINI_TPM_LIMIT: int = 1_000_000  # Токенов в минуту на ключ
+    GEMINI_QUEUE_MAX_DEPTH: int = 100  # Максимум ожидающих запросов на ключ
+    SCHEDULER_LATENCY_WINDOW: int = 1024  # Замеров времени ожидания для перцентилей
+
+    # Fallback между моделями и хеджирование запросов
+    MODEL_FALLBACK_ENABLED: bool = True  # Резервная модель при 429/5xx
+    MODEL_FALLBACKS: dict[str, str] = {
+        "gemini-3-flash-preview": "gemini-2.5-flash",
+        "gemini-2.5-flash": "gemini-2.5-flash-lite",
+        "gemini-2.5-flash-lite": "gemini-2.5-flash",
+    }
+    HEDGING_ENABLED: bool = False  # Резервный запрос при медленном первом токене
+    HEDGE_TTFT_PERCENTILE: float = 0.95  # Перцентиль TTFT для дедлайна
+    HEDGE_TTFT_WINDOW: int = 200  # Размер окна замеров TTFT на модель
+    HEDGE_MIN_SAMPLES: int = 20  # Минимум замеров для расчёта перцентиля
+    HEDGE_DEFAULT_DELAY_SECONDS: float = 3.0  # Дедлайн, пока замеров мало
+
+    # Учёт токенов сообщений
+    TOKEN_COUNT_BATCH_SIZE: int = 200  # Размер пачки UPDATE token_count
+    TOKEN_COUNT_FLUSH_INTERVAL_MS: int = 500  # Интервал сброса пачки
+    TOKEN_COUNT_BACKFILL_CHUNK: int = 1000  # Размер чанка backfill
+
+    @property
+    def db_connections_per_worker(self) -> int:
+        """Доля бюджета соединений на один процесс."""
+        return max(1, self.DB_MAX_CONNECTIONS // max(1, self.WEB_CONCURRENCY))
+
+    @property
+    def db_pool_size(self) -> int:
+        """Размер пула: явный DB_POOL_SIZE или треть доли процесса."""
+        if self.DB_POOL_SIZE is not None:
+            return self.DB_POOL_SIZE
+        return max(1, self.db_connections_per_worker // 3)
+
+    @property
+    def db_max_overflow(self) -> int:
+        """Overflow пула: явный DB_MAX_OVERFLOW или остаток доли процесса."""
+        if self.DB_MAX_OVERFLOW is not None:
+            return self.DB_MAX_OVERFLOW
+        return max(0, self.db_connections_per_worker - self.db_pool_size)
+
     @property
     def database_url(self) -> str:
         """Формирует PostgreSQL URL для asyncpg."""
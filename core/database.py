@@ -6,35 +6,27 @@
 """
 
 from collections.abc import AsyncGenerator
-from typing import Final
 
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from core.config import settings
+from core.pool import InstrumentedPool
 
-# Настройки connection pool для production
-# Оптимизировано для высокой нагрузки и асинхронной работы
-POOL_SIZE: Final[int] = 10  # Количество постоянных соединений в пуле
-MAX_OVERFLOW: Final[int] = 20  # Дополнительные соединения при пиковой нагрузке
-POOL_TIMEOUT: Final[int] = 30  # Таймаут ожидания соединения (сек)
-POOL_RECYCLE: Final[int] = 1800  # Пересоздание соединений через 30 минут
-POOL_PRE_PING: Final[bool] = True  # Проверка соединения перед использованием
-
-# Создание async engine
+# Создание async engine. Размер пула и таймауты - в Settings (DB_POOL_*),
+# по умолчанию бюджет соединений делится между процессами приложения
 async_engine = create_async_engine(
     url=settings.database_url,
     echo=settings.DEBUG,  # Логирование SQL только в debug режиме
-    poolclass=AsyncAdaptedQueuePool,
-    pool_size=POOL_SIZE,
-    max_overflow=MAX_OVERFLOW,
-    pool_timeout=POOL_TIMEOUT,
-    pool_recycle=POOL_RECYCLE,
-    pool_pre_ping=POOL_PRE_PING,
+    poolclass=InstrumentedPool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
     future=True,  # SQLAlchemy 2.0 стиль
 )
 
@@ -79,6 +71,11 @@ async def init_db() -> None:
         await conn.execute(text("SELECT 1"))
 
 
+def pool_stats() -> dict:
+    """Метрики connection pool: ожидание соединений, overflow, возраст соединений."""
+    return InstrumentedPool.metrics.stats(async_engine.pool)
+
+
 async def close_db() -> None:
     """Закрытие всех соединений с БД при остановке приложения."""
     await async_engine.dispose()
@@ -0,0 +1,24 @@
+"""
+Общие вычисления для метрик мониторинга.
+"""
+
+import math
+from collections.abc import Collection
+
+
+def percentile(samples: Collection[float], percentile: float) -> float:
+    """
+    Перцентиль выборки методом ближайшего ранга.
+
+    Args:
+        samples: Замеры (например, скользящее окно deque)
+        percentile: Доля от 0 до 1 (0.95 - p95)
+
+    Returns:
+        Значение перцентиля или 0.0 для пустой выборки
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, math.ceil(percentile * len(ordered)) - 1)
+    return ordered[max(index, 0)]
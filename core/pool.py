@@ -0,0 +1,128 @@
+"""
+Connection pool с метриками.
+
+Без метрик нехватка соединений видна только по таймаутам запросов.
+InstrumentedPool замеряет каждую выдачу соединения:
+- время ожидания (checkout latency, включая pre-ping и открытие соединения)
+- количество запросов, ожидающих освобождения соединения (пул исчерпан)
+- использование overflow (текущее и максимальное)
+- возраст открытых соединений
+- таймауты ожидания
+"""
+
+import time
+from collections import deque
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+from core.config import settings
+from core.metrics import percentile
+
+
+class PoolMetrics:
+    """Счётчики и скользящее окно времени ожидания соединений."""
+
+    def __init__(self, window: int):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.max_overflow_used = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._samples: deque[float] = deque(maxlen=window)
+        # id записи пула -> время открытия соединения
+        self._connected_at: dict[int, float] = {}
+
+    def record_wait(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+        self._samples.append(seconds)
+
+    def connection_opened(self, connection_record) -> None:
+        self._connected_at[id(connection_record)] = time.monotonic()
+
+    def connection_closed(self, connection_record) -> None:
+        self._connected_at.pop(id(connection_record), None)
+
+    def stats(self, pool: Pool) -> dict:
+        """Метрики пула для мониторинга."""
+        now = time.monotonic()
+        ages = [now - connected_at for connected_at in self._connected_at.values()]
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": getattr(pool, "_max_overflow", 0),
+            "max_overflow_used": self.max_overflow_used,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_seconds_avg": (
+                round(self.wait_seconds_total / self.checkouts, 4) if self.checkouts else 0.0
+            ),
+            "wait_seconds_p95": round(percentile(self._samples, 0.95), 4),
+            "wait_seconds_p99": round(percentile(self._samples, 0.99), 4),
+            "wait_seconds_max": round(self.wait_seconds_max, 4),
+            "connections": len(ages),
+            "connection_age_avg": round(sum(ages) / len(ages), 1) if ages else 0.0,
+            "connection_age_max": round(max(ages), 1) if ages else 0.0,
+        }
+
+
+def _on_connect(dbapi_connection, connection_record) -> None:
+    InstrumentedPool.metrics.connection_opened(connection_record)
+
+
+def _on_close(dbapi_connection, connection_record) -> None:
+    InstrumentedPool.metrics.connection_closed(connection_record)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool, записывающий метрики выдачи соединений.
+
+    Метрики общие для всех экземпляров класса: engine.dispose()
+    пересоздаёт пул, а накопленная статистика должна сохраняться.
+    """
+
+    metrics: PoolMetrics = PoolMetrics(window=settings.DB_POOL_LATENCY_WINDOW)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Пересозданный пул получает слушателей вместе с dispatch исходного
+        if "_dispatch" not in kwargs:
+            event.listen(self, "connect", _on_connect)
+            event.listen(self, "close", _on_close)
+
+    def _exhausted(self) -> bool:
+        """Заняты все соединения, включая overflow: новый запрос будет ждать."""
+        max_overflow = getattr(self, "_max_overflow", -1)
+        if max_overflow < 0:
+            return False
+        return self.checkedout() >= self.size() + max_overflow
+
+    def connect(self):
+        metrics = self.metrics
+        # Ожидающими считаем только запросы к исчерпанному пулу,
+        # а не все выдачи соединений в процессе
+        waits = self._exhausted()
+        if waits:
+            metrics.waiting += 1
+            metrics.max_waiting = max(metrics.max_waiting, metrics.waiting)
+        started = time.monotonic()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            metrics.timeouts += 1
+            raise
+        finally:
+            if waits:
+                metrics.waiting -= 1
+        metrics.record_wait(time.monotonic() - started)
+        metrics.max_overflow_used = max(metrics.max_overflow_used, self.overflow())
+        return connection
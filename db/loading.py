@@ -0,0 +1,48 @@
+"""
+Профили загрузки ORM объектов для endpoints.
+
+Все relationships моделей объявлены с lazy="raise": обращение к незагруженной
+связи - ошибка, а не скрытый запрос, загружающий всё дерево объектов.
+Каждый endpoint явно выбирает профиль, который загружает ровно те колонки
+и связи, что ему нужны.
+
+Usage:
+    result = await db.execute(select(Chat).options(*CHAT_SUMMARY))
+"""
+
+from sqlalchemy.orm import load_only
+
+from models.chat import Chat
+from models.user import User
+
+# Текущий пользователь (get_current_user, /auth/me): без хеша пароля и связей
+CURRENT_USER = (
+    load_only(User.id, User.email, User.is_active, raiseload=True),
+)
+
+# Вход по паролю: только поля для проверки
+LOGIN_USER = (
+    load_only(User.id, User.hashed_password, User.is_active, raiseload=True),
+)
+
+# Метаданные чата для списка и ответов со схемами Chat и ChatWithMessages
+# (сообщения ChatWithMessages выбираются отдельным запросом окна)
+CHAT_SUMMARY = (
+    load_only(
+        Chat.id,
+        Chat.user_id,
+        Chat.title,
+        Chat.system_prompt,
+        Chat.last_message_at,
+        Chat.message_count,
+        Chat.last_message_preview,
+        Chat.created_at,
+        Chat.updated_at,
+        raiseload=True,
+    ),
+)
+
+# Чат для генерации ответа: нужен только системный промпт
+CHAT_FOR_REPLY = (
+    load_only(Chat.id, Chat.system_prompt, raiseload=True),
+)
@@ -0,0 +1,84 @@
+"""
+Keyset (cursor) пагинация.
+
+Страница выбирается условием по паре (timestamp, id), а не OFFSET:
+стоимость запроса не растёт с номером страницы, и новые строки
+не сдвигают уже выданные страницы.
+
+Курсор - непрозрачная для клиента base64url строка с ключом
+последней строки страницы.
+"""
+
+import base64
+import uuid
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import Select, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+
+
+def encode_cursor(timestamp: datetime, row_id: uuid.UUID) -> str:
+    """Кодирует ключ строки в курсор."""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """
+    Декодирует курсор в ключ строки.
+
+    Raises:
+        ValueError: Если курсор повреждён
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        timestamp, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp), uuid.UUID(row_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Некорректный курсор") from e
+
+
+def paginate_desc(
+    query: Select,
+    timestamp_column: InstrumentedAttribute,
+    id_column: InstrumentedAttribute,
+    cursor: str | None,
+    limit: int,
+) -> Select:
+    """
+    Добавляет к запросу keyset условие и сортировку от новых к старым.
+
+    Выбирает limit + 1 строку: лишняя строка означает, что есть следующая страница.
+
+    Raises:
+        ValueError: Если курсор повреждён
+    """
+    if cursor is not None:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(timestamp_column, id_column) < tuple_(timestamp, row_id))
+    return query.order_by(timestamp_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def split_page(
+    rows: list[Any],
+    limit: int,
+    timestamp_attr: str,
+) -> tuple[list[Any], str | None]:
+    """
+    Отделяет страницу от лишней строки и строит курсор следующей страницы.
+
+    Args:
+        rows: Результат запроса из paginate_desc
+        limit: Размер страницы
+        timestamp_attr: Имя атрибута с меткой времени ключа
+
+    Returns:
+        Строки страницы и курсор следующей страницы (None, если страница последняя)
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(getattr(last, timestamp_attr), last.id)
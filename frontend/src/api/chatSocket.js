@@ -0,0 +1,86 @@
+// WebSocket транспорт для потоковых ответов: одно соединение на вкладку,
+// аутентификация один раз, несколько разговоров одновременно
+class ChatSocket {
+  constructor(url, getToken) {
+    this.url = url;
+    this.getToken = getToken;
+    this.socket = null;
+    this.ready = null;
+    this.pending = new Map();
+    this.nextId = 1;
+  }
+
+  connect() {
+    if (this.ready) return this.ready;
+
+    this.ready = new Promise((resolve, reject) => {
+      const socket = new WebSocket(this.url);
+      this.socket = socket;
+
+      socket.onopen = () => {
+        socket.send(JSON.stringify({ type: 'auth', token: this.getToken() }));
+      };
+
+      socket.onmessage = (message) => {
+        const frame = JSON.parse(message.data);
+        if (frame.type === 'ready') {
+          resolve();
+          return;
+        }
+        this.dispatch(frame);
+      };
+
+      socket.onclose = (event) => {
+        const error = new Error(event.reason || 'Соединение закрыто');
+        reject(error);
+        this.pending.forEach(({ onError }) => onError(error));
+        this.pending.clear();
+        this.socket = null;
+        this.ready = null;
+      };
+    });
+
+    return this.ready;
+  }
+
+  dispatch(frame) {
+    const entry = this.pending.get(frame.id);
+    if (!entry) return;
+
+    if (frame.type === 'chunk') {
+      entry.content += frame.content;
+      entry.onChunk(frame.content);
+    } else if (frame.type === 'done' || frame.type === 'interrupted' || frame.type === 'cancelled') {
+      this.pending.delete(frame.id);
+      entry.onDone(entry.content);
+    } else if (frame.type === 'error') {
+      this.pending.delete(frame.id);
+      entry.onError(new Error(frame.message));
+    }
+  }
+
+  async send(chatId, content, role, onChunk) {
+    await this.connect();
+
+    const id = String(this.nextId++);
+    return new Promise((resolve, reject) => {
+      this.pending.set(id, {
+        content: '',
+        onChunk,
+        onDone: resolve,
+        onError: reject,
+      });
+      this.socket.send(JSON.stringify({ type: 'send', id, chat_id: chatId, content, role }));
+    });
+  }
+
+  cancel(id) {
+    this.socket?.send(JSON.stringify({ type: 'cancel', id }));
+  }
+
+  close() {
+    this.socket?.close();
+  }
+}
+
+export default ChatSocket;
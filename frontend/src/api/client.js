@@ -1,10 +1,37 @@
 // API клиент для работы с backend
+import ChatSocket from './chatSocket';
+
 const API_BASE_URL = '/api/v1';
+// Сколько раз переподключаться к потоку ответа после обрыва соединения
+const STREAM_RESUME_ATTEMPTS = 3;
 
 class ApiClient {
   constructor() {
     this.token = localStorage.getItem('access_token');
     this.refreshToken = localStorage.getItem('refresh_token');
+    // Транспорт потоковых ответов: 'sse' (по умолчанию) или 'websocket'
+    this.transport = localStorage.getItem('chat_transport') || 'sse';
+    this.socket = null;
+  }
+
+  setTransport(transport) {
+    this.transport = transport;
+    localStorage.setItem('chat_transport', transport);
+    if (transport !== 'websocket') {
+      this.socket?.close();
+      this.socket = null;
+    }
+  }
+
+  chatSocket() {
+    if (!this.socket) {
+      const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+      this.socket = new ChatSocket(
+        `${protocol}//${window.location.host}${API_BASE_URL}/chats/ws`,
+        () => this.token,
+      );
+    }
+    return this.socket;
   }
 
   setToken(token, refreshToken) {
@@ -19,6 +46,9 @@ class ApiClient {
     this.refreshToken = null;
     localStorage.removeItem('access_token');
     localStorage.removeItem('refresh_token');
+    // Сокет аутентифицирован старым токеном
+    this.socket?.close();
+    this.socket = null;
   }
 
   async request(endpoint, options = {}) {
@@ -131,8 +161,10 @@ class ApiClient {
   }
 
   // Chats endpoints
-  async getChats(limit = 20, offset = 0) {
-    return this.request(`/chats?limit=${limit}&offset=${offset}`);
+  async getChats(limit = 20, cursor = null) {
+    const params = new URLSearchParams({ limit });
+    if (cursor) params.set('cursor', cursor);
+    return this.request(`/chats?${params}`);
   }
 
   async createChat(title) {
@@ -146,6 +178,12 @@ class ApiClient {
     return this.request(`/chats/${chatId}`);
   }
 
+  async getMessages(chatId, limit = 50, cursor = null) {
+    const params = new URLSearchParams({ limit });
+    if (cursor) params.set('cursor', cursor);
+    return this.request(`/chats/${chatId}/messages?${params}`);
+  }
+
   async deleteChat(chatId) {
     return this.request(`/chats/${chatId}`, {
       method: 'DELETE',
@@ -160,6 +198,10 @@ class ApiClient {
   }
 
   async sendMessageStream(chatId, content, role = 'user', onChunk) {
+    if (this.transport === 'websocket') {
+      return this.chatSocket().send(chatId, content, role, onChunk);
+    }
+
     const url = `${API_BASE_URL}/chats/${chatId}/message/stream`;
 
     const response = await fetch(url, {
@@ -176,10 +218,46 @@ class ApiClient {
       throw new Error(error.detail || error.message || 'Ошибка отправки сообщения');
     }
 
+    const state = {
+      streamId: response.headers.get('X-Stream-ID'),
+      lastEventId: 0,
+      fullContent: '',
+      finished: false,
+    };
+
+    let currentResponse = response;
+    for (let attempt = 0; ; attempt++) {
+      try {
+        await this.readEventStream(currentResponse, state, onChunk);
+        if (state.finished) return state.fullContent;
+      } catch (error) {
+        // Ошибки сервера не повторяем, повторяем только обрыв сети
+        if (!(error instanceof TypeError) || !state.streamId) throw error;
+      }
+
+      if (attempt >= STREAM_RESUME_ATTEMPTS || !state.streamId) break;
+
+      // Переподключаемся к тому же потоку: сервер дошлёт пропущенные события
+      await new Promise((resolve) => setTimeout(resolve, 500 * (attempt + 1)));
+      currentResponse = await fetch(
+        `${API_BASE_URL}/chats/${chatId}/message/stream/${state.streamId}`,
+        {
+          headers: {
+            'Authorization': `Bearer ${this.token}`,
+            'Last-Event-ID': String(state.lastEventId),
+          },
+        },
+      );
+      if (!currentResponse.ok) break;
+    }
+
+    return state.fullContent;
+  }
+
+  async readEventStream(response, state, onChunk) {
     const reader = response.body.getReader();
     const decoder = new TextDecoder('utf-8');
     let buffer = '';
-    let fullContent = '';
 
     try {
       while (true) {
@@ -198,22 +276,30 @@ class ApiClient {
 
         for (const line of lines) {
           const trimmedLine = line.trim();
-          if (trimmedLine.startsWith('data: ')) {
+          if (trimmedLine.startsWith('id: ')) {
+            state.lastEventId = Number(trimmedLine.slice(4));
+          } else if (trimmedLine.startsWith('data: ')) {
+            let data;
             try {
-              const data = JSON.parse(trimmedLine.slice(6));
-
-              if (data.type === 'chunk') {
-                fullContent += data.content;
-                // Вызываем callback для каждого чанка
-                onChunk(data.content, data.timestamp);
-              } else if (data.type === 'done') {
-                return fullContent;
-              } else if (data.type === 'error') {
-                throw new Error(data.message);
-              }
+              data = JSON.parse(trimmedLine.slice(6));
             } catch (parseError) {
               // Игнорируем ошибки парсинга JSON для неполных данных
               console.warn('Parse error:', parseError);
+              continue;
+            }
+
+            if (data.type === 'start') {
+              state.streamId = data.stream_id;
+            } else if (data.type === 'chunk') {
+              state.fullContent += data.content;
+              // Вызываем callback для каждого чанка
+              onChunk(data.content);
+            } else if (data.type === 'done' || data.type === 'interrupted') {
+              state.finished = true;
+              return;
+            } else if (data.type === 'error') {
+              state.finished = true;
+              throw new Error(data.message);
             }
           }
         }
@@ -221,8 +307,52 @@ class ApiClient {
     } finally {
       reader.releaseLock();
     }
+  }
+
+  // Подписка на генерации в чате из других вкладок и устройств.
+  // Возвращает функцию отписки.
+  subscribeChatEvents(chatId, onEvent) {
+    const controller = new AbortController();
+
+    const run = async () => {
+      const response = await fetch(`${API_BASE_URL}/chats/${chatId}/events`, {
+        headers: { 'Authorization': `Bearer ${this.token}` },
+        signal: controller.signal,
+      });
+      if (!response.ok) return;
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder('utf-8');
+      let buffer = '';
+      try {
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) break;
+
+          buffer += decoder.decode(value, { stream: true });
+          const lines = buffer.split('\n');
+          buffer = lines.pop() || '';
+
+          for (const line of lines) {
+            const trimmedLine = line.trim();
+            if (!trimmedLine.startsWith('data: ')) continue;
+            try {
+              onEvent(JSON.parse(trimmedLine.slice(6)));
+            } catch (parseError) {
+              console.warn('Parse error:', parseError);
+            }
+          }
+        }
+      } finally {
+        reader.releaseLock();
+      }
+    };
+
+    run().catch((error) => {
+      if (error.name !== 'AbortError') console.warn('Chat events error:', error);
+    });
 
-    return fullContent;
+    return () => controller.abort();
   }
 
   // Settings endpoints
@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
 import {
   Box,
+  Button,
   Container,
   CssBaseline,
   Typography,
@@ -32,6 +33,8 @@ const Chat = () => {
   const navigate = useNavigate();
   const [chat, setChat] = useState(null);
   const [messages, setMessages] = useState([]);
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const [inputValue, setInputValue] = useState('');
   const [loading, setLoading] = useState(true);
   const [sending, setSending] = useState(false);
@@ -40,13 +43,30 @@ const Chat = () => {
   const [showScrollButton, setShowScrollButton] = useState(false);
   const messagesEndRef = useRef(null);
   const inputRef = useRef(null);
+  // Пока эта вкладка сама стримит ответ, события хаба для неё дублируются
+  const sendingRef = useRef(false);
+  const historyCursorSetRef = useRef(false);
 
   const loadChat = useCallback(async () => {
     try {
       setLoading(true);
       const data = await apiClient.getChat(chatId);
+      const latest = data.messages || [];
       setChat(data);
-      setMessages(data.messages || []);
+      // Уже подгруженная старая история сохраняется при перезагрузке окна
+      setMessages(prev => {
+        const windowStart = latest[0]?.created_at;
+        const older = windowStart
+          ? prev.filter(m => m.chat_id === chatId && m.created_at < windowStart)
+          : [];
+        return [...older, ...latest];
+      });
+      // Курсор берётся только при первой загрузке: после неё все сообщения
+      // новее курсора уже есть в списке
+      if (!historyCursorSetRef.current) {
+        historyCursorSetRef.current = true;
+        setOlderCursor(data.messages_cursor);
+      }
       setError('');
     } catch (err) {
       setError(err.message);
@@ -55,20 +75,64 @@ const Chat = () => {
     }
   }, [chatId]);
 
+  const loadOlderMessages = useCallback(async () => {
+    if (!olderCursor || loadingOlder) return;
+
+    try {
+      setLoadingOlder(true);
+      const page = await apiClient.getMessages(chatId, 50, olderCursor);
+      const previousHeight = document.documentElement.scrollHeight;
+      setMessages(prev => [...page.items, ...prev]);
+      setOlderCursor(page.next_cursor);
+      // Сохраняем позицию прокрутки после добавления сообщений сверху
+      requestAnimationFrame(() => {
+        window.scrollBy(0, document.documentElement.scrollHeight - previousHeight);
+      });
+    } catch (err) {
+      setError(err.message);
+    } finally {
+      setLoadingOlder(false);
+    }
+  }, [chatId, olderCursor, loadingOlder]);
+
   const scrollToBottom = useCallback(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, []);
 
   useEffect(() => {
+    setMessages([]);
+    setOlderCursor(null);
+    historyCursorSetRef.current = false;
     loadChat();
   }, [loadChat]);
 
-  // Скролл вниз только при новых сообщениях
+  // Генерации, запущенные в других вкладках и на других устройствах
+  useEffect(() => {
+    let remoteContent = '';
+    return apiClient.subscribeChatEvents(chatId, (event) => {
+      if (sendingRef.current) return;
+
+      if (event.type === 'start') {
+        remoteContent = '';
+        setMessages(prev => [...prev, event.user_message]);
+      } else if (event.type === 'chunk') {
+        remoteContent += event.content;
+        setStreamingMessage(remoteContent);
+      } else if (event.type === 'done' || event.type === 'interrupted' || event.type === 'error') {
+        remoteContent = '';
+        setStreamingMessage('');
+        loadChat();
+      }
+    });
+  }, [chatId, loadChat]);
+
+  // Скролл вниз только при новых сообщениях (не при загрузке старой истории)
+  const lastMessageId = messages[messages.length - 1]?.id;
   useEffect(() => {
-    if (messages.length > 0 || streamingMessage) {
+    if (lastMessageId || streamingMessage) {
       scrollToBottom();
     }
-  }, [messages.length, streamingMessage]);
+  }, [lastMessageId, streamingMessage]);
 
   // Отслеживание прокрутки для кнопки "Вниз"
   useEffect(() => {
@@ -98,6 +162,7 @@ const Chat = () => {
     setMessages(prev => [...prev, userMessage]);
     setInputValue('');
     setSending(true);
+    sendingRef.current = true;
     setStreamingMessage('');
 
     try {
@@ -106,7 +171,7 @@ const Chat = () => {
         chatId,
         userMessage.content,
         'user',
-        (chunk, timestamp) => {
+        (chunk) => {
           assistantContent += chunk;
           setStreamingMessage(assistantContent);
         }
@@ -127,6 +192,7 @@ const Chat = () => {
       setMessages(prev => prev.slice(0, -1));
     } finally {
       setSending(false);
+      sendingRef.current = false;
       inputRef.current?.focus();
     }
   }, [inputValue, sending, chatId, loadChat]);
@@ -298,6 +364,13 @@ const Chat = () => {
           ) : (
             <>
               <Box>
+                {olderCursor && (
+                  <Box sx={{ display: 'flex', justifyContent: 'center', mb: 2 }}>
+                    <Button onClick={loadOlderMessages} disabled={loadingOlder}>
+                      {loadingOlder ? <CircularProgress size={20} /> : 'Показать предыдущие сообщения'}
+                    </Button>
+                  </Box>
+                )}
                 {messages.map((message, index) => renderMessage(message, index))}
                 {streamingMessage && (
                   <Box
@@ -37,7 +37,9 @@ const ChatList = () => {
   const navigate = useNavigate();
   const { user, logout } = useAuth();
   const [chats, setChats] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState('');
   const [dialogOpen, setDialogOpen] = useState(false);
   const [newChatTitle, setNewChatTitle] = useState('');
@@ -51,7 +53,8 @@ const ChatList = () => {
     try {
       setLoading(true);
       const data = await apiClient.getChats();
-      setChats(data);
+      setChats(data.items);
+      setNextCursor(data.next_cursor);
       setError('');
     } catch (err) {
       setError(err.message);
@@ -60,6 +63,21 @@ const ChatList = () => {
     }
   };
 
+  const loadMoreChats = async () => {
+    if (!nextCursor) return;
+
+    try {
+      setLoadingMore(true);
+      const data = await apiClient.getChats(20, nextCursor);
+      setChats((prev) => [...prev, ...data.items]);
+      setNextCursor(data.next_cursor);
+    } catch (err) {
+      setError(err.message);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleCreateChat = async () => {
     if (!newChatTitle.trim()) return;
 
@@ -165,13 +183,33 @@ const ChatList = () => {
                   <ChatIcon sx={{ mr: 2, color: 'primary.main' }} />
                   <ListItemText
                     primary={chat.title}
-                    secondary={new Date(chat.created_at).toLocaleDateString('ru-RU', {
-                      year: 'numeric',
-                      month: 'long',
-                      day: 'numeric',
-                      hour: '2-digit',
-                      minute: '2-digit',
-                    })}
+                    secondary={
+                      <>
+                        {chat.last_message_preview && (
+                          <Typography
+                            component="span"
+                            variant="body2"
+                            color="text.primary"
+                            sx={{
+                              display: 'block',
+                              overflow: 'hidden',
+                              textOverflow: 'ellipsis',
+                              whiteSpace: 'nowrap',
+                            }}
+                          >
+                            {chat.last_message_preview}
+                          </Typography>
+                        )}
+                        {new Date(chat.last_message_at).toLocaleDateString('ru-RU', {
+                          year: 'numeric',
+                          month: 'long',
+                          day: 'numeric',
+                          hour: '2-digit',
+                          minute: '2-digit',
+                        })}
+                        {` · сообщений: ${chat.message_count}`}
+                      </>
+                    }
                   />
                   <ListItemSecondaryAction>
                     <IconButton
@@ -187,6 +225,13 @@ const ChatList = () => {
                   </ListItemSecondaryAction>
                 </ListItem>
               ))}
+              {nextCursor && (
+                <Box sx={{ display: 'flex', justifyContent: 'center', pt: 1 }}>
+                  <Button onClick={loadMoreChats} disabled={loadingMore}>
+                    {loadingMore ? <CircularProgress size={20} /> : 'Загрузить ещё'}
+                  </Button>
+                </Box>
+              )}
             </List>
           )}
         </Paper>
@@ -35,6 +35,7 @@ const SettingsPage = () => {
     api_key: '',
     model: 'gemini-2.5-flash-lite',
     has_api_key: false,
+    system_prompt: '',
   });
 
   useEffect(() => {
@@ -51,6 +52,7 @@ const SettingsPage = () => {
           api_key: '', // Не загружаем ключ для безопасности
           model: data.settings.model || 'gemini-2.5-flash-lite',
           has_api_key: data.settings.has_api_key,
+          system_prompt: data.settings.system_prompt || '',
         });
       }
       setError('');
@@ -70,7 +72,11 @@ const SettingsPage = () => {
     try {
       setTesting(true);
       setError('');
-      await apiClient.testApiKey(settings.api_key);
+      const result = await apiClient.testApiKey(settings.api_key);
+      // Показываем только модели, доступные этому ключу
+      if (result.available_models?.length) {
+        setAvailableModels(result.available_models);
+      }
       setSuccess('API ключ действителен!');
       setTimeout(() => setSuccess(''), 3000);
     } catch (err) {
@@ -88,6 +94,7 @@ const SettingsPage = () => {
       
       const updateData = {
         model: settings.model,
+        system_prompt: settings.system_prompt,
       };
       
       // Отправляем API ключ только если он был изменён
@@ -226,6 +233,19 @@ const SettingsPage = () => {
             </FormHelperText>
           </FormControl>
 
+          <TextField
+            fullWidth
+            multiline
+            minRows={3}
+            maxRows={10}
+            label="Системный промпт"
+            value={settings.system_prompt}
+            onChange={(e) => handleChange('system_prompt', e.target.value)}
+            placeholder="Например: отвечай кратко и по делу"
+            helperText="Инструкция для модели во всех чатах. Оставьте пустым, чтобы не использовать."
+            sx={{ mb: 4 }}
+          />
+
           <Button
             variant="contained"
             startIcon={saving ? <CircularProgress size={20} /> : <SaveIcon />}
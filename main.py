@@ -9,6 +9,7 @@ FastAPI приложение с асинхронной поддержкой SQLA
 - JWT аутентификация
 """
 
+import asyncio
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 from typing import Annotated
@@ -18,23 +19,50 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.database import close_db, get_db_session, init_db
+from core.config import settings
+from core.database import close_db, get_db_session, init_db, pool_stats
 from routers.auth import router as auth_router
+from routers.batches import router as batches_router
+from routers.chat_ws import router as chat_ws_router
 from routers.chats import router as chats_router
 from routers.settings import router as settings_router
+from services.batch_jobs import batch_job_manager
+from services.chat_hub import chat_hub
+from services.completion_cache import completion_cache
+from services.gemini_service import gemini_service
+from services.hedging import ttft_tracker
+from services.message_writer import message_write_buffer
+from services.reply_checkpoints import run_orphan_sweeper
+from services.scheduler import gemini_scheduler
+from services.stream_registry import stream_registry
+from services.token_accounting import token_count_writer
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """
-    Lifespan manager для инициализации и закрытия подключений к БД.
+    Lifespan manager для инициализации и закрытия подключений к БД
+    и пула клиентов Gemini.
 
-    Вызывается при старте и остановке приложения.
+    При старте запускает финализацию ответов, зависших в статусе streaming
+    после падения воркера. Вызывается при старте и остановке приложения.
     """
     # Startup
     await init_db()
+    orphan_sweeper = asyncio.create_task(
+        run_orphan_sweeper(
+            interval=settings.STREAM_ORPHAN_SWEEP_INTERVAL_SECONDS,
+            older_than_seconds=settings.STREAM_ORPHAN_TIMEOUT_SECONDS,
+        )
+    )
     yield
     # Shutdown
+    orphan_sweeper.cancel()
+    await stream_registry.close()
+    await batch_job_manager.close()
+    await gemini_service.close()
+    await message_write_buffer.close()
+    await token_count_writer.close()
     await close_db()
 
 
@@ -63,7 +91,9 @@ security = HTTPBearer(auto_error=False)
 # Подключаем роутеры
 app.include_router(auth_router, prefix="/api/v1")
 app.include_router(chats_router, prefix="/api/v1")
+app.include_router(chat_ws_router, prefix="/api/v1")
 app.include_router(settings_router, prefix="/api/v1")
+app.include_router(batches_router, prefix="/api/v1")
 
 
 @app.get(
@@ -99,6 +129,72 @@ async def db_health_check(db: Annotated[AsyncSession, Depends(get_db_session)])
     }
 
 
+@app.get(
+    "/db/pool",
+    status_code=status.HTTP_200_OK,
+    tags=["Health"],
+    summary="Метрики connection pool",
+    description=(
+        "Занятые и свободные соединения, overflow, число ожидающих соединение "
+        "запросов, время ожидания (avg/p95/p99/max), таймауты и возраст соединений."
+    ),
+)
+async def db_pool_stats() -> dict:
+    """Endpoint с метриками пула соединений с БД."""
+    return pool_stats()
+
+
+@app.get(
+    "/metrics/completion-cache",
+    status_code=status.HTTP_200_OK,
+    tags=["Health"],
+    summary="Статистика кэша ответов",
+    description="Счётчики попаданий и промахов кэша ответов Gemini.",
+)
+async def completion_cache_stats() -> dict[str, int | float | bool]:
+    """Endpoint со статистикой кэша ответов."""
+    return completion_cache.stats()
+
+
+@app.get(
+    "/metrics/scheduler",
+    status_code=status.HTTP_200_OK,
+    tags=["Health"],
+    summary="Статистика очереди запросов к Gemini",
+    description=(
+        "Глубина очереди, время ожидания и число отказов планировщика, "
+        "а также дедлайны хеджирования по TTFT моделей."
+    ),
+)
+async def scheduler_stats() -> dict:
+    """Endpoint со статистикой планировщика upstream запросов."""
+    return {**gemini_scheduler.stats(), "ttft": ttft_tracker.stats()}
+
+
+@app.get(
+    "/metrics/chat-hub",
+    status_code=status.HTTP_200_OK,
+    tags=["Health"],
+    summary="Статистика подписок на генерации чатов",
+    description="Число подписчиков, разосланных событий и отключённых медленных клиентов.",
+)
+async def chat_hub_stats() -> dict:
+    """Endpoint со статистикой хаба событий чатов."""
+    return chat_hub.stats()
+
+
+@app.get(
+    "/metrics/message-writer",
+    status_code=status.HTTP_200_OK,
+    tags=["Health"],
+    summary="Статистика write-behind записи сообщений",
+    description="Размер пачек, число сбросов и ожидающих записи строк.",
+)
+async def message_writer_stats() -> dict:
+    """Endpoint со статистикой буфера записи сообщений."""
+    return message_write_buffer.stats()
+
+
 # =============================================================================
 # Примечание: endpoints для пользователей, чатов и сообщений
 # будут добавлены в отдельных роутерах (routers/)
@@ -0,0 +1,29 @@
+"""add system prompts to chats and user_settings
+
+Revision ID: 20260302_090000_006
+Revises: 20260301_120000_005
+Create Date: 2026-03-02 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '20260302_090000_006'
+down_revision: Union[str, None] = '20260301_120000_005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Добавляет колонки system_prompt для чатов и настроек пользователя."""
+    op.add_column('chats', sa.Column('system_prompt', sa.Text(), nullable=True))
+    op.add_column('user_settings', sa.Column('system_prompt', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Удаляет колонки system_prompt."""
+    op.drop_column('user_settings', 'system_prompt')
+    op.drop_column('chats', 'system_prompt')
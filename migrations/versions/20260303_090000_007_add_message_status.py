@@ -0,0 +1,30 @@
+"""add status to messages
+
+Revision ID: 20260303_090000_007
+Revises: 20260302_090000_006
+Create Date: 2026-03-03 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '20260303_090000_007'
+down_revision: Union[str, None] = '20260302_090000_006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Добавляет статус генерации сообщения (complete/interrupted)."""
+    op.add_column(
+        'messages',
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='complete'),
+    )
+
+
+def downgrade() -> None:
+    """Удаляет статус генерации сообщения."""
+    op.drop_column('messages', 'status')
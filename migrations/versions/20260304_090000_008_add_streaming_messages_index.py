@@ -0,0 +1,32 @@
+"""add partial index on streaming messages
+
+Revision ID: 20260304_090000_008
+Revises: 20260303_090000_007
+Create Date: 2026-03-04 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '20260304_090000_008'
+down_revision: Union[str, None] = '20260303_090000_007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Частичный индекс для поиска незавершённых (streaming) ответов."""
+    op.create_index(
+        'ix_messages_streaming_created',
+        'messages',
+        ['created_at'],
+        postgresql_where=sa.text("status = 'streaming'"),
+    )
+
+
+def downgrade() -> None:
+    """Удаляет частичный индекс незавершённых ответов."""
+    op.drop_index('ix_messages_streaming_created', table_name='messages')
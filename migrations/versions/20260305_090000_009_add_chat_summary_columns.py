@@ -0,0 +1,73 @@
+"""add denormalized message summary to chats
+
+Revision ID: 20260305_090000_009
+Revises: 20260304_090000_008
+Create Date: 2026-03-05 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '20260305_090000_009'
+down_revision: Union[str, None] = '20260304_090000_008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Добавляет время, количество и превью последнего сообщения чата."""
+    op.add_column(
+        'chats',
+        sa.Column(
+            'last_message_at',
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.func.now(),
+        ),
+    )
+    op.add_column(
+        'chats',
+        sa.Column('message_count', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.add_column(
+        'chats',
+        sa.Column('last_message_preview', sa.String(length=200), nullable=True),
+    )
+
+    # Заполняем сводку по существующим сообщениям
+    op.execute("UPDATE chats SET last_message_at = created_at")
+    op.execute(
+        """
+        UPDATE chats SET
+            last_message_at = stats.last_at,
+            message_count = stats.count,
+            last_message_preview = (
+                SELECT LEFT(m.content, 200) FROM messages m
+                WHERE m.chat_id = chats.id AND m.content <> ''
+                ORDER BY m.created_at DESC, m.id DESC
+                LIMIT 1
+            )
+        FROM (
+            SELECT chat_id, MAX(created_at) AS last_at, COUNT(*) AS count
+            FROM messages GROUP BY chat_id
+        ) AS stats
+        WHERE stats.chat_id = chats.id
+        """
+    )
+
+    op.create_index(
+        'ix_chats_user_last_message',
+        'chats',
+        ['user_id', 'last_message_at'],
+    )
+
+
+def downgrade() -> None:
+    """Удаляет сводку по сообщениям чата."""
+    op.drop_index('ix_chats_user_last_message', table_name='chats')
+    op.drop_column('chats', 'last_message_preview')
+    op.drop_column('chats', 'message_count')
+    op.drop_column('chats', 'last_message_at')
@@ -0,0 +1,39 @@
+"""index streaming messages by updated_at
+
+Revision ID: 20260306_090000_010
+Revises: 20260305_090000_009
+Create Date: 2026-03-06 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '20260306_090000_010'
+down_revision: Union[str, None] = '20260305_090000_009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Зависшие ответы ищутся по времени последнего checkpoint'а (updated_at)."""
+    op.drop_index('ix_messages_streaming_created', table_name='messages')
+    op.create_index(
+        'ix_messages_streaming_updated',
+        'messages',
+        ['updated_at'],
+        postgresql_where=sa.text("status = 'streaming'"),
+    )
+
+
+def downgrade() -> None:
+    """Возвращает частичный индекс по created_at."""
+    op.drop_index('ix_messages_streaming_updated', table_name='messages')
+    op.create_index(
+        'ix_messages_streaming_created',
+        'messages',
+        ['created_at'],
+        postgresql_where=sa.text("status = 'streaming'"),
+    )
@@ -3,7 +3,7 @@
 """
 
 from models.chat import Chat
-from models.message import Message, MessageRole
+from models.message import Message, MessageRole, MessageStatus
 from models.session import Session
 from models.user import User
 from models.user_settings import UserSettings
@@ -14,5 +14,6 @@ __all__ = [
     "Chat",
     "Message",
     "MessageRole",
+    "MessageStatus",
     "UserSettings",
 ]
@@ -6,9 +6,10 @@
 """
 
 import uuid
-from typing import TYPE_CHECKING
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import ForeignKey, Index, String, Uuid
+from sqlalchemy import DateTime, ForeignKey, Index, String, Text, Uuid, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from db.base import Base, CreatedAt, UpdatedAt
@@ -29,8 +30,15 @@ class Chat(Base):
         id: UUID первичный ключ
         user_id: Foreign key на владельца чата
         title: Название чата (генерируется автоматически или задаётся пользователем)
+        system_prompt: Системный промпт чата (приоритетнее промпта из настроек)
+        last_message_at: Время последнего сообщения (при создании - время создания)
+        message_count: Количество сообщений в чате
+        last_message_preview: Начало текста последнего сообщения
         created_at: Дата создания чата
-        updated_at: Дата последнего сообщения в чате
+        updated_at: Дата последнего изменения чата
+
+    last_message_at, message_count и last_message_preview денормализованы:
+    их обновляет services.chat_summaries в той же транзакции, что и INSERT сообщений.
 
     Relationships:
         user: Владелец чата
@@ -55,23 +63,50 @@ class Chat(Base):
         default="Новый чат",
         comment="Название чата",
     )
+    system_prompt: Mapped[Optional[str]] = mapped_column(
+        Text,
+        nullable=True,
+        comment="Системный промпт чата",
+    )
+
+    # Сводка по сообщениям (денормализация для списка чатов)
+    last_message_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        comment="Время последнего сообщения",
+    )
+    message_count: Mapped[int] = mapped_column(
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="Количество сообщений",
+    )
+    last_message_preview: Mapped[Optional[str]] = mapped_column(
+        String(200),
+        nullable=True,
+        comment="Начало последнего сообщения",
+    )
 
     # Relationships
     user: Mapped["User"] = relationship(
         "User",
         back_populates="chats",
-        lazy="joined",
+        lazy="raise",
     )
     messages: Mapped[list["Message"]] = relationship(
         "Message",
         back_populates="chat",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        passive_deletes=True,
+        order_by="Message.created_at",
+        lazy="raise",
     )
 
     # Индексы для частых запросов
     __table_args__ = (
         Index("ix_chats_user_created", "user_id", "created_at"),
+        Index("ix_chats_user_last_message", "user_id", "last_message_at"),
         Index("ix_chats_title", "title"),
     )
 
@@ -10,7 +10,7 @@ from datetime import datetime
 from enum import Enum
 from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import DateTime, ForeignKey, Index, String, Text, Uuid
+from sqlalchemy import DateTime, ForeignKey, Index, String, Text, Uuid, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from db.base import Base, CreatedAt
@@ -27,6 +27,15 @@ class MessageRole(str, Enum):
     SYSTEM = "system"
 
 
+class MessageStatus(str, Enum):
+    """Статус генерации сообщения."""
+
+    STREAMING = "streaming"  # Ответ генерируется, content - последний checkpoint
+    COMPLETE = "complete"
+    INTERRUPTED = "interrupted"  # Клиент отключился, сохранён частичный ответ
+    FAILED = "failed"  # Ошибка генерации или воркер упал посреди стриминга
+
+
 class Message(Base):
     """
     Модель сообщения в чате.
@@ -39,7 +48,9 @@ class Message(Base):
         role: Роль отправителя (user/assistant/system)
         content: Текст сообщения
         token_count: Количество токенов (опционально, для статистики)
+        status: Статус генерации (streaming/complete/interrupted/failed)
         created_at: Дата создания сообщения
+        updated_at: Дата последнего изменения (checkpoint ответа)
 
     Relationships:
         chat: Чат, к которому принадлежит сообщение
@@ -73,18 +84,30 @@ class Message(Base):
         nullable=True,
         comment="Количество токенов",
     )
+    status: Mapped[MessageStatus] = mapped_column(
+        String(20),
+        nullable=False,
+        default=MessageStatus.COMPLETE,
+        server_default=MessageStatus.COMPLETE.value,
+        comment="Статус генерации",
+    )
 
     # Relationships
     chat: Mapped["Chat"] = relationship(
         "Chat",
         back_populates="messages",
-        lazy="joined",
+        lazy="raise",
     )
 
     # Индексы для частых запросов
     __table_args__ = (
         Index("ix_messages_chat_created", "chat_id", "created_at"),
         Index("ix_messages_chat_role", "chat_id", "role"),
+        Index(
+            "ix_messages_streaming_updated",
+            "updated_at",
+            postgresql_where=text("status = 'streaming'"),
+        ),
     )
 
     def __repr__(self) -> str:
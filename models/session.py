@@ -86,7 +86,7 @@ class Session(Base):
     user: Mapped["User"] = relationship(
         "User",
         back_populates="sessions",
-        lazy="joined",
+        lazy="raise",
     )
 
     # Индексы для частых запросов
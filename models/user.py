@@ -67,24 +67,30 @@ class User(Base):
         comment="Флаг администратора",
     )
 
-    # Relationships с каскадным удалением
+    # Relationships с каскадным удалением.
+    # lazy="raise": связи не загружаются неявно, каждый endpoint
+    # указывает нужные ему связи профилем загрузки (db/loading.py).
+    # passive_deletes: удаление каскадом выполняет БД (ON DELETE CASCADE)
     sessions: Mapped[list["Session"]] = relationship(
         "Session",
         back_populates="user",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        passive_deletes=True,
+        lazy="raise",
     )
     chats: Mapped[list["Chat"]] = relationship(
         "Chat",
         back_populates="user",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        passive_deletes=True,
+        lazy="raise",
     )
     settings: Mapped[Optional["UserSettings"]] = relationship(
         "UserSettings",
         back_populates="user",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        passive_deletes=True,
+        lazy="raise",
     )
 
     # Индексы для частых запросов
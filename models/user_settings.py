@@ -4,6 +4,7 @@
 Хранит пользовательские настройки:
 - API ключ Google для доступа к Gemini
 - Предпочитаемая модель
+- Системный промпт по умолчанию
 - Другие настройки
 """
 
@@ -28,6 +29,7 @@ class UserSettings(Base):
         user_id: Foreign key на пользователя (уникальный)
         api_key: API ключ Google (опционально, если не задан используется серверный)
         model: Предпочитаемая модель Gemini
+        system_prompt: Системный промпт по умолчанию для всех чатов
         created_at: Дата создания
         updated_at: Дата последнего обновления
 
@@ -66,12 +68,17 @@ class UserSettings(Base):
         nullable=False,
         comment="Предпочитаемая модель Gemini",
     )
+    system_prompt: Mapped[Optional[str]] = mapped_column(
+        Text,
+        nullable=True,
+        comment="Системный промпт по умолчанию",
+    )
 
     # Relationships
     user: Mapped["User"] = relationship(
         "User",
         back_populates="settings",
-        lazy="joined",
+        lazy="raise",
     )
 
     # Индексы
@@ -24,6 +24,7 @@ from core.security import (
     verify_password,
     verify_token,
 )
+from db.loading import CURRENT_USER, LOGIN_USER
 from models.user import User
 from schemas.auth import Token, UserLogin, UserRegister, UserResponse
 
@@ -50,7 +51,10 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    result = await db.execute(select(User).where(User.id == uuid.UUID(user_id)))
+    # Профиль без связей и хеша пароля: запрос выполняется на каждый вызов API
+    result = await db.execute(
+        select(User).options(*CURRENT_USER).where(User.id == uuid.UUID(user_id))
+    )
     user = result.scalar_one_or_none()
 
     if user is None or not user.is_active:
@@ -63,6 +67,21 @@ async def get_current_user(
     return user
 
 
+async def get_streaming_user(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db_session),
+) -> User:
+    """
+    Текущий пользователь для долгих потоковых ответов.
+
+    Сессия запроса закрывается только после отправки ответа, поэтому
+    открытая транзакция проверки токена держала бы соединение из пула
+    всё время стриминга. Здесь она завершается сразу.
+    """
+    await db.commit()
+    return current_user
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(
     user_data: UserRegister,
@@ -75,7 +94,7 @@ async def register(
     """
     # Проверяем существование пользователя с таким email
     result = await db.execute(
-        select(User).where(User.email == user_data.email.lower())
+        select(User.id).where(User.email == user_data.email.lower())
     )
     existing_user = result.scalar_one_or_none()
 
@@ -111,7 +130,7 @@ async def login(
     """
     # Ищем пользователя по email
     result = await db.execute(
-        select(User).where(User.email == form_data.username.lower())
+        select(User).options(*LOGIN_USER).where(User.email == form_data.username.lower())
     )
     user = result.scalar_one_or_none()
 
@@ -157,7 +176,7 @@ async def login_json(
     """
     # Ищем пользователя по email
     result = await db.execute(
-        select(User).where(User.email == credentials.email.lower())
+        select(User).options(*LOGIN_USER).where(User.email == credentials.email.lower())
     )
     user = result.scalar_one_or_none()
 
@@ -215,7 +234,9 @@ async def refresh_token(
         )
 
     # Проверяем существование пользователя
-    result = await db.execute(select(User).where(User.id == uuid.UUID(user_id)))
+    result = await db.execute(
+        select(User).options(*CURRENT_USER).where(User.id == uuid.UUID(user_id))
+    )
     user = result.scalar_one_or_none()
 
     if not user or not user.is_active:
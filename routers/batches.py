@@ -0,0 +1,153 @@
+"""
+Роутер для пакетной обработки промптов.
+
+Endpoints:
+- POST /batches - создать пакетное задание
+- GET /batches/{id} - состояние задания
+- GET /batches/{id}/results - прогресс и результаты потоком NDJSON
+- DELETE /batches/{id} - отменить задание
+
+Все endpoints требуют аутентификацию.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.database import get_db_session
+from db.loading import CHAT_FOR_REPLY
+from models.chat import Chat
+from models.user import User
+from models.user_settings import UserSettings
+from routers.auth import get_current_user, get_streaming_user
+from routers.chats import resolve_system_prompt
+from schemas.batch import BatchCreate, BatchJob
+from services.batch_jobs import BatchChatContext, BatchJobState, batch_job_manager
+from services.context_builder import context_builder
+
+router = APIRouter(prefix="/batches", tags=["Batches"])
+
+
+def _get_job(job_id: str, current_user: User) -> BatchJobState:
+    job = batch_job_manager.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Batch job not found",
+        )
+    return job
+
+
+@router.post("", response_model=BatchJob, status_code=status.HTTP_202_ACCEPTED)
+async def create_batch(
+    batch_data: BatchCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db_session),
+) -> BatchJobState:
+    """
+    Создать пакетное задание.
+
+    Промпты выполняются в фоне с ограниченной конкурентностью,
+    результаты сохраняются в чаты пачками. Прогресс и ответы
+    читаются через GET /batches/{id}/results.
+    """
+    if len(batch_data.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Слишком много промптов в пакете (максимум {settings.BATCH_MAX_ITEMS})",
+        )
+    concurrency = min(
+        batch_data.concurrency or settings.BATCH_CONCURRENCY,
+        settings.BATCH_MAX_CONCURRENCY,
+    )
+
+    # Проверяем, что все чаты принадлежат пользователю - одним запросом
+    chat_ids = {item.chat_id for item in batch_data.items}
+    result = await db.execute(
+        select(Chat).options(*CHAT_FOR_REPLY).where(
+            Chat.id.in_(chat_ids),
+            Chat.user_id == current_user.id
+        )
+    )
+    chats = {chat.id: chat for chat in result.scalars().all()}
+    missing = chat_ids - chats.keys()
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Chat not found: {', '.join(sorted(str(chat_id) for chat_id in missing))}",
+        )
+
+    # Получаем настройки пользователя
+    settings_result = await db.execute(
+        select(UserSettings).where(UserSettings.user_id == current_user.id)
+    )
+    user_settings = settings_result.scalar_one_or_none()
+
+    api_key = user_settings.api_key if user_settings else None
+    model = user_settings.model if user_settings else "gemini-2.5-flash-lite"
+
+    # История каждого чата собирается один раз на задание
+    contexts = {
+        chat_id: BatchChatContext(
+            model=model,
+            api_key=api_key,
+            system_prompt=resolve_system_prompt(chat, user_settings),
+            history=await context_builder.build(db, chat_id, model),
+        )
+        for chat_id, chat in chats.items()
+    }
+
+    # Задание выполняется в фоне: соединение запроса больше не нужно
+    await db.commit()
+
+    return batch_job_manager.start(
+        current_user.id,
+        [(item.chat_id, item.content) for item in batch_data.items],
+        contexts,
+        concurrency,
+    )
+
+
+@router.get("/{job_id}", response_model=BatchJob)
+async def get_batch(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+) -> BatchJobState:
+    """Получить состояние пакетного задания."""
+    return _get_job(job_id, current_user)
+
+
+@router.get("/{job_id}/results")
+async def stream_batch_results(
+    job_id: str,
+    current_user: User = Depends(get_streaming_user),
+) -> StreamingResponse:
+    """
+    Прогресс и результаты задания потоком NDJSON.
+
+    Каждая строка - JSON объект: result (ответ на промпт), error
+    (ошибка промпта) и финальный done со счётчиками. Уже готовые
+    строки отдаются сразу, затем новые по мере выполнения.
+    """
+    job = _get_job(job_id, current_user)
+    return StreamingResponse(
+        job.follow(),
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@router.delete("/{job_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_batch(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+) -> None:
+    """Отменить задание. Уже полученные ответы сохраняются."""
+    job = _get_job(job_id, current_user)
+    if job.task is not None and not job.task.done():
+        job.task.cancel()
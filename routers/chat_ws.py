@@ -0,0 +1,329 @@
+"""
+WebSocket транспорт для чатов.
+
+Endpoints:
+- WS /chats/ws - отправка сообщений и потоковые ответы по одному соединению
+
+Аутентификация выполняется первым кадром {"type": "auth", "token": "<access token>"}.
+Дальше по сокету можно одновременно вести несколько разговоров в разных
+чатах. Соединение живёт не дольше токена: до истечения exp клиент может
+продлить его новым кадром auth, иначе сокет закрывается с кодом 1008.
+
+Кадры клиента:
+- {"type": "send", "id": "<id>", "chat_id": "<uuid>", "content": "...", "role": "user"}
+- {"type": "cancel", "id": "<id>"} - прервать генерацию ответа
+- {"type": "ping"}
+- {"type": "auth", "token": "<access token>"} - продлить аутентификацию
+
+Кадры сервера (id - идентификатор кадра send):
+- {"type": "ready"} - аутентификация прошла (или продлена)
+- {"type": "start" | "chunk" | "done" | "interrupted" | "error", "id": "<id>", ...} -
+  те же события, что и в SSE потоке
+- {"type": "cancelled", "id": "<id>"}
+- {"type": "pong"}
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+from sqlalchemy import select
+
+from core.config import settings
+from core.database import async_session_factory
+from core.security import decode_token
+from db.loading import CHAT_FOR_REPLY
+from models.chat import Chat
+from models.message import MessageRole
+from models.user import User
+from models.user_settings import UserSettings
+from routers.chats import start_reply_stream
+from services.stream_registry import ResumableStream, stream_registry
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/chats", tags=["Chats"])
+
+
+class _ChatSocket:
+    """Состояние одного WebSocket соединения."""
+
+    def __init__(self, websocket: WebSocket, user_id: uuid.UUID):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.streams: dict[str, tuple[ResumableStream, asyncio.Task]] = {}
+        # Разговоры, для которых ещё сохраняется сообщение и запускается генерация
+        self.starting: dict[str, asyncio.Task] = {}
+        self._send_lock = asyncio.Lock()
+        self._settings: UserSettings | None = None
+        self._settings_loaded_at: float | None = None
+
+    async def send_frame(self, frame: str) -> None:
+        # Кадры разных разговоров пишутся из разных задач
+        async with self._send_lock:
+            await self.websocket.send_text(frame)
+
+    async def send_json(self, data: dict) -> None:
+        await self.send_frame(json.dumps(data, ensure_ascii=False))
+
+    async def user_settings(self, db) -> UserSettings | None:
+        """Настройки пользователя, кэшированные на время жизни соединения (с TTL)."""
+        now = time.monotonic()
+        if (
+            self._settings_loaded_at is None
+            or now - self._settings_loaded_at >= settings.WS_SETTINGS_TTL_SECONDS
+        ):
+            result = await db.execute(
+                select(UserSettings).where(UserSettings.user_id == self.user_id)
+            )
+            self._settings = result.scalar_one_or_none()
+            self._settings_loaded_at = now
+        return self._settings
+
+    async def handle_send(self, frame: dict) -> None:
+        """
+        Проверяет кадр send и запускает разговор в отдельной задаче.
+
+        Работа с БД не блокирует приёмный цикл: кадры cancel и ping
+        обрабатываются, пока сохраняется сообщение.
+        """
+        message_id = str(frame.get("id") or "")
+        content = frame.get("content")
+        if not message_id or message_id in self.streams or message_id in self.starting:
+            await self.send_json({"type": "error", "id": message_id, "message": "Некорректный id"})
+            return
+        if not isinstance(content, str) or not content:
+            await self.send_json({"type": "error", "id": message_id, "message": "Пустое сообщение"})
+            return
+        if len(self.streams) + len(self.starting) >= settings.WS_MAX_CONCURRENT_STREAMS:
+            await self.send_json({
+                "type": "error",
+                "id": message_id,
+                "message": "Слишком много одновременных ответов на соединение",
+            })
+            return
+        try:
+            chat_id = uuid.UUID(str(frame.get("chat_id")))
+            role = MessageRole(frame.get("role") or MessageRole.USER.value)
+        except ValueError:
+            await self.send_json({"type": "error", "id": message_id, "message": "Некорректный кадр"})
+            return
+
+        task = asyncio.create_task(self._start(message_id, chat_id, role, content))
+        self.starting[message_id] = task
+        task.add_done_callback(lambda task: self._forget_starting(message_id, task))
+
+    async def _start(
+        self,
+        message_id: str,
+        chat_id: uuid.UUID,
+        role: MessageRole,
+        content: str,
+    ) -> None:
+        """Сохраняет сообщение, запускает генерацию и пересылку её событий."""
+        stream: ResumableStream | None = None
+        try:
+            # Короткая сессия: соединение с БД не удерживается на время ответа
+            async with async_session_factory() as db:
+                result = await db.execute(
+                    select(Chat)
+                    .options(*CHAT_FOR_REPLY)
+                    .where(Chat.id == chat_id, Chat.user_id == self.user_id)
+                )
+                chat = result.scalar_one_or_none()
+                if chat is None:
+                    await self.send_json(
+                        {"type": "error", "id": message_id, "message": "Chat not found"}
+                    )
+                    return
+                stream = await start_reply_stream(
+                    db,
+                    chat,
+                    self.user_id,
+                    await self.user_settings(db),
+                    role,
+                    content,
+                    coalesce_window=settings.SSE_COALESCE_WINDOW_MS / 1000,
+                    coalesce_bytes=settings.SSE_COALESCE_MAX_BYTES,
+                )
+        except asyncio.CancelledError:
+            # Отмена до начала пересылки: генерацию некому читать
+            if stream is not None and stream.task is not None:
+                stream.task.cancel()
+            raise
+        except Exception as e:
+            # Ошибка одного разговора не закрывает сокет с остальными
+            logger.exception("Не удалось начать ответ в чате %s", chat_id)
+            try:
+                await self.send_json({"type": "error", "id": message_id, "message": str(e)})
+            except (WebSocketDisconnect, RuntimeError):
+                pass
+            return
+
+        relay = asyncio.create_task(self._relay(message_id, stream))
+        self.streams[message_id] = (stream, relay)
+        relay.add_done_callback(lambda task: self._forget(message_id, task))
+
+    def _forget_starting(self, message_id: str, task: asyncio.Task) -> None:
+        if self.starting.get(message_id) is task:
+            del self.starting[message_id]
+
+    def _forget(self, message_id: str, relay: asyncio.Task) -> None:
+        """Снимает с учёта завершённую пересылку, если id не занят новой."""
+        entry = self.streams.get(message_id)
+        if entry is not None and entry[1] is relay:
+            del self.streams[message_id]
+
+    async def _relay(self, message_id: str, stream: ResumableStream) -> None:
+        """Пересылает события потока в сокет, помечая их id разговора."""
+        prefix = '{"id":' + json.dumps(message_id) + ","
+        try:
+            async for event in stream_registry.subscribe(stream):
+                # Событие SSE: "id: N\ndata: {...}\n\n" -> кадр {"id": ..., ...}
+                payload = event[event.index("data: ") + 6:-2]
+                await self.send_frame(prefix + payload[1:])
+        except (WebSocketDisconnect, RuntimeError):
+            # Сокет закрыт - приёмный цикл завершит соединение
+            pass
+
+    async def handle_cancel(self, frame: dict) -> None:
+        message_id = str(frame.get("id") or "")
+        starting = self.starting.get(message_id)
+        if starting is not None and not starting.done():
+            del self.starting[message_id]
+            starting.cancel()
+            await self.send_json({"type": "cancelled", "id": message_id})
+            return
+        entry = self.streams.pop(message_id, None)
+        if entry is None:
+            return
+        stream, relay = entry
+        relay.cancel()
+        # Явная отмена: генерация прерывается без grace периода
+        if stream.task is not None:
+            stream.task.cancel()
+        await self.send_json({"type": "cancelled", "id": message_id})
+
+    async def close(self) -> None:
+        # Генерации не отменяем: клиент может переподключиться к потоку по SSE.
+        # Незапущенные разговоры отменяем - id потока клиент ещё не получил
+        tasks = list(self.starting.values())
+        tasks += [relay for _, relay in self.streams.values()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self.starting.clear()
+        self.streams.clear()
+
+
+async def _check_auth_frame(frame: object) -> tuple[uuid.UUID, float] | None:
+    """
+    Проверяет кадр auth.
+
+    Returns:
+        (ID активного пользователя, время истечения токена) или None
+    """
+    if not isinstance(frame, dict) or frame.get("type") != "auth":
+        return None
+
+    payload = decode_token(str(frame.get("token") or ""))
+    if payload is None or payload.get("sub") is None:
+        return None
+    expires_at = payload.get("exp")
+    if not expires_at or expires_at <= time.time():
+        return None
+
+    try:
+        user_id = uuid.UUID(str(payload["sub"]))
+    except ValueError:
+        return None
+    async with async_session_factory() as db:
+        result = await db.execute(
+            select(User.id).where(User.id == user_id, User.is_active.is_(True))
+        )
+        if result.scalar_one_or_none() is None:
+            return None
+    return user_id, float(expires_at)
+
+
+async def _authenticate(websocket: WebSocket) -> tuple[uuid.UUID, float] | None:
+    """Ждёт первый кадр auth. Возвращает ID активного пользователя и exp токена."""
+    try:
+        frame = await asyncio.wait_for(
+            websocket.receive_json(), timeout=settings.WS_AUTH_TIMEOUT_SECONDS
+        )
+    except (asyncio.TimeoutError, ValueError):
+        return None
+    return await _check_auth_frame(frame)
+
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket) -> None:
+    """
+    WebSocket для отправки сообщений и получения потоковых ответов.
+
+    Один сокет обслуживает несколько разговоров одновременно:
+    аутентификация и загрузка настроек - один раз на соединение.
+    """
+    await websocket.accept()
+
+    try:
+        auth = await _authenticate(websocket)
+    except WebSocketDisconnect:
+        return
+    if auth is None:
+        await websocket.close(
+            code=status.WS_1008_POLICY_VIOLATION,
+            reason="Невалидный или истёкший токен",
+        )
+        return
+    user_id, expires_at = auth
+
+    connection = _ChatSocket(websocket, user_id)
+    await connection.send_json({"type": "ready"})
+
+    try:
+        while True:
+            try:
+                # Соединение не переживает токен: ждём кадр не дольше его exp
+                frame = await asyncio.wait_for(
+                    websocket.receive_json(), timeout=max(expires_at - time.time(), 0.0)
+                )
+            except asyncio.TimeoutError:
+                await websocket.close(
+                    code=status.WS_1008_POLICY_VIOLATION,
+                    reason="Срок действия токена истёк",
+                )
+                break
+            except ValueError:
+                await connection.send_json({"type": "error", "message": "Некорректный JSON"})
+                continue
+            if not isinstance(frame, dict):
+                continue
+
+            frame_type = frame.get("type")
+            if frame_type == "send":
+                await connection.handle_send(frame)
+            elif frame_type == "cancel":
+                await connection.handle_cancel(frame)
+            elif frame_type == "ping":
+                await connection.send_json({"type": "pong"})
+            elif frame_type == "auth":
+                # Продление: тот же активный пользователь со свежим токеном
+                auth = await _check_auth_frame(frame)
+                if auth is None or auth[0] != user_id:
+                    await websocket.close(
+                        code=status.WS_1008_POLICY_VIOLATION,
+                        reason="Невалидный или истёкший токен",
+                    )
+                    break
+                expires_at = auth[1]
+                await connection.send_json({"type": "ready"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await connection.close()
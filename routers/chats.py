@@ -2,55 +2,129 @@
 Роутер для управления чатами.
 
 Endpoints:
-- GET /chats - список чатов пользователя
+- GET /chats - список чатов пользователя по активности (cursor пагинация)
 - POST /chats - создать чат
-- GET /chats/{id} - получить чат с сообщениями
+- GET /chats/{id} - получить чат с последними сообщениями
+- GET /chats/{id}/messages - страница сообщений чата (cursor пагинация)
+- PATCH /chats/{id} - обновить название или системный промпт чата
 - DELETE /chats/{id} - удалить чат
-- POST /chats/{id}/message - отправить сообщение (streaming)
+- POST /chats/{id}/message/stream - отправить сообщение (streaming)
+- GET /chats/{id}/message/stream/{stream_id} - переподключиться к потоку
+- GET /chats/{id}/events - подписаться на генерации в чате (SSE)
+- POST /chats/{id}/message - отправить сообщение
 
 Все endpoints требуют аутентификацию.
 """
 
 import asyncio
-import json
+import logging
 import uuid
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
 from fastapi.responses import StreamingResponse
-from sqlalchemy import select
+from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.config import settings
 from core.database import get_db_session
+from db.loading import CHAT_FOR_REPLY, CHAT_SUMMARY
+from db.pagination import paginate_desc, split_page
 from models.chat import Chat
-from models.message import Message, MessageRole
-from routers.auth import get_current_user
+from models.message import Message, MessageRole, MessageStatus
+from routers.auth import get_current_user, get_streaming_user
 from schemas.chat import Chat as ChatSchema
-from schemas.chat import ChatCreate, ChatWithMessages
+from schemas.chat import ChatCreate, ChatUpdate, ChatWithMessages
 from schemas.message import Message as MessageSchema
 from schemas.message import MessageCreate
+from schemas.pagination import Page
+from services.chat_summaries import record_chat_activity
+from services.context_builder import context_builder
 from services.gemini_service import gemini_service
+from services.message_writer import message_row, message_write_buffer
+from services.reply_checkpoints import create_checkpointer
+from services.scheduler import SchedulerRejected
+from services.sse import (
+    DONE_EVENT,
+    INTERRUPTED_EVENT,
+    coalesce_chunks,
+    encode_chunk_event,
+    encode_error_event,
+    encode_event,
+)
+from services.stream_registry import ResumableStream, StreamGone, stream_registry
+from services.token_accounting import TokenUsage, estimate_tokens, token_count_writer
 from models.user import User
+from models.user_settings import UserSettings
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chats", tags=["Chats"])
 
 
-@router.get("", response_model=list[ChatSchema])
+def resolve_system_prompt(chat: Chat, user_settings: UserSettings | None) -> str | None:
+    """Системный промпт чата имеет приоритет над промптом из настроек."""
+    if chat.system_prompt:
+        return chat.system_prompt
+    if user_settings and user_settings.system_prompt:
+        return user_settings.system_prompt
+    return None
+
+
+def _apply_token_usage(assistant_message: Message, usage: TokenUsage) -> None:
+    """Проставляет token_count ответа по usage metadata Gemini или по оценке."""
+    if usage.completion_tokens is not None:
+        assistant_message.token_count = usage.completion_tokens
+    else:
+        assistant_message.token_count = estimate_tokens(assistant_message.content)
+
+
+def _correct_prompt_tokens(
+    user_message: Message,
+    usage: TokenUsage,
+    history: list,
+    system_prompt: str | None,
+) -> None:
+    """
+    Уточняет token_count сообщения пользователя после коммита.
+
+    prompt_token_count равен токенам сообщения, только если в запросе
+    не было истории и системного промпта. Запись идёт пакетом.
+    """
+    if history or system_prompt or usage.prompt_tokens is None:
+        return
+    if usage.prompt_tokens != user_message.token_count:
+        token_count_writer.enqueue(user_message.id, usage.prompt_tokens)
+
+
+@router.get("", response_model=Page[ChatSchema])
 async def get_chats(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db_session),
-    limit: int = 20,
-    offset: int = 0,
-) -> list[Chat]:
-    """Получить список чатов пользователя."""
-    result = await db.execute(
-        select(Chat)
-        .where(Chat.user_id == current_user.id)
-        .order_by(Chat.created_at.desc())
-        .limit(limit)
-        .offset(offset)
-    )
-    return list(result.scalars().all())
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None, description="Курсор из next_cursor предыдущей страницы"),
+) -> dict:
+    """
+    Получить страницу чатов пользователя по последней активности.
+
+    Сортировка по денормализованному last_message_at - проход
+    по индексу ix_chats_user_last_message без агрегации по messages.
+
+    Курсор строится по изменяемой колонке: чат, получивший новое сообщение
+    во время листания, поднимается выше курсора и на следующих страницах
+    не появляется (клиент увидит его в начале списка при обновлении).
+    Повторов нет: last_message_at только растёт, (last_message_at, id)
+    однозначно задают порядок.
+    """
+    query = select(Chat).options(*CHAT_SUMMARY).where(Chat.user_id == current_user.id)
+    try:
+        query = paginate_desc(query, Chat.last_message_at, Chat.id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    result = await db.execute(query)
+    chats, next_cursor = split_page(list(result.scalars().all()), limit, "last_message_at")
+    return {"items": chats, "next_cursor": next_cursor}
 
 
 @router.post("", response_model=ChatSchema, status_code=status.HTTP_201_CREATED)
@@ -63,6 +137,7 @@ async def create_chat(
     chat = Chat(
         user_id=current_user.id,
         title=chat_data.title,
+        system_prompt=chat_data.system_prompt or None,
     )
 
     db.add(chat)
@@ -72,15 +147,107 @@ async def create_chat(
     return chat
 
 
+async def _message_page(
+    db: AsyncSession,
+    chat_id: uuid.UUID,
+    limit: int,
+    cursor: str | None,
+) -> tuple[list[Message], str | None]:
+    """
+    Страница сообщений чата по индексу ix_messages_chat_created.
+
+    Returns:
+        Сообщения в хронологическом порядке и курсор более старых сообщений
+    """
+    query = select(Message).where(Message.chat_id == chat_id)
+    try:
+        query = paginate_desc(query, Message.created_at, Message.id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    result = await db.execute(query)
+    messages, next_cursor = split_page(list(result.scalars().all()), limit, "created_at")
+    messages.reverse()
+    return messages, next_cursor
+
+
 @router.get("/{chat_id}", response_model=ChatWithMessages)
 async def get_chat(
     chat_id: uuid.UUID,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db_session),
+    messages_limit: int = Query(
+        settings.CHAT_MESSAGES_WINDOW,
+        ge=1,
+        le=200,
+        description="Количество последних сообщений",
+    ),
+) -> dict:
+    """
+    Получить чат с последними сообщениями.
+
+    Более старые сообщения загружаются через GET /chats/{id}/messages
+    с курсором messages_cursor.
+    """
+    result = await db.execute(
+        select(Chat).options(*CHAT_SUMMARY).where(
+            Chat.id == chat_id,
+            Chat.user_id == current_user.id
+        )
+    )
+    chat = result.scalar_one_or_none()
+
+    if not chat:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found",
+        )
+
+    messages, messages_cursor = await _message_page(db, chat_id, messages_limit, None)
+    return {
+        **ChatSchema.model_validate(chat).model_dump(),
+        "messages": messages,
+        "messages_cursor": messages_cursor,
+    }
+
+
+@router.get("/{chat_id}/messages", response_model=Page[MessageSchema])
+async def get_messages(
+    chat_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db_session),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = Query(None, description="Курсор из next_cursor предыдущей страницы"),
+) -> dict:
+    """
+    Получить страницу сообщений чата.
+
+    Страницы идут от новых сообщений к старым, сообщения внутри страницы -
+    в хронологическом порядке. next_cursor указывает на более старые сообщения.
+    """
+    owned = await db.execute(
+        select(Chat.id).where(Chat.id == chat_id, Chat.user_id == current_user.id)
+    )
+    if owned.scalar_one_or_none() is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found",
+        )
+
+    messages, next_cursor = await _message_page(db, chat_id, limit, cursor)
+    return {"items": messages, "next_cursor": next_cursor}
+
+
+@router.patch("/{chat_id}", response_model=ChatSchema)
+async def update_chat(
+    chat_id: uuid.UUID,
+    chat_data: ChatUpdate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db_session),
 ) -> Chat:
-    """Получить чат с сообщениями."""
+    """Обновить название или системный промпт чата."""
     result = await db.execute(
-        select(Chat).where(
+        select(Chat).options(*CHAT_SUMMARY).where(
             Chat.id == chat_id,
             Chat.user_id == current_user.id
         )
@@ -93,6 +260,15 @@ async def get_chat(
             detail="Chat not found",
         )
 
+    if chat_data.title is not None:
+        chat.title = chat_data.title
+    if chat_data.system_prompt is not None:
+        # Пустая строка сбрасывает промпт чата
+        chat.system_prompt = chat_data.system_prompt or None
+
+    await db.flush()
+    await db.refresh(chat)
+
     return chat
 
 
@@ -103,21 +279,217 @@ async def delete_chat(
     db: AsyncSession = Depends(get_db_session),
 ) -> None:
     """Удалить чат."""
+    # Один DELETE без загрузки чата: сообщения удаляет ON DELETE CASCADE
     result = await db.execute(
-        select(Chat).where(
+        delete(Chat).where(
             Chat.id == chat_id,
             Chat.user_id == current_user.id
         )
     )
-    chat = result.scalar_one_or_none()
 
-    if not chat:
+    if result.rowcount == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Chat not found",
         )
 
-    await db.delete(chat)
+    context_builder.invalidate(chat_id)
+
+
+async def generate_reply(
+    stream: ResumableStream,
+    *,
+    chat_id: uuid.UUID,
+    user_id: uuid.UUID,
+    user_message: Message,
+    model: str,
+    api_key: str | None,
+    system_prompt: str | None,
+    history: list,
+    coalesce_window: float,
+    coalesce_bytes: int,
+) -> None:
+    """
+    Фоновая генерация ответа: публикует SSE события в поток и сохраняет ответ.
+
+    Работает независимо от HTTP соединения, поэтому ответ пишется
+    короткими сессиями, а не в сессии запроса. Частичный ответ
+    периодически сохраняется checkpoint'ами в статусе streaming.
+    """
+    usage = TokenUsage()
+    checkpointer = create_checkpointer(chat_id)
+    chunks = coalesce_chunks(
+        gemini_service.stream_response(
+            user_message.content,
+            model=model,
+            api_key=api_key,
+            system_prompt=system_prompt,
+            history=history,
+            user_id=str(user_id),
+            usage=usage,
+        ),
+        window=coalesce_window,
+        max_bytes=coalesce_bytes,
+    )
+
+    try:
+        await checkpointer.start()
+        async for chunk in chunks:
+            stream.publish(encode_chunk_event(chunk))
+            await checkpointer.append(chunk)
+
+    except asyncio.CancelledError:
+        # Генерацию отменили (клиент нажал "стоп" или все отключились):
+        # upstream прерван, сохраняем частичный ответ. Запись идёт отдельной
+        # задачей, повторная отмена её не прервёт.
+        async def save_interrupted() -> None:
+            await chunks.aclose()
+            await checkpointer.finish(MessageStatus.INTERRUPTED)
+            context_builder.invalidate(chat_id)
+
+        try:
+            await asyncio.shield(asyncio.ensure_future(save_interrupted()))
+        finally:
+            # Терминальное событие: вкладки, следящие за чатом через хаб,
+            # иначе так и остались бы в состоянии "печатает"
+            stream.publish(INTERRUPTED_EVENT)
+        raise
+
+    except Exception as e:
+        stream.publish(encode_error_event(str(e)))
+        try:
+            await checkpointer.finish(MessageStatus.FAILED)
+        except Exception:
+            logger.exception("Не удалось сохранить ответ с ошибкой в чате %s", chat_id)
+        context_builder.invalidate(chat_id)
+        return
+
+    # Сохраняем полный ответ
+    full_response = checkpointer.content
+    token_count = await checkpointer.finish(
+        MessageStatus.COMPLETE, usage.completion_tokens
+    )
+    _correct_prompt_tokens(user_message, usage, history, system_prompt)
+
+    # Дописываем реплики в кэш истории без перечитывания чата
+    context_builder.append(
+        chat_id, user_message.role, user_message.content, user_message.token_count
+    )
+    context_builder.append(chat_id, MessageRole.ASSISTANT, full_response, token_count)
+
+    # Финальное событие
+    stream.publish(DONE_EVENT)
+
+
+async def start_reply_stream(
+    db: AsyncSession,
+    chat: Chat,
+    user_id: uuid.UUID,
+    user_settings: UserSettings | None,
+    role: MessageRole,
+    content: str,
+    coalesce_window: float,
+    coalesce_bytes: int,
+) -> ResumableStream:
+    """
+    Сохраняет сообщение пользователя и запускает фоновую генерацию ответа.
+
+    Общая часть HTTP (SSE) и WebSocket транспорта. Сообщение пользователя
+    коммитится сразу: переподключение к потоку не создаёт повторных сообщений.
+
+    Returns:
+        Поток событий генерации (первое событие - start)
+    """
+    # Получаем API ключ и модель из настроек
+    api_key = user_settings.api_key if user_settings else None
+    model = user_settings.model if user_settings else "gemini-2.5-flash-lite"
+    system_prompt = resolve_system_prompt(chat, user_settings)
+
+    # Собираем историю диалога до добавления нового сообщения
+    history = await context_builder.build(db, chat.id, model)
+
+    # Сохраняем сообщение пользователя
+    user_message = Message(
+        id=uuid.uuid4(),
+        chat_id=chat.id,
+        role=role,
+        content=content,
+        token_count=estimate_tokens(content),
+        status=MessageStatus.COMPLETE,
+        created_at=datetime.now(timezone.utc),
+    )
+    if message_write_buffer.enabled:
+        await db.commit()
+        await message_write_buffer.insert(message_row(user_message))
+    else:
+        db.add(user_message)
+        await record_chat_activity(
+            db, chat.id, added=1, last_content=content,
+            last_message_at=user_message.created_at,
+        )
+        await db.commit()
+
+    # Генерируем ответ в фоне, транспорт только читает события потока
+    stream = stream_registry.start(
+        chat.id,
+        user_id,
+        lambda stream: generate_reply(
+            stream,
+            chat_id=chat.id,
+            user_id=user_id,
+            user_message=user_message,
+            model=model,
+            api_key=api_key,
+            system_prompt=system_prompt,
+            history=history,
+            coalesce_window=coalesce_window,
+            coalesce_bytes=coalesce_bytes,
+        ),
+    )
+    stream.publish(
+        encode_event({
+            "type": "start",
+            "stream_id": stream.id,
+            "user_message": {
+                "id": str(user_message.id),
+                "role": role.value,
+                "content": user_message.content,
+            },
+        })
+    )
+    return stream
+
+
+def _sse_response(
+    stream: ResumableStream,
+    last_event_id: int = 0,
+) -> StreamingResponse:
+    """SSE ответ, читающий события потока начиная с last_event_id."""
+
+    # Отключение клиента отслеживает StreamingResponse: генератор отменяется,
+    # подписка закрывается, и реестр отменит генерацию, если клиент
+    # не переподключится за grace период (STREAM_RESUME_GRACE_SECONDS)
+    async def relay_events():
+        subscription = stream_registry.subscribe(stream, last_event_id)
+        try:
+            async for event in subscription:
+                yield event
+        except StreamGone:
+            yield encode_error_event("Клиент отстал от потока, часть событий потеряна")
+        finally:
+            await subscription.aclose()
+
+    return StreamingResponse(
+        relay_events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+            "Transfer-Encoding": "chunked",
+            "X-Stream-ID": stream.id,
+        },
+    )
 
 
 @router.post("/{chat_id}/message/stream")
@@ -126,18 +498,34 @@ async def send_message_stream(
     message_data: MessageCreate,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db_session),
+    coalesce_ms: int = Query(
+        settings.SSE_COALESCE_WINDOW_MS,
+        ge=0,
+        le=1000,
+        description="Окно объединения чанков в одно событие (мс, 0 - без объединения)",
+    ),
+    coalesce_bytes: int = Query(
+        settings.SSE_COALESCE_MAX_BYTES,
+        ge=1,
+        le=65536,
+        description="Порог размера события, при котором оно отправляется сразу",
+    ),
 ):
     """
     Отправить сообщение и получить потоковый ответ от Gemini.
 
-    Возвращает Server-Sent Events (SSE) поток.
+    Возвращает Server-Sent Events (SSE) поток. Мелкие чанки объединяются
+    в события по окну времени или порогу размера. Каждое событие имеет id,
+    первое событие (type=start) содержит stream_id для переподключения.
     Требует аутентификацию.
-    """
-    from models.user_settings import UserSettings
 
+    Сообщение пользователя коммитится до начала генерации, и соединение
+    с БД возвращается в пул: число одновременных потоков не ограничено
+    размером пула. Ответ сохраняется короткими сессиями checkpoint'ов.
+    """
     # Проверяем существование чата и принадлежность пользователю
     result = await db.execute(
-        select(Chat).where(
+        select(Chat).options(*CHAT_FOR_REPLY).where(
             Chat.id == chat_id,
             Chat.user_id == current_user.id
         )
@@ -156,77 +544,100 @@ async def send_message_stream(
     )
     user_settings = settings_result.scalar_one_or_none()
 
-    # Получаем API ключ и модель из настроек
-    api_key = user_settings.api_key if user_settings else None
-    model = user_settings.model if user_settings else "gemini-2.5-flash-lite"
-
     # Конвертируем роль в enum (берём value из Enum)
     role_value = message_data.role.value if hasattr(message_data.role, 'value') else message_data.role
-    role = MessageRole(role_value)
 
-    # Сохраняем сообщение пользователя
-    user_message = Message(
-        chat_id=chat_id,
-        role=role,
-        content=message_data.content,
+    stream = await start_reply_stream(
+        db,
+        chat,
+        current_user.id,
+        user_settings,
+        MessageRole(role_value),
+        message_data.content,
+        coalesce_window=coalesce_ms / 1000,
+        coalesce_bytes=coalesce_bytes,
     )
-    db.add(user_message)
-    await db.flush()
 
-    # Генерируем ответ
-    async def generate_response():
-        """Генератор SSE событий."""
-        assistant_message = Message(
-            chat_id=chat_id,
-            role=MessageRole.ASSISTANT,
-            content="",
+    return _sse_response(stream)
+
+
+@router.get("/{chat_id}/events")
+async def subscribe_chat_events(
+    chat_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db_session),
+):
+    """
+    Подписаться на генерации в чате (SSE).
+
+    Для других вкладок и устройств с открытым чатом: получают события
+    тех же генераций (start, chunk, done, error), что и отправитель,
+    из общего upstream потока. Если генерация уже идёт, сначала
+    приходит её начало. Медленный клиент отключается с событием error.
+    """
+    result = await db.execute(
+        select(Chat.id).where(
+            Chat.id == chat_id,
+            Chat.user_id == current_user.id
+        )
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found",
         )
-        db.add(assistant_message)
 
-        full_response = ""
+    # Подписка живёт долго: возвращаем соединение в пул до начала стриминга
+    await db.commit()
 
+    async def relay_events():
+        subscription = stream_registry.subscribe_chat(chat_id)
         try:
-            async for chunk in gemini_service.stream_response(
-                message_data.content,
-                model=model,
-                api_key=api_key,
-            ):
-                full_response += chunk
-                # Отправляем чанк сразу, не накапливаем
-                event_data = {
-                    "type": "chunk",
-                    "content": chunk,
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
-                }
-                yield f"data: {json.dumps(event_data)}\n\n"
-                
-                # Принудительно сбрасываем буфер
-                await asyncio.sleep(0.01)  # Минимальная задержка для real-time эффекта
-
-            # Сохраняем полный ответ
-            assistant_message.content = full_response
-            await db.commit()
-
-            # Финальное событие
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
-
-        except Exception as e:
-            # Событие ошибки
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
-            await db.rollback()
+            async for event in subscription:
+                yield event
+        finally:
+            await subscription.aclose()
 
     return StreamingResponse(
-        generate_response(),
+        relay_events(),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
             "X-Accel-Buffering": "no",
-            "Transfer-Encoding": "chunked",
         },
     )
 
 
+@router.get("/{chat_id}/message/stream/{stream_id}")
+async def resume_message_stream(
+    chat_id: uuid.UUID,
+    stream_id: str,
+    current_user: User = Depends(get_streaming_user),
+    last_event_id: int = Header(0, alias="Last-Event-ID", ge=0),
+):
+    """
+    Переподключиться к потоку ответа после обрыва соединения.
+
+    Отдаёт события после Last-Event-ID из буфера потока, затем
+    продолжает вживую. Генерация ответа при этом не повторяется.
+    """
+    stream = stream_registry.get(stream_id, current_user.id)
+    if stream is None or stream.chat_id != chat_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Stream not found",
+        )
+
+    if not stream.can_resume(last_event_id):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Stream events are no longer buffered",
+        )
+
+    return _sse_response(stream, last_event_id)
+
+
 @router.post("/{chat_id}/message", response_model=MessageSchema)
 async def send_message(
     chat_id: uuid.UUID,
@@ -241,7 +652,7 @@ async def send_message(
     """
     # Проверяем существование чата и принадлежность пользователю
     result = await db.execute(
-        select(Chat).where(
+        select(Chat).options(*CHAT_FOR_REPLY).where(
             Chat.id == chat_id,
             Chat.user_id == current_user.id
         )
@@ -254,27 +665,82 @@ async def send_message(
             detail="Chat not found",
         )
 
-    # Сохраняем сообщение пользователя
+    # Получаем настройки пользователя
+    settings_result = await db.execute(
+        select(UserSettings).where(UserSettings.user_id == current_user.id)
+    )
+    user_settings = settings_result.scalar_one_or_none()
+
+    api_key = user_settings.api_key if user_settings else None
+    model = user_settings.model if user_settings else "gemini-2.5-flash-lite"
+    system_prompt = resolve_system_prompt(chat, user_settings)
+
+    # Собираем историю диалога до добавления нового сообщения
+    history = await context_builder.build(db, chat_id, model)
+
+    # Сообщение пользователя сохраняется вместе с ответом (время - момент вопроса)
     user_message = Message(
+        id=uuid.uuid4(),
         chat_id=chat_id,
         role=MessageRole.USER,
         content=message_data.content,
+        token_count=estimate_tokens(message_data.content),
+        status=MessageStatus.COMPLETE,
+        created_at=datetime.now(timezone.utc),
     )
-    db.add(user_message)
+
+    # Не держим соединение с БД во время генерации
+    await db.commit()
 
     # Генерируем ответ
     full_response = ""
-    async for chunk in gemini_service.stream_response(message_data.content):
-        full_response += chunk
+    usage = TokenUsage()
+    try:
+        async for chunk in gemini_service.stream_response(
+            message_data.content,
+            model=model,
+            api_key=api_key,
+            system_prompt=system_prompt,
+            history=history,
+            user_id=str(current_user.id),
+            usage=usage,
+        ):
+            full_response += chunk
+    except SchedulerRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+        )
 
     # Сохраняем ответ ассистента
     assistant_message = Message(
+        id=uuid.uuid4(),
         chat_id=chat_id,
         role=MessageRole.ASSISTANT,
         content=full_response,
+        token_count=None,
+        status=MessageStatus.COMPLETE,
+        created_at=datetime.now(timezone.utc),
+    )
+    _apply_token_usage(assistant_message, usage)
+    if message_write_buffer.enabled:
+        await message_write_buffer.insert(
+            message_row(user_message), message_row(assistant_message)
+        )
+    else:
+        db.add_all([user_message, assistant_message])
+        await record_chat_activity(
+            db, chat_id, added=2, last_content=full_response,
+            last_message_at=assistant_message.created_at,
+        )
+        await db.commit()
+    _correct_prompt_tokens(user_message, usage, history, system_prompt)
+
+    context_builder.append(
+        chat_id, MessageRole.USER, message_data.content, user_message.token_count
+    )
+    context_builder.append(
+        chat_id, MessageRole.ASSISTANT, full_response, assistant_message.token_count
     )
-    db.add(assistant_message)
-    await db.commit()
-    await db.refresh(assistant_message)
 
     return assistant_message
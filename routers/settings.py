@@ -18,6 +18,7 @@ from core.database import get_db_session
 from models.user import User
 from models.user_settings import UserSettings
 from routers.auth import get_current_user
+from services.api_key_validation import KeyValidation, api_key_validation_cache
 from schemas.user_settings import (
     UserSettings as UserSettingsSchema,
 )
@@ -30,6 +31,38 @@ from schemas.user_settings import (
 router = APIRouter(prefix="/settings", tags=["User Settings"])
 
 
+def _models_for_key(validation: KeyValidation | None) -> list[str]:
+    """Модели приложения, доступные ключу (все, если ключ ещё не проверялся)."""
+    if validation is None or not validation.valid:
+        return list(UserSettings.AVAILABLE_MODELS)
+    return [model for model in UserSettings.AVAILABLE_MODELS if model in validation.models]
+
+
+def _check_model_for_key(api_key: str | None, model: str) -> None:
+    """
+    Отклоняет модель, недоступную ключу, по кэшу проверок.
+
+    Без живого запроса к API: если ключ ещё не проверялся, модель принимается.
+    В кэше только результаты, полученные от API: временные ошибки проверки
+    (лимиты, сбой сервера) не кэшируются и ключ невалидным не делают.
+    """
+    if not api_key:
+        return
+    validation = api_key_validation_cache.get(api_key)
+    if validation is None:
+        return
+    if not validation.valid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Ошибка API ключа: {validation.error}",
+        )
+    if model not in validation.models:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Модель {model} недоступна для этого API ключа",
+        )
+
+
 @router.get("", response_model=UserSettingsList)
 async def get_settings(
     current_user: User = Depends(get_current_user),
@@ -51,12 +84,18 @@ async def get_settings(
             api_key=None,  # Не возвращаем API ключ
             has_api_key=user_settings.api_key is not None,
             model=user_settings.model,
+            system_prompt=user_settings.system_prompt,
             created_at=user_settings.created_at,
             updated_at=user_settings.updated_at,
         )
 
+    # Если ключ пользователя уже проверялся, показываем только доступные ему модели
+    validation = None
+    if user_settings and user_settings.api_key:
+        validation = api_key_validation_cache.get(user_settings.api_key)
+
     return UserSettingsList(
-        available_models=UserSettings.AVAILABLE_MODELS,
+        available_models=_models_for_key(validation),
         settings=settings_data,
     )
 
@@ -74,12 +113,23 @@ async def update_settings(
     )
     user_settings = result.scalar_one_or_none()
 
+    # Проверяем, что модель доступна ключу (по кэшу проверок ключей)
+    if settings_data.api_key is not None or settings_data.model is not None:
+        api_key = settings_data.api_key
+        if api_key is None and user_settings is not None:
+            api_key = user_settings.api_key
+        model = settings_data.model
+        if model is None:
+            model = user_settings.model if user_settings else "gemini-2.5-flash-lite"
+        _check_model_for_key(api_key, model)
+
     if user_settings is None:
         # Создаём новые настройки
         user_settings = UserSettings(
             user_id=current_user.id,
             api_key=settings_data.api_key,
             model=settings_data.model or "gemini-2.5-flash-lite",
+            system_prompt=settings_data.system_prompt or None,
         )
         db.add(user_settings)
     else:
@@ -88,6 +138,9 @@ async def update_settings(
             user_settings.api_key = settings_data.api_key
         if settings_data.model is not None:
             user_settings.model = settings_data.model
+        if settings_data.system_prompt is not None:
+            # Пустая строка сбрасывает промпт
+            user_settings.system_prompt = settings_data.system_prompt or None
 
     await db.commit()
     await db.refresh(user_settings)
@@ -99,6 +152,7 @@ async def update_settings(
         "api_key": None,  # Не возвращаем API ключ
         "has_api_key": user_settings.api_key is not None,
         "model": user_settings.model,
+        "system_prompt": user_settings.system_prompt,
         "created_at": user_settings.created_at,
         "updated_at": user_settings.updated_at,
     }
@@ -108,16 +162,13 @@ async def update_settings(
 async def test_api_key(
     api_key_data: dict[str, str],
     current_user: User = Depends(get_current_user),
-) -> dict[str, str]:
+) -> dict:
     """
     Протестировать API ключ Google.
 
-    Отправляет простой запрос к Gemini API для проверки ключа.
+    Запрашивает у Gemini API список моделей, доступных ключу.
+    Результат кэшируется по отпечатку ключа, повторные проверки мгновенные.
     """
-    import asyncio
-    from google import genai
-    from google.genai.errors import APIError
-
     api_key = api_key_data.get("api_key")
     if not api_key:
         raise HTTPException(
@@ -126,27 +177,22 @@ async def test_api_key(
         )
 
     try:
-        # Создаём клиент с предоставленным ключом
-        client = genai.Client(api_key=api_key)
-
-        # Пробуем получить список моделей
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(
-            None,
-            lambda: client.models.list(),
-        )
-
-        return {
-            "status": "success",
-            "message": "API ключ действителен",
-        }
-    except APIError as e:
+        validation = await api_key_validation_cache.validate(api_key)
+    except Exception as e:
+        # Ключ не отклонён, проверить его сейчас не удалось (лимиты, сбой API, сеть)
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Ошибка API ключа: {str(e)}",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Не удалось проверить ключ, попробуйте позже: {str(e)}",
         )
-    except Exception as e:
+
+    if not validation.valid:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Ошибка при проверке ключа: {str(e)}",
+            detail=f"Ошибка API ключа: {validation.error}",
         )
+
+    return {
+        "status": "success",
+        "message": "API ключ действителен",
+        "available_models": _models_for_key(validation),
+    }
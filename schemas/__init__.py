@@ -3,8 +3,10 @@
 """
 
 from schemas.auth import Token, TokenRefresh, UserLogin, UserRegister, UserResponse
+from schemas.batch import BatchCreate, BatchItem, BatchJob
 from schemas.chat import Chat, ChatCreate, ChatUpdate, ChatWithMessages
 from schemas.message import Message, MessageCreate, MessageRole
+from schemas.pagination import Page
 from schemas.session import Session, SessionCreate
 from schemas.user import User, UserCreate, UserUpdate
 
@@ -21,6 +23,10 @@ __all__ = [
     "Message",
     "MessageCreate",
     "MessageRole",
+    "Page",
+    "BatchCreate",
+    "BatchItem",
+    "BatchJob",
     "Token",
     "TokenRefresh",
     "UserLogin",
@@ -0,0 +1,53 @@
+"""
+Pydantic схемы для пакетной обработки промптов.
+"""
+
+import uuid
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class BatchItem(BaseModel):
+    """Один промпт пакета."""
+
+    chat_id: uuid.UUID = Field(..., description="ID чата")
+    content: str = Field(
+        ...,
+        min_length=1,
+        description="Текст сообщения",
+        examples=["Кратко перескажи новости за день"],
+    )
+
+
+class BatchCreate(BaseModel):
+    """Схема для создания пакетного задания."""
+
+    items: list[BatchItem] = Field(
+        ...,
+        min_length=1,
+        description="Промпты (могут относиться к разным чатам)",
+    )
+    concurrency: int | None = Field(
+        None,
+        ge=1,
+        description="Число одновременных запросов к модели (по умолчанию из настроек)",
+    )
+
+
+class BatchJob(BaseModel):
+    """Состояние пакетного задания."""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str = Field(..., description="ID задания")
+    status: str = Field(
+        ...,
+        description="Статус задания (running/complete/cancelled)",
+        examples=["running"],
+    )
+    total: int = Field(..., description="Количество промптов")
+    completed: int = Field(..., description="Успешно обработано")
+    failed: int = Field(..., description="Завершилось ошибкой")
+    concurrency: int = Field(..., description="Число одновременных запросов")
+    created_at: datetime = Field(..., description="Дата создания")
@@ -27,7 +27,12 @@ class ChatBase(BaseModel):
 class ChatCreate(ChatBase):
     """Схема для создания чата."""
 
-    pass
+    system_prompt: str | None = Field(
+        None,
+        max_length=10000,
+        description="Системный промпт чата",
+        examples=["Отвечай кратко и по делу."],
+    )
 
 
 class ChatUpdate(BaseModel):
@@ -41,6 +46,11 @@ class ChatUpdate(BaseModel):
         max_length=255,
         description="Новое название чата",
     )
+    system_prompt: str | None = Field(
+        None,
+        max_length=10000,
+        description="Новый системный промпт чата (пустая строка - сбросить)",
+    )
 
 
 class Chat(ChatBase):
@@ -50,6 +60,10 @@ class Chat(ChatBase):
 
     id: uuid.UUID = Field(..., description="ID чата")
     user_id: uuid.UUID = Field(..., description="ID владельца")
+    system_prompt: str | None = Field(None, description="Системный промпт чата")
+    last_message_at: datetime = Field(..., description="Время последнего сообщения")
+    message_count: int = Field(0, description="Количество сообщений")
+    last_message_preview: str | None = Field(None, description="Начало последнего сообщения")
     created_at: datetime = Field(..., description="Дата создания")
     updated_at: datetime = Field(..., description="Дата обновления")
 
@@ -59,5 +73,10 @@ class ChatWithMessages(Chat):
 
     messages: list[Message] = Field(
         default_factory=list,
-        description="Сообщения в чате",
+        description="Последние сообщения чата в хронологическом порядке",
+    )
+    messages_cursor: str | None = Field(
+        None,
+        description="Курсор более старых сообщений для GET /chats/{id}/messages "
+        "(null - загружена вся история)",
     )
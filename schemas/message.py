@@ -54,4 +54,9 @@ class Message(MessageBase):
 
     id: uuid.UUID = Field(..., description="ID сообщения")
     chat_id: uuid.UUID = Field(..., description="ID чата")
+    status: str = Field(
+        "complete",
+        description="Статус генерации (streaming/complete/interrupted/failed)",
+        examples=["complete"],
+    )
     created_at: datetime = Field(..., description="Дата создания")
@@ -0,0 +1,19 @@
+"""
+Pydantic схемы для постраничной выдачи.
+"""
+
+from typing import Generic, TypeVar
+
+from pydantic import BaseModel, Field
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    """Страница результатов с курсором следующей страницы."""
+
+    items: list[T] = Field(..., description="Элементы страницы")
+    next_cursor: str | None = Field(
+        None,
+        description="Курсор следующей страницы (null - страница последняя)",
+    )
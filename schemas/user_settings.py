@@ -29,6 +29,11 @@ class UserSettingsCreate(UserSettingsBase):
         description="Персональный API ключ Google",
         examples=["AIzaSy..."],
     )
+    system_prompt: Optional[str] = Field(
+        None,
+        max_length=10000,
+        description="Системный промпт по умолчанию",
+    )
 
 
 class UserSettingsUpdate(BaseModel):
@@ -44,6 +49,11 @@ class UserSettingsUpdate(BaseModel):
         None,
         description="Модель Gemini для использования",
     )
+    system_prompt: Optional[str] = Field(
+        None,
+        max_length=10000,
+        description="Системный промпт по умолчанию (пустая строка - сбросить)",
+    )
 
 
 class UserSettings(UserSettingsBase):
@@ -55,6 +65,7 @@ class UserSettings(UserSettingsBase):
     user_id: uuid.UUID = Field(..., description="ID пользователя")
     api_key: Optional[str] = Field(None, description="API ключ (скрыт)")
     has_api_key: bool = Field(..., description="Установлен ли персональный API ключ")
+    system_prompt: Optional[str] = Field(None, description="Системный промпт по умолчанию")
     created_at: datetime = Field(..., description="Дата создания")
     updated_at: datetime = Field(..., description="Дата обновления")
 
@@ -0,0 +1,138 @@
+"""
+Кэш результатов проверки API ключей.
+
+Проверка ключа - запрос списка моделей у провайдера. Результат (валиден ли
+ключ и какие модели ему доступны) кэшируется по SHA-256 отпечатку ключа,
+сырой ключ в кэше не хранится.
+
+Особенности:
+- TTL для валидных и (короче) для отклонённых ключей
+- LRU вытеснение при превышении размера кэша
+- Одновременные проверки одного ключа выполняются одним запросом
+- Кэшируется только отказ в авторизации (400/401/403): лимиты (429),
+  ошибки сервера и сети не делают ключ невалидным и не кэшируются
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from core.config import settings
+from services.gemini_clients import fingerprint_api_key, is_auth_error
+from services.gemini_service import gemini_service
+
+
+@dataclass(frozen=True, slots=True)
+class KeyValidation:
+    """Результат проверки ключа."""
+
+    valid: bool
+    models: frozenset[str]
+    error: str | None
+    checked_at: float
+
+
+class ApiKeyValidationCache:
+    """LRU/TTL кэш проверок API ключей по отпечатку."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, invalid_ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.invalid_ttl_seconds = invalid_ttl_seconds
+        self._entries: OrderedDict[str, KeyValidation] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, api_key: str) -> KeyValidation | None:
+        """Свежий результат проверки ключа из кэша или None."""
+        key = fingerprint_api_key(api_key)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        ttl = self.ttl_seconds if entry.valid else self.invalid_ttl_seconds
+        if time.monotonic() - entry.checked_at >= ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def validate(self, api_key: str, force: bool = False) -> KeyValidation:
+        """
+        Проверяет ключ, используя кэш.
+
+        Args:
+            api_key: API ключ
+            force: Игнорировать кэш и проверить ключ заново
+
+        Returns:
+            Результат проверки
+
+        Raises:
+            Exception: Ошибки лимитов, сервера и сети (кроме отказа в авторизации)
+        """
+        if not force:
+            cached = self.get(api_key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        self.misses += 1
+
+        key = fingerprint_api_key(api_key)
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._check(api_key))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda f: self._in_flight.pop(key, None))
+        # shield: отмена одного ожидающего не прерывает проверку для остальных
+        return await asyncio.shield(future)
+
+    async def _check(self, api_key: str) -> KeyValidation:
+        try:
+            models = await gemini_service.provider.list_models(api_key)
+            result = KeyValidation(
+                valid=True,
+                models=frozenset(models),
+                error=None,
+                checked_at=time.monotonic(),
+            )
+        except Exception as e:
+            if not is_auth_error(e):
+                raise
+            result = KeyValidation(
+                valid=False,
+                models=frozenset(),
+                error=str(e),
+                checked_at=time.monotonic(),
+            )
+
+        key = fingerprint_api_key(api_key)
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return result
+
+    def invalidate(self, api_key: str) -> None:
+        """Удаляет результат проверки ключа."""
+        self._entries.pop(fingerprint_api_key(api_key), None)
+
+    def stats(self) -> dict:
+        """Метрики кэша для мониторинга."""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Глобальный кэш проверок ключей
+api_key_validation_cache = ApiKeyValidationCache(
+    max_entries=settings.API_KEY_VALIDATION_CACHE_SIZE,
+    ttl_seconds=settings.API_KEY_VALIDATION_TTL_SECONDS,
+    invalid_ttl_seconds=settings.API_KEY_INVALID_TTL_SECONDS,
+)
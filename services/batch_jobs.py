@@ -0,0 +1,335 @@
+"""
+Пакетная обработка промптов.
+
+Задание принимает много промптов (в том числе из разных чатов) и выполняет
+их с ограниченной конкурентностью через GeminiService. Результаты пишутся
+в messages пачками одним multi-row INSERT, прогресс и результаты можно
+читать потоком NDJSON.
+
+Особенности:
+- Конкурентность ограничена семафором на задание
+- Общие лимиты ключа соблюдаются планировщиком GeminiService
+- История чата собирается один раз на задание (состояние до пакета)
+- Вопрос и ответ каждого промпта получают соседние created_at в момент
+  записи: параллельные промпты одного чата не перемешиваются в истории
+- Задания хранятся в памяти процесса ограниченное время после завершения
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from google.genai import types
+from sqlalchemy import insert
+
+from core.config import settings
+from core.database import async_session_factory
+from models.message import Message, MessageRole, MessageStatus
+from services.chat_summaries import record_rows_activity
+from services.context_builder import context_builder
+from services.gemini_service import gemini_service
+from services.token_accounting import TokenUsage, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchChatContext:
+    """Параметры генерации для одного чата пакета."""
+
+    model: str
+    api_key: str | None
+    system_prompt: str | None
+    history: list[types.Content]
+
+
+@dataclass
+class BatchJobState:
+    """Задание в памяти: прогресс и журнал событий для NDJSON."""
+
+    id: str
+    user_id: uuid.UUID
+    total: int
+    concurrency: int
+    status: str = "running"
+    completed: int = 0
+    failed: int = 0
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    events: list[str] = field(default_factory=list)
+    task: asyncio.Task | None = None
+    _changed: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def emit(self, event: dict) -> None:
+        self.events.append(json.dumps(event, ensure_ascii=False) + "\n")
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncGenerator[str, None]:
+        """Отдаёт журнал событий с начала, затем новые до завершения задания."""
+        index = 0
+        while True:
+            if index < len(self.events):
+                event = self.events[index]
+                index += 1
+                yield event
+            elif self.status != "running":
+                return
+            else:
+                await self._changed.wait()
+
+
+# Шаг между created_at соседних сообщений пакета
+_ROW_TIME_STEP = timedelta(microseconds=1)
+
+
+@dataclass
+class _PendingResult:
+    """Строки одного промпта и событие результата, ждущие commit."""
+
+    rows: tuple[dict, ...]
+    event: dict
+
+
+class _MessageBatchWriter:
+    """
+    Копит строки messages и пишет их одним multi-row INSERT.
+
+    Промпт считается выполненным (completed, событие result) только после
+    commit его строк. Ошибка записи пачки не выходит наружу: промпты этой
+    пачки помечаются failed, остальные продолжают выполняться.
+    """
+
+    def __init__(self, job: BatchJobState, batch_size: int):
+        self.job = job
+        self.batch_size = batch_size
+        self._pending: list[_PendingResult] = []
+        self._last_at: datetime | None = None
+        self._lock = asyncio.Lock()
+
+    def _stamp(self, rows: tuple[dict, ...]) -> None:
+        """Проставляет строкам идущие подряд created_at, не раньше текущего времени."""
+        at = datetime.now(timezone.utc)
+        if self._last_at is not None and at <= self._last_at:
+            at = self._last_at + _ROW_TIME_STEP
+        for row in rows:
+            row["created_at"] = at
+            at += _ROW_TIME_STEP
+        self._last_at = at - _ROW_TIME_STEP
+
+    @property
+    def pending_rows(self) -> int:
+        return sum(len(pending.rows) for pending in self._pending)
+
+    async def add(self, event: dict, *rows: dict) -> None:
+        """
+        Добавляет строки одного промпта (вопрос и ответ) в порядке диалога.
+
+        Args:
+            event: Событие result, отправляемое после commit строк
+            rows: Строки messages
+        """
+        self._stamp(rows)
+        self._pending.append(_PendingResult(rows, event))
+        if self.pending_rows >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Записывает накопленные строки и публикует результаты их промптов."""
+        async with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            rows = [row for item in pending for row in item.rows]
+            try:
+                async with async_session_factory() as session:
+                    await session.execute(insert(Message), rows)
+                    await record_rows_activity(session, rows)
+                    await session.commit()
+            except Exception as e:
+                logger.exception(
+                    "Пакетное задание %s: не удалось записать %d строк", self.job.id, len(rows)
+                )
+                for item in pending:
+                    self.job.failed += 1
+                    self.job.emit({
+                        "type": "error",
+                        "index": item.event["index"],
+                        "chat_id": item.event["chat_id"],
+                        "message": f"Не удалось сохранить ответ: {e}",
+                    })
+                return
+
+            for item in pending:
+                self.job.completed += 1
+                self.job.emit(item.event)
+
+
+class BatchJobManager:
+    """Запуск и хранение пакетных заданий."""
+
+    def __init__(self, insert_batch_size: int, retention_seconds: float):
+        self.insert_batch_size = insert_batch_size
+        self.retention_seconds = retention_seconds
+        self._jobs: dict[str, BatchJobState] = {}
+
+    def start(
+        self,
+        user_id: uuid.UUID,
+        items: list[tuple[uuid.UUID, str]],
+        contexts: dict[uuid.UUID, BatchChatContext],
+        concurrency: int,
+    ) -> BatchJobState:
+        """
+        Запускает задание в фоне.
+
+        Args:
+            user_id: Владелец задания
+            items: Пары (chat_id, текст промпта)
+            contexts: Параметры генерации по chat_id
+            concurrency: Число одновременных запросов к модели
+
+        Returns:
+            Состояние задания
+        """
+        job = BatchJobState(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            total=len(items),
+            concurrency=concurrency,
+        )
+        self._jobs[job.id] = job
+        job.task = asyncio.get_running_loop().create_task(
+            self._run(job, items, contexts)
+        )
+        job.task.add_done_callback(lambda task: self._schedule_forget(job))
+        return job
+
+    def get(self, job_id: str, user_id: uuid.UUID) -> BatchJobState | None:
+        """Задание пользователя по id или None."""
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    async def _run(
+        self,
+        job: BatchJobState,
+        items: list[tuple[uuid.UUID, str]],
+        contexts: dict[uuid.UUID, BatchChatContext],
+    ) -> None:
+        semaphore = asyncio.Semaphore(job.concurrency)
+        writer = _MessageBatchWriter(job, self.insert_batch_size)
+
+        async def process(index: int, chat_id: uuid.UUID, content: str) -> None:
+            async with semaphore:
+                await self._process_item(job, writer, index, chat_id, content, contexts[chat_id])
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                for index, (chat_id, content) in enumerate(items):
+                    group.create_task(process(index, chat_id, content))
+            await writer.flush()
+            job.status = "complete"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            # Сохраняем уже полученные ответы
+            await asyncio.shield(writer.flush())
+            raise
+        except Exception as e:
+            logger.exception("Пакетное задание %s завершилось ошибкой", job.id)
+            job.status = "failed"
+            job.emit({"type": "error", "message": str(e)})
+        finally:
+            for chat_id in contexts:
+                context_builder.invalidate(chat_id)
+            job.emit({
+                "type": "done",
+                "status": job.status,
+                "completed": job.completed,
+                "failed": job.failed,
+            })
+
+    async def _process_item(
+        self,
+        job: BatchJobState,
+        writer: _MessageBatchWriter,
+        index: int,
+        chat_id: uuid.UUID,
+        content: str,
+        context: BatchChatContext,
+    ) -> None:
+        usage = TokenUsage()
+        try:
+            parts = [
+                chunk
+                async for chunk in gemini_service.stream_response(
+                    content,
+                    model=context.model,
+                    api_key=context.api_key,
+                    system_prompt=context.system_prompt,
+                    history=context.history,
+                    user_id=str(job.user_id),
+                    usage=usage,
+                )
+            ]
+        except Exception as e:
+            job.failed += 1
+            job.emit({"type": "error", "index": index, "chat_id": str(chat_id), "message": str(e)})
+            return
+
+        response = "".join(parts)
+        user_row = {
+            "id": uuid.uuid4(),
+            "chat_id": chat_id,
+            "role": MessageRole.USER,
+            "content": content,
+            "token_count": estimate_tokens(content),
+            "status": MessageStatus.COMPLETE,
+        }
+        assistant_row = {
+            "id": uuid.uuid4(),
+            "chat_id": chat_id,
+            "role": MessageRole.ASSISTANT,
+            "content": response,
+            "token_count": usage.completion_tokens or estimate_tokens(response),
+            "status": MessageStatus.COMPLETE,
+        }
+        # created_at проставляет writer: пара пишется подряд.
+        # Результат публикуется после commit строк
+        await writer.add(
+            {
+                "type": "result",
+                "index": index,
+                "chat_id": str(chat_id),
+                "message_id": str(assistant_row["id"]),
+                "content": response,
+                "token_count": assistant_row["token_count"],
+            },
+            user_row,
+            assistant_row,
+        )
+
+    def _schedule_forget(self, job: BatchJobState) -> None:
+        asyncio.get_running_loop().call_later(
+            self.retention_seconds, self._jobs.pop, job.id, None
+        )
+
+    async def close(self) -> None:
+        """Отменяет незавершённые задания при остановке приложения."""
+        tasks = [job.task for job in self._jobs.values() if job.task and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._jobs.clear()
+
+
+# Глобальный менеджер пакетных заданий
+batch_job_manager = BatchJobManager(
+    insert_batch_size=settings.BATCH_INSERT_SIZE,
+    retention_seconds=settings.BATCH_JOB_RETENTION_SECONDS,
+)
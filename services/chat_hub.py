@@ -0,0 +1,147 @@
+"""
+In-process pub/sub события чатов.
+
+Позволяет нескольким вкладкам и устройствам с открытым чатом получать
+чанки текущей генерации из одного общего upstream потока вместо
+повторных перезагрузок чата.
+
+Особенности:
+- Подписки индексированы по chat_id
+- У каждого подписчика ограниченная очередь событий
+- Медленный подписчик, переполнивший очередь, отключается
+  (slow-consumer drop), не замедляя генерацию и других подписчиков
+- Новый подписчик сразу получает уже сгенерированную часть ответа
+"""
+
+import asyncio
+import uuid
+from collections.abc import AsyncGenerator, Callable, Iterable
+
+from core.config import settings
+from services.sse import encode_error_event
+
+KEEPALIVE_EVENT = ": keepalive\n\n"
+
+
+class _Subscriber:
+    """Подписчик чата с ограниченной очередью событий."""
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def offer(self, event: str) -> bool:
+        """Кладёт событие в очередь. False, если очередь переполнена."""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def drop(self) -> None:
+        """Отключает подписчика: очищает очередь и кладёт маркер конца."""
+        self.dropped = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class ChatHub:
+    """Рассылка событий генерации всем подписчикам чата."""
+
+    def __init__(self, queue_size: int, keepalive_seconds: float):
+        self.queue_size = queue_size
+        self.keepalive_seconds = keepalive_seconds
+        self._subscribers: dict[uuid.UUID, set[_Subscriber]] = {}
+
+        # Метрики
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, chat_id: uuid.UUID, event: str) -> None:
+        """
+        Рассылает событие подписчикам чата без ожидания.
+
+        Args:
+            chat_id: ID чата
+            event: Закодированное SSE событие
+        """
+        subscribers = self._subscribers.get(chat_id)
+        if not subscribers:
+            return
+        self.published += 1
+        for subscriber in list(subscribers):
+            if not subscriber.dropped and not subscriber.offer(event):
+                subscriber.drop()
+                self.dropped += 1
+
+    async def subscribe(
+        self,
+        chat_id: uuid.UUID,
+        backlog: Callable[[], Iterable[str]] | None = None,
+        on_leave: Callable[[], None] | None = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Подписка на события чата.
+
+        Args:
+            chat_id: ID чата
+            backlog: Возвращает события текущей генерации, отправленные
+                до подписки. Вызывается в момент регистрации подписчика,
+                поэтому события не теряются и не дублируются
+            on_leave: Вызывается после отписки
+
+        Yields:
+            SSE события и keepalive комментарии
+        """
+        # Снимок backlog и регистрация - без await между ними. Backlog отдаётся
+        # мимо ограниченной очереди: он может быть больше её размера
+        replay = list(backlog()) if backlog is not None else []
+        subscriber = _Subscriber(self.queue_size)
+        self._subscribers.setdefault(chat_id, set()).add(subscriber)
+
+        try:
+            for event in replay:
+                yield event
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=self.keepalive_seconds
+                    )
+                except asyncio.TimeoutError:
+                    # Комментарий SSE не даёт прокси закрыть простаивающее соединение
+                    yield KEEPALIVE_EVENT
+                    continue
+                if event is None:
+                    yield encode_error_event("Клиент не успевает читать события, подписка закрыта")
+                    return
+                yield event
+        finally:
+            subscribers = self._subscribers.get(chat_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[chat_id]
+            if on_leave is not None:
+                on_leave()
+
+    def subscriber_count(self, chat_id: uuid.UUID) -> int:
+        """Количество подписчиков чата."""
+        return len(self._subscribers.get(chat_id, ()))
+
+    def stats(self) -> dict:
+        """Метрики подписок для мониторинга."""
+        return {
+            "chats": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "queue_size": self.queue_size,
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+# Глобальный хаб событий чатов
+chat_hub = ChatHub(
+    queue_size=settings.CHAT_HUB_QUEUE_SIZE,
+    keepalive_seconds=settings.CHAT_HUB_KEEPALIVE_SECONDS,
+)
@@ -0,0 +1,98 @@
+"""
+Денормализованная сводка чата: время, количество и превью последнего сообщения.
+
+Сводка обновляется в той же транзакции, что и INSERT сообщений, поэтому
+список чатов сортируется по активности одним проходом по индексу
+ix_chats_user_last_message без JOIN и агрегации по messages.
+
+last_message_at - created_at самого нового сообщения чата (как у сообщений,
+а не время транзакции) и только растёт: запись более старого сообщения
+его не уменьшает.
+
+Usage:
+    db.add(message)
+    await record_chat_activity(
+        db, chat_id, added=1, last_content=message.content,
+        last_message_at=message.created_at,
+    )
+    await db.commit()
+"""
+
+import uuid
+from collections.abc import Iterable
+from datetime import datetime
+
+from sqlalchemy import func, literal, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.chat import Chat
+
+# Длина превью (совпадает с размером колонки last_message_preview)
+PREVIEW_LENGTH = 200
+
+
+def make_preview(content: str) -> str:
+    """Превью сообщения: начало текста с пробелами и переводами строк, схлопнутыми в один пробел."""
+    return " ".join(content.split())[:PREVIEW_LENGTH]
+
+
+async def record_chat_activity(
+    session: AsyncSession,
+    chat_id: uuid.UUID,
+    added: int,
+    last_content: str | None,
+    last_message_at: datetime,
+) -> None:
+    """
+    Обновляет сводку чата в текущей транзакции.
+
+    Args:
+        session: Сессия, в которой добавляются сообщения
+        chat_id: ID чата
+        added: Сколько сообщений добавлено (0 - сообщение обновлено)
+        last_content: Текст последнего сообщения (пустой - превью не меняется)
+        last_message_at: created_at записанного сообщения
+    """
+    values = {
+        "message_count": Chat.message_count + added,
+        "last_message_at": func.greatest(
+            Chat.last_message_at, literal(last_message_at, Chat.last_message_at.type)
+        ),
+    }
+    preview = make_preview(last_content) if last_content else ""
+    if preview:
+        values["last_message_preview"] = preview
+
+    await session.execute(
+        update(Chat)
+        .where(Chat.id == chat_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def record_rows_activity(session: AsyncSession, rows: Iterable[dict]) -> None:
+    """
+    Обновляет сводки чатов по строкам multi-row INSERT в messages.
+
+    Строки должны содержать chat_id, content и created_at.
+
+    Чаты обновляются в порядке chat_id, чтобы параллельные транзакции
+    блокировали строки chats в одном порядке и не взаимоблокировались.
+    """
+    activity: dict[uuid.UUID, dict] = {}
+    for row in rows:
+        entry = activity.setdefault(row["chat_id"], {"added": 0, "row": row})
+        entry["added"] += 1
+        if row["created_at"] >= entry["row"]["created_at"]:
+            entry["row"] = row
+
+    for chat_id in sorted(activity):
+        entry = activity[chat_id]
+        await record_chat_activity(
+            session,
+            chat_id,
+            added=entry["added"],
+            last_content=entry["row"]["content"],
+            last_message_at=entry["row"]["created_at"],
+        )
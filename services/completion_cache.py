@@ -0,0 +1,148 @@
+"""
+Кэш точных совпадений для ответов Gemini.
+
+Ключ кэша строится из модели, нормализованного промпта, системной
+инструкции и хеша контекста диалога. Ответ хранится как последовательность
+чанков, поэтому попадание в кэш воспроизводится обычным SSE потоком.
+Вместе с ответом хранятся счётчики токенов исходного запроса.
+
+Особенности:
+- TTL и ограничение размера (LRU вытеснение)
+- Настройка TTL по моделям (0 - кэш для модели выключен)
+- Счётчики попаданий и промахов для оценки экономии
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from google.genai import types
+
+from core.config import settings
+from services.token_accounting import TokenUsage
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Нормализует промпт: обрезает края и схлопывает пробельные символы."""
+    return " ".join(prompt.split())
+
+
+def hash_context(history: list[types.Content] | None) -> str:
+    """Хеш истории диалога (роль и текст каждой реплики)."""
+    digest = hashlib.sha256()
+    for content in history or []:
+        digest.update((content.role or "").encode("utf-8"))
+        digest.update(b"\x00")
+        for part in content.parts or []:
+            digest.update((part.text or "").encode("utf-8"))
+            digest.update(b"\x00")
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+def make_completion_key(
+    model: str,
+    prompt: str,
+    system_prompt: str | None,
+    context_hash: str,
+) -> str:
+    """Строит ключ запроса (model, prompt, system instruction, context hash)."""
+    digest = hashlib.sha256()
+    for value in (model, normalize_prompt(prompt), system_prompt or "", context_hash):
+        digest.update(value.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+@dataclass(slots=True)
+class CachedCompletion:
+    """Запись кэша: чанки ответа, счётчики токенов и момент истечения."""
+
+    chunks: tuple[str, ...]
+    usage: TokenUsage
+    expires_at: float
+
+
+class CompletionCache:
+    """LRU/TTL кэш ответов модели."""
+
+    def __init__(
+        self,
+        enabled: bool,
+        max_entries: int,
+        default_ttl: float,
+        model_ttls: dict[str, int],
+    ):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.model_ttls = model_ttls
+        self._entries: OrderedDict[str, CachedCompletion] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def ttl_for(self, model: str) -> float:
+        """TTL кэша для модели (0 - не кэшировать)."""
+        return self.model_ttls.get(model, self.default_ttl)
+
+    def is_enabled_for(self, model: str) -> bool:
+        return self.enabled and self.ttl_for(model) > 0
+
+    def get(self, key: str) -> CachedCompletion | None:
+        """Возвращает запись с ответом или None при промахе."""
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(
+        self,
+        key: str,
+        model: str,
+        chunks: list[str],
+        usage: TokenUsage | None = None,
+    ) -> None:
+        """Сохраняет полный ответ модели и его счётчики токенов."""
+        if not chunks:
+            return
+        self._entries[key] = CachedCompletion(
+            chunks=tuple(chunks),
+            usage=TokenUsage(
+                prompt_tokens=usage.prompt_tokens if usage else None,
+                completion_tokens=usage.completion_tokens if usage else None,
+            ),
+            expires_at=time.monotonic() + self.ttl_for(model),
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int | float | bool]:
+        """Счётчики кэша для мониторинга."""
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# Глобальный кэш ответов
+completion_cache = CompletionCache(
+    enabled=settings.COMPLETION_CACHE_ENABLED,
+    max_entries=settings.COMPLETION_CACHE_MAX_ENTRIES,
+    default_ttl=settings.COMPLETION_CACHE_TTL_SECONDS,
+    model_ttls=settings.COMPLETION_CACHE_MODEL_TTLS,
+)
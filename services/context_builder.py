@@ -0,0 +1,202 @@
+"""
+Сборка контекста диалога для многоходовых чатов.
+
+Поддерживает:
+- Выборку последних сообщений чата по индексу ix_messages_chat_created
+- Ограничение истории токенным бюджетом модели (по Message.token_count)
+- LRU кэш подготовленной истории на чат в памяти процесса
+- Инкрементальное дополнение кэша новыми репликами без перечитывания чата
+- Проверку свежести кэша по chats.message_count: сообщения, записанные
+  другим воркером, приводят к перечитыванию истории
+- В историю попадают только завершённые и прерванные ответы
+  (не генерирующиеся и не упавшие)
+"""
+
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+
+from google.genai import types
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from models.chat import Chat
+from models.message import Message, MessageRole, MessageStatus
+from services.token_accounting import estimate_tokens
+
+# Соответствие ролей сообщений ролям Gemini (system в историю не попадает)
+_GEMINI_ROLES: dict[str, str] = {
+    MessageRole.USER.value: "user",
+    MessageRole.ASSISTANT.value: "model",
+}
+
+# Статусы сообщений, попадающих в историю
+_HISTORY_STATUSES = (MessageStatus.COMPLETE, MessageStatus.INTERRUPTED)
+
+
+@dataclass(frozen=True, slots=True)
+class ContextEntry:
+    """Подготовленная реплика истории."""
+
+    content: types.Content
+    tokens: int
+
+
+class _ChatHistory:
+    """Кэшированная история одного чата, упорядоченная от старых к новым."""
+
+    def __init__(self, max_tokens: int, message_count: int):
+        self.max_tokens = max_tokens
+        # chats.message_count, которому соответствует история
+        self.message_count = message_count
+        self.entries: deque[ContextEntry] = deque()
+        self.total_tokens = 0
+
+    def append(self, entry: ContextEntry) -> None:
+        self.entries.append(entry)
+        self.total_tokens += entry.tokens
+        # Держим в кэше не больше максимального бюджета среди моделей
+        while self.total_tokens > self.max_tokens and len(self.entries) > 1:
+            self.total_tokens -= self.entries.popleft().tokens
+
+    def window(self, budget: int) -> list[types.Content]:
+        """Возвращает самый длинный хвост истории, укладывающийся в бюджет."""
+        selected: list[types.Content] = []
+        used = 0
+        for entry in reversed(self.entries):
+            if used + entry.tokens > budget:
+                break
+            selected.append(entry.content)
+            used += entry.tokens
+        selected.reverse()
+        # История Gemini должна начинаться с реплики пользователя
+        while selected and selected[0].role != "user":
+            selected.pop(0)
+        return selected
+
+
+class ChatContextBuilder:
+    """Строит историю диалога для Gemini с кэшированием по chat_id."""
+
+    def __init__(self, cache_size: int, max_messages: int):
+        self.cache_size = cache_size
+        self.max_messages = max_messages
+        self._cache: OrderedDict[uuid.UUID, _ChatHistory] = OrderedDict()
+
+    @staticmethod
+    def budget_for(model: str) -> int:
+        """Токенный бюджет истории для модели."""
+        return settings.CONTEXT_MODEL_TOKEN_BUDGETS.get(
+            model, settings.CONTEXT_TOKEN_BUDGET
+        )
+
+    @staticmethod
+    def _max_budget() -> int:
+        return max(
+            [settings.CONTEXT_TOKEN_BUDGET, *settings.CONTEXT_MODEL_TOKEN_BUDGETS.values()]
+        )
+
+    @staticmethod
+    def _make_entry(role: str, content: str, token_count: int | None) -> ContextEntry | None:
+        gemini_role = _GEMINI_ROLES.get(getattr(role, "value", role))
+        if gemini_role is None or not content:
+            return None
+        return ContextEntry(
+            content=types.Content(role=gemini_role, parts=[types.Part(text=content)]),
+            tokens=token_count if token_count is not None else estimate_tokens(content),
+        )
+
+    async def build(
+        self,
+        db: AsyncSession,
+        chat_id: uuid.UUID,
+        model: str,
+    ) -> list[types.Content]:
+        """
+        Возвращает историю чата, укладывающуюся в бюджет модели.
+
+        Свежесть кэша проверяется по chats.message_count (чтение строки
+        чата по первичному ключу). При промахе или расхождении счётчика
+        читает последние сообщения одним запросом по (chat_id, created_at DESC),
+        используя ix_messages_chat_created.
+
+        Args:
+            db: Async сессия
+            chat_id: ID чата
+            model: Модель Gemini, определяющая бюджет
+
+        Returns:
+            Список types.Content от старых реплик к новым
+        """
+        message_count = await db.scalar(
+            select(Chat.message_count).where(Chat.id == chat_id)
+        ) or 0
+        history = self._cache.get(chat_id)
+        if history is None or history.message_count != message_count:
+            # Чат изменён в обход кэша (другим воркером или пакетной задачей)
+            history = await self._load(db, chat_id, message_count)
+            self._store(chat_id, history)
+        else:
+            self._cache.move_to_end(chat_id)
+        return history.window(self.budget_for(model))
+
+    def append(
+        self,
+        chat_id: uuid.UUID,
+        role: str,
+        content: str,
+        token_count: int | None = None,
+    ) -> None:
+        """
+        Дописывает реплику в кэшированную историю чата.
+
+        Вызывается после commit сообщения. Если история чата не закэширована,
+        ничего не делает: при следующем обращении она будет прочитана из БД
+        целиком. Если кэш успел разойтись с БД, расхождение счётчика
+        сообщений приведёт к перечитыванию истории.
+        """
+        history = self._cache.get(chat_id)
+        if history is None:
+            return
+        history.message_count += 1
+        entry = self._make_entry(role, content, token_count)
+        if entry is not None:
+            history.append(entry)
+
+    def invalidate(self, chat_id: uuid.UUID) -> None:
+        """Удаляет историю чата из кэша."""
+        self._cache.pop(chat_id, None)
+
+    async def _load(
+        self, db: AsyncSession, chat_id: uuid.UUID, message_count: int
+    ) -> _ChatHistory:
+        result = await db.execute(
+            select(Message.role, Message.content, Message.token_count)
+            .where(
+                Message.chat_id == chat_id,
+                Message.status.in_(_HISTORY_STATUSES),
+            )
+            .order_by(Message.created_at.desc())
+            .limit(self.max_messages)
+        )
+        rows = result.all()
+
+        history = _ChatHistory(max_tokens=self._max_budget(), message_count=message_count)
+        for role, content, token_count in reversed(rows):
+            entry = self._make_entry(role, content, token_count)
+            if entry is not None:
+                history.append(entry)
+        return history
+
+    def _store(self, chat_id: uuid.UUID, history: _ChatHistory) -> None:
+        self._cache[chat_id] = history
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+# Глобальный экземпляр сборщика контекста
+context_builder = ChatContextBuilder(
+    cache_size=settings.CONTEXT_CACHE_SIZE,
+    max_messages=settings.CONTEXT_MAX_MESSAGES,
+)
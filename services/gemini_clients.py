@@ -0,0 +1,204 @@
+"""
+Пул переиспользуемых клиентов Google Gemini.
+
+Держит по одному долгоживущему genai.Client на каждый уникальный API ключ
+(серверный ключ и персональные ключи пользователей). Переиспользование
+клиента сохраняет TLS-сессию и keep-alive соединения httpx между запросами.
+
+Особенности:
+- Ключи пула - SHA-256 отпечатки, сырые ключи не хранятся в индексе
+- LRU вытеснение при превышении размера пула
+- TTL по времени простоя клиента
+- Счётчик использований: вытесненный клиент, через который ещё идёт
+  запрос, закрывается только после его завершения
+- Корректное закрытие вытесненных клиентов и всего пула при остановке
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from google import genai
+from google.genai import errors
+
+from core.config import settings
+
+
+def fingerprint_api_key(api_key: str | None) -> str:
+    """Возвращает отпечаток API ключа (SHA-256), безопасный для логов и кэшей."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+
+# Коды ответа API, означающие, что ключ отклонён
+AUTH_ERROR_CODES = frozenset({400, 401, 403})
+
+
+def is_auth_error(error: BaseException) -> bool:
+    """Отклонил ли API ключ (а не лимиты, сбой сервера или сети)."""
+    return isinstance(error, errors.ClientError) and error.code in AUTH_ERROR_CODES
+
+
+@dataclass
+class _PooledClient:
+    """Запись пула: клиент, время последнего использования и число активных запросов."""
+
+    client: genai.Client
+    last_used: float
+    in_use: int = 0
+    # Вытеснен из пула, закрывается после завершения последнего запроса
+    retired: bool = False
+
+
+class GeminiClientPool:
+    """
+    LRU/TTL реестр клиентов Gemini, индексированный по отпечатку ключа.
+
+    Все операции синхронные и не содержат await, поэтому безопасны
+    в рамках одного event loop без дополнительных блокировок.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clients: OrderedDict[str, _PooledClient] = OrderedDict()
+        # id клиента -> запись, пока через клиент идут запросы
+        self._leased: dict[int, _PooledClient] = {}
+        self._closing: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def get(self, api_key: str | None) -> genai.Client:
+        """
+        Возвращает клиент для ключа, создавая его при необходимости.
+
+        Клиент не защищён от закрытия при вытеснении: для запросов
+        используйте acquire/release или use.
+
+        Args:
+            api_key: API ключ Google
+
+        Returns:
+            Долгоживущий клиент genai.Client
+        """
+        return self._entry(api_key).client
+
+    def acquire(self, api_key: str | None) -> genai.Client:
+        """
+        Возвращает клиент для ключа и отмечает его занятым до release.
+
+        Args:
+            api_key: API ключ Google
+
+        Returns:
+            Клиент, который не будет закрыт до парного вызова release
+        """
+        entry = self._entry(api_key)
+        entry.in_use += 1
+        self._leased[id(entry.client)] = entry
+        return entry.client
+
+    def release(self, client: genai.Client) -> None:
+        """Освобождает клиент, полученный через acquire."""
+        entry = self._leased.get(id(client))
+        if entry is None:
+            return
+        entry.in_use -= 1
+        entry.last_used = time.monotonic()
+        if entry.in_use == 0:
+            del self._leased[id(client)]
+            if entry.retired:
+                self._schedule_close(entry.client)
+
+    @contextmanager
+    def use(self, api_key: str | None) -> Iterator[genai.Client]:
+        """Клиент для ключа на время блока with (acquire/release)."""
+        client = self.acquire(api_key)
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    def discard(self, api_key: str) -> None:
+        """Удаляет клиент ключа из пула (например, если ключ невалиден)."""
+        entry = self._clients.pop(fingerprint_api_key(api_key), None)
+        if entry is not None:
+            self._retire(entry)
+
+    def _entry(self, api_key: str | None) -> _PooledClient:
+        now = time.monotonic()
+        self._evict_expired(now)
+
+        key = fingerprint_api_key(api_key)
+        entry = self._clients.get(key)
+        if entry is not None:
+            entry.last_used = now
+            self._clients.move_to_end(key)
+            return entry
+
+        entry = _PooledClient(client=genai.Client(api_key=api_key), last_used=now)
+        self._clients[key] = entry
+
+        while len(self._clients) > self.max_size:
+            _, evicted = self._clients.popitem(last=False)
+            self._retire(evicted)
+
+        return entry
+
+    def _retire(self, entry: _PooledClient) -> None:
+        """Закрывает вытесненный клиент сразу или после завершения его запросов."""
+        if entry.in_use:
+            entry.retired = True
+        else:
+            self._schedule_close(entry.client)
+
+    async def close(self) -> None:
+        """Закрывает все клиенты пула. Вызывается при остановке приложения."""
+        entries = list(self._clients.values())
+        entries += [e for e in self._leased.values() if e.retired]
+        self._clients.clear()
+        self._leased.clear()
+        for entry in entries:
+            await self._close_client(entry.client)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    def _evict_expired(self, now: float) -> None:
+        """Вытесняет клиенты, простаивающие дольше TTL."""
+        # OrderedDict упорядочен по последнему использованию - идём с начала
+        while self._clients:
+            key, entry = next(iter(self._clients.items()))
+            if now - entry.last_used < self.ttl_seconds:
+                break
+            del self._clients[key]
+            self._retire(entry)
+
+    def _schedule_close(self, client: genai.Client) -> None:
+        """Закрывает вытесненный клиент в фоне, не блокируя текущий запрос."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            client.close()
+            return
+        task = loop.create_task(self._close_client(client))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_client(client: genai.Client) -> None:
+        """Закрывает синхронный и асинхронный транспорты клиента."""
+        try:
+            await client.aio.aclose()
+        finally:
+            client.close()
+
+
+# Глобальный пул клиентов
+gemini_client_pool = GeminiClientPool(
+    max_size=settings.GEMINI_CLIENT_POOL_SIZE,
+    ttl_seconds=settings.GEMINI_CLIENT_TTL_SECONDS,
+)
@@ -5,18 +5,100 @@
 - Потоковую передачу ответов (streaming)
 - Управление историей чата
 - Контекст диалога
+- Системные инструкции (system_instruction)
 - Пользовательские API ключи
 - Выбор модели
+- Пул переиспользуемых клиентов по API ключу
+- Кэш точных совпадений ответов
+- Single-flight объединение одинаковых одновременных запросов
+- Rate limit и справедливую очередь upstream запросов
+- Fallback на резервную модель и хеджирование медленных запросов
+- Подключаемые провайдеры (Gemini или офлайн fake для бенчмарков)
 """
 
 import asyncio
-from collections.abc import AsyncGenerator
+import time
+from collections.abc import AsyncGenerator, AsyncIterator
 from typing import Any, Optional
 
 from google import genai
 from google.genai import types
 
 from config import config_env
+from core.config import settings
+from services.completion_cache import (
+    completion_cache,
+    hash_context,
+    make_completion_key,
+)
+from services.gemini_clients import fingerprint_api_key, gemini_client_pool
+from services.hedging import resilient_stream, ttft_tracker
+from services.llm_providers import LLMProvider, llm_provider
+from services.scheduler import gemini_scheduler
+from services.token_accounting import TokenUsage, estimate_tokens
+
+
+class _InFlightStream:
+    """
+    Разделяемый upstream поток для одинаковых одновременных запросов.
+
+    Первый запрос запускает задачу-производителя, остальные подписываются
+    на ту же последовательность чанков, включая уже полученные.
+    Если все подписчики отключились, upstream запрос отменяется.
+    """
+
+    def __init__(self, source: AsyncIterator[str], usage: TokenUsage):
+        self.chunks: list[str] = []
+        self.usage = usage
+        self.done = False
+        self.cancelled = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self._source = source
+        self.task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self.task = asyncio.get_running_loop().create_task(self._produce())
+
+    async def _produce(self) -> None:
+        try:
+            async for chunk in self._source:
+                self.chunks.append(chunk)
+                self._notify()
+        except BaseException as e:
+            self.error = e
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            self.done = True
+            self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncGenerator[str, None]:
+        """Отдаёт все чанки потока с начала, затем новые по мере поступления."""
+        self.subscribers += 1
+        try:
+            index = 0
+            while True:
+                if index < len(self.chunks):
+                    chunk = self.chunks[index]
+                    index += 1
+                    yield chunk
+                elif self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                else:
+                    await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done and self.task is not None:
+                self.cancelled = True
+                self.task.cancel()
 
 
 class GeminiService:
@@ -28,14 +110,16 @@ class GeminiService:
         "gemini-3-flash-preview",
     ]
 
-    def __init__(self):
+    def __init__(self, provider: LLMProvider):
+        self.provider = provider
         self.default_api_key = config_env.API_KEY
         self.default_model = "gemini-2.5-flash-lite"
+        self._in_flight: dict[str, _InFlightStream] = {}
 
     def get_client(self, api_key: Optional[str] = None) -> genai.Client:
-        """Получает клиент Gemini с указанным API ключом."""
+        """Получает клиент Gemini с указанным API ключом из пула."""
         key = api_key or self.default_api_key
-        return genai.Client(api_key=key)
+        return gemini_client_pool.get(key)
 
     async def stream_response(
         self,
@@ -43,53 +127,191 @@ class GeminiService:
         model: Optional[str] = None,
         api_key: Optional[str] = None,
         system_prompt: str | None = None,
+        history: Optional[list[types.Content]] = None,
+        user_id: str | None = None,
+        usage: TokenUsage | None = None,
     ) -> AsyncGenerator[str, None]:
         """
         Потоковая передача ответа от Gemini.
 
+        Использует асинхронный клиент (client.aio): чанки апстрима
+        пробрасываются сразу по мере поступления, без буферизации
+        и искусственных задержек. Эффект печати - задача клиента.
+
         Args:
             message: Сообщение пользователя
             model: Модель Gemini (по умолчанию gemini-2.5-flash-lite)
             api_key: Персональный API ключ (опционально)
             system_prompt: Системный промпт (опционально)
+            history: Предыдущие реплики диалога (опционально)
+            user_id: ID пользователя для справедливой очереди (опционально)
+            usage: Заполняется счётчиками токенов из usage metadata (опционально)
 
         Yields:
-            Части ответа (chunks) - по одному символу для плавного отображения
+            Части ответа (chunks) в том виде, в котором их отдаёт Gemini
+
+        Raises:
+            SchedulerRejected: Если очередь к API ключу переполнена
         """
-        client = self.get_client(api_key)
         model_name = model or self.default_model
+        use_cache = completion_cache.is_enabled_for(model_name)
+
+        if not use_cache and not settings.SINGLE_FLIGHT_ENABLED:
+            async for chunk in self._stream_resilient(
+                message, model_name, api_key, system_prompt, history, user_id, usage
+            ):
+                yield chunk
+            return
 
-        # Создаём чат
-        chat = client.chats.create(
-            model=model_name,
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(thinking_budget=0)
-            ),
+        request_key = make_completion_key(
+            model_name, message, system_prompt, hash_context(history)
         )
 
-        # Добавляем system prompt если есть
-        if system_prompt:
-            chat.send_message(f"System instruction: {system_prompt}")
+        if use_cache:
+            cached = completion_cache.get(request_key)
+            if cached is not None:
+                for chunk in cached.chunks:
+                    yield chunk
+                if usage is not None:
+                    usage.prompt_tokens = cached.usage.prompt_tokens
+                    usage.completion_tokens = cached.usage.completion_tokens
+                return
+
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            # Кэшируем только полностью полученный ответ
+            chunks: list[str] = []
+            if usage is None:
+                usage = TokenUsage()
+            async for chunk in self._stream_resilient(
+                message, model_name, api_key, system_prompt, history, user_id, usage
+            ):
+                chunks.append(chunk)
+                yield chunk
+            completion_cache.put(request_key, model_name, chunks, usage)
+            return
+
+        # Одинаковые одновременные запросы подписываются на один upstream поток.
+        # Только в пределах одного API ключа: чужой запрос не должен идти
+        # по персональному ключу пользователя и мимо лимитов своего ключа
+        flight_key = f"{request_key}:{fingerprint_api_key(api_key or settings.API_KEY)}"
+        flight = self._in_flight.get(flight_key)
+        if flight is None or flight.cancelled:
+            flight_usage = TokenUsage()
+            flight = _InFlightStream(
+                self._stream_resilient(
+                    message, model_name, api_key, system_prompt, history, user_id,
+                    flight_usage,
+                ),
+                flight_usage,
+            )
+            self._in_flight[flight_key] = flight
+            flight.start()
+            flight.task.add_done_callback(
+                lambda task: self._finish_flight(
+                    flight_key, request_key, flight, model_name, use_cache
+                )
+            )
+
+        async for chunk in flight.subscribe():
+            yield chunk
+        if usage is not None:
+            usage.prompt_tokens = flight.usage.prompt_tokens
+            usage.completion_tokens = flight.usage.completion_tokens
+
+    def _finish_flight(
+        self,
+        flight_key: str,
+        request_key: str,
+        flight: _InFlightStream,
+        model_name: str,
+        use_cache: bool,
+    ) -> None:
+        """Снимает завершённый поток с учёта и кэширует успешный ответ."""
+        if self._in_flight.get(flight_key) is flight:
+            del self._in_flight[flight_key]
+        if use_cache and flight.error is None and not flight.task.cancelled():
+            completion_cache.put(request_key, model_name, flight.chunks, flight.usage)
+
+    def _stream_resilient(
+        self,
+        message: str,
+        model_name: str,
+        api_key: Optional[str],
+        system_prompt: str | None,
+        history: Optional[list[types.Content]],
+        user_id: str | None = None,
+        usage: TokenUsage | None = None,
+    ) -> AsyncIterator[str]:
+        """Upstream поток с fallback на резервную модель и хеджированием."""
+
+        def attempt(target_model: str, admitted: asyncio.Event | None = None):
+            return lambda: self._stream_upstream(
+                message, target_model, api_key, system_prompt, history, user_id, usage,
+                admitted,
+            )
+
+        if not settings.MODEL_FALLBACK_ENABLED and not settings.HEDGING_ENABLED:
+            return attempt(model_name)()
+
+        # Резерв - другая модель, если она настроена, иначе повтор той же модели
+        backup_model = model_name
+        if settings.MODEL_FALLBACK_ENABLED:
+            backup_model = settings.MODEL_FALLBACKS.get(model_name, model_name)
+
+        hedge_delay = None
+        if settings.HEDGING_ENABLED:
+            hedge_delay = ttft_tracker.hedge_delay(model_name)
 
-        # Потоковая передача ответа
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: chat.send_message_stream(message),
+        # Дедлайн хеджа отсчитывается от выхода основного запроса из планировщика
+        admitted = asyncio.Event()
+        return resilient_stream(
+            attempt(model_name, admitted), attempt(backup_model), hedge_delay, admitted
         )
 
-        # Собираем весь текст из streaming response
-        full_text = ""
-        for chunk in response:
-            if chunk.text:
-                full_text += chunk.text
+    async def _stream_upstream(
+        self,
+        message: str,
+        model_name: str,
+        api_key: Optional[str],
+        system_prompt: str | None,
+        history: Optional[list[types.Content]],
+        user_id: str | None = None,
+        usage: TokenUsage | None = None,
+        admitted: asyncio.Event | None = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Выполняет потоковый запрос к провайдеру через планировщик.
+
+        admitted устанавливается, когда запрос прошёл планировщик.
+        """
+        key = api_key or self.default_api_key
+
+        # Ждём своей очереди по лимитам ключа (RPM/TPM)
+        request_tokens = estimate_tokens(message) + estimate_tokens(system_prompt or "")
+        for content in history or []:
+            for part in content.parts or []:
+                request_tokens += estimate_tokens(part.text or "")
+        await gemini_scheduler.acquire(key, user_id, request_tokens)
+        if admitted is not None:
+            admitted.set()
 
-        # Теперь отдаём посимвольно с правильной async задержкой
-        for i, char in enumerate(full_text):
-            yield char
-            # Задержка каждые 3 символа для создания эффекта печати
-            if i % 3 == 0:
-                await asyncio.sleep(0.01)
+        started_at = time.monotonic()
+        first_chunk = True
+        try:
+            async for chunk in self.provider.stream(
+                message, model_name, key, system_prompt, history, usage
+            ):
+                if first_chunk:
+                    ttft_tracker.record(model_name, time.monotonic() - started_at)
+                    first_chunk = False
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            # Попытка отменена до первого токена (например, проиграла хедж):
+            # её TTFT не меньше прошедшего времени. Без этой нижней оценки
+            # окно видит только быстрые ответы и дедлайн хеджа занижается
+            if first_chunk:
+                ttft_tracker.record(model_name, time.monotonic() - started_at)
+            raise
 
     async def test_api_key(self, api_key: str) -> bool:
         """
@@ -98,17 +320,13 @@ class GeminiService:
         Returns:
             True если ключ действителен, False иначе
         """
-        try:
-            client = self.get_client(api_key)
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                lambda: client.models.list(),
-            )
-            return True
-        except Exception:
-            return False
+        return await self.provider.test_api_key(api_key)
+
+    async def close(self) -> None:
+        """Останавливает планировщик и освобождает ресурсы провайдера."""
+        await gemini_scheduler.close()
+        await self.provider.close()
 
 
 # Глобальный экземпляр сервиса
-gemini_service = GeminiService()
+gemini_service = GeminiService(llm_provider)
@@ -0,0 +1,183 @@
+"""
+Хеджирование запросов и автоматический fallback между моделями Gemini.
+
+Поддерживает:
+- Учёт времени до первого токена (TTFT) по моделям, включая попытки,
+  отменённые до первого токена (прошедшее время как нижняя оценка)
+- Дедлайн хеджирования по перцентилю TTFT, отсчитываемый от выхода
+  основного запроса из очереди планировщика (как и замеры TTFT)
+- Запуск резервного запроса, если первый токен не пришёл вовремя:
+  побеждает поток, первым выдавший токен, проигравший отменяется
+- Переключение на резервную модель при ошибках 429/5xx до первого токена
+"""
+
+import asyncio
+from collections import deque
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+
+from google.genai.errors import APIError
+
+from core.config import settings
+from core.metrics import percentile
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Ошибки, при которых имеет смысл повторить запрос на другой модели."""
+    if isinstance(error, APIError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError))
+
+
+class TTFTTracker:
+    """Скользящее окно замеров TTFT по каждой модели."""
+
+    def __init__(self, window: int, percentile: float, default_delay: float, min_samples: int):
+        self.window = window
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self._samples: dict[str, deque[float]] = {}
+
+    def record(self, model: str, seconds: float) -> None:
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = self._samples[model] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def hedge_delay(self, model: str) -> float:
+        """Дедлайн первого токена: перцентиль TTFT или значение по умолчанию."""
+        samples = self._samples.get(model)
+        if not samples or len(samples) < self.min_samples:
+            return self.default_delay
+        return percentile(samples, self.percentile)
+
+    def stats(self) -> dict[str, dict[str, float | int]]:
+        return {
+            model: {"samples": len(samples), "hedge_delay": round(self.hedge_delay(model), 4)}
+            for model, samples in self._samples.items()
+        }
+
+
+async def _first_chunk(stream: AsyncIterator[str]) -> str | None:
+    """Первый чанк потока или None, если поток пуст."""
+    return await anext(stream, None)
+
+
+async def _close(stream: AsyncIterator[str], first: asyncio.Task | None = None) -> None:
+    """Отменяет ожидание первого чанка и закрывает поток."""
+    if first is not None and not first.done():
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+async def resilient_stream(
+    primary: Callable[[], AsyncIterator[str]],
+    backup: Callable[[], AsyncIterator[str]] | None,
+    hedge_delay: float | None,
+    primary_admitted: asyncio.Event | None = None,
+) -> AsyncGenerator[str, None]:
+    """
+    Поток с хеджированием и fallback до первого токена.
+
+    Args:
+        primary: Фабрика основного потока
+        backup: Фабрика резервного потока (другая модель или повтор)
+        hedge_delay: Дедлайн первого токена, None - без хеджирования
+        primary_admitted: Устанавливается, когда основной запрос прошёл
+            планировщик. Дедлайн отсчитывается от этого момента: ожидание
+            в очереди лимитов не повод дублировать запрос в ту же очередь
+
+    Yields:
+        Чанки победившего потока
+    """
+    streams: dict[asyncio.Task, AsyncIterator[str]] = {}
+
+    def launch(factory: Callable[[], AsyncIterator[str]]) -> None:
+        stream = factory()
+        streams[asyncio.create_task(_first_chunk(stream))] = stream
+
+    launch(primary)
+    backup_started = backup is None
+    winner: AsyncIterator[str] | None = None
+    first_chunk: str | None = None
+    last_error: BaseException | None = None
+    loop = asyncio.get_running_loop()
+    deadline: float | None = None
+    admitted: asyncio.Task | None = None
+    if primary_admitted is not None and hedge_delay is not None:
+        admitted = asyncio.ensure_future(primary_admitted.wait())
+
+    try:
+        while streams and winner is None:
+            timeout = None
+            waiting = set(streams)
+            if not backup_started and hedge_delay is not None:
+                if admitted is None or admitted.done():
+                    if deadline is None:
+                        deadline = loop.time() + hedge_delay
+                    timeout = max(deadline - loop.time(), 0.0)
+                else:
+                    # Основной запрос ещё в очереди планировщика
+                    waiting.add(admitted)
+            done, _ = await asyncio.wait(
+                waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            done.discard(admitted)
+
+            if not done:
+                if timeout is None:
+                    # Основной запрос прошёл планировщик - запускаем отсчёт
+                    continue
+                # Первый токен не пришёл вовремя - запускаем резервный запрос
+                launch(backup)
+                backup_started = True
+                continue
+
+            for task in done:
+                stream = streams.pop(task)
+                error = task.exception()
+                if error is None:
+                    # Пустой ответ (None) - тоже ответ
+                    if winner is None:
+                        winner, first_chunk = stream, task.result()
+                    else:
+                        await _close(stream)
+                else:
+                    last_error = error
+                    if not is_retryable(error):
+                        raise error
+
+            if winner is None and not streams:
+                if backup_started:
+                    raise last_error
+                # Ошибка 429/5xx до первого токена - переключаемся на резерв
+                launch(backup)
+                backup_started = True
+    finally:
+        if admitted is not None and not admitted.done():
+            admitted.cancel()
+        # Отменяем проигравшие потоки
+        for task, stream in streams.items():
+            await _close(stream, task)
+        streams.clear()
+
+    try:
+        if first_chunk is None:
+            return
+        yield first_chunk
+        async for chunk in winner:
+            yield chunk
+    finally:
+        await _close(winner)
+
+
+# Глобальный трекер TTFT
+ttft_tracker = TTFTTracker(
+    window=settings.HEDGE_TTFT_WINDOW,
+    percentile=settings.HEDGE_TTFT_PERCENTILE,
+    default_delay=settings.HEDGE_DEFAULT_DELAY_SECONDS,
+    min_samples=settings.HEDGE_MIN_SAMPLES,
+)
@@ -0,0 +1,231 @@
+"""
+Провайдеры LLM для GeminiService.
+
+Содержит:
+- LLMProvider - интерфейс потоковой генерации ответа
+- GeminiProvider - реализация на google.genai (асинхронный клиент из пула)
+- FakeProvider - офлайн провайдер с детерминированными чанками для
+  нагрузочного тестирования и бенчмарков без сети и расхода квоты
+
+Провайдер выбирается настройкой LLM_PROVIDER ("gemini" или "fake").
+"""
+
+import asyncio
+import hashlib
+import random
+from abc import ABC, abstractmethod
+from collections.abc import AsyncGenerator
+
+from google.genai import errors, types
+
+from core.config import Settings, settings
+from models.user_settings import UserSettings
+from services.gemini_clients import gemini_client_pool, is_auth_error
+from services.token_accounting import TokenUsage, estimate_tokens
+
+
+class LLMProvider(ABC):
+    """Интерфейс провайдера потоковой генерации."""
+
+    name: str
+
+    @abstractmethod
+    def stream(
+        self,
+        message: str,
+        model: str,
+        api_key: str | None,
+        system_prompt: str | None,
+        history: list[types.Content] | None,
+        usage: TokenUsage | None = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Потоковая генерация ответа.
+
+        Args:
+            message: Сообщение пользователя
+            model: Имя модели
+            api_key: API ключ провайдера
+            system_prompt: Системная инструкция
+            history: Предыдущие реплики диалога
+            usage: Заполняется счётчиками токенов (опционально)
+
+        Yields:
+            Непустые текстовые чанки ответа
+        """
+
+    @abstractmethod
+    async def test_api_key(self, api_key: str) -> bool:
+        """Проверяет API ключ."""
+
+    @abstractmethod
+    async def list_models(self, api_key: str) -> list[str]:
+        """
+        Модели, доступные ключу для генерации.
+
+        Raises:
+            errors.APIError: Если ключ отклонён провайдером или API недоступен
+        """
+
+    async def close(self) -> None:
+        """Освобождает ресурсы провайдера."""
+
+
+class GeminiProvider(LLMProvider):
+    """Провайдер Google Gemini через асинхронный клиент."""
+
+    name = "gemini"
+
+    async def stream(
+        self,
+        message: str,
+        model: str,
+        api_key: str | None,
+        system_prompt: str | None,
+        history: list[types.Content] | None,
+        usage: TokenUsage | None = None,
+    ) -> AsyncGenerator[str, None]:
+        # Клиент занят до конца потока: вытеснение из пула его не закроет
+        with gemini_client_pool.use(api_key) as client:
+            # Создаём асинхронный чат с историей диалога.
+            # System prompt передаётся нативно через system_instruction,
+            # без отдельного запроса к модели.
+            chat = client.aio.chats.create(
+                model=model,
+                config=types.GenerateContentConfig(
+                    thinking_config=types.ThinkingConfig(thinking_budget=0),
+                    system_instruction=system_prompt or None,
+                ),
+                history=history or [],
+            )
+
+            # Пробрасываем чанки сразу, не блокируя event loop
+            response = await chat.send_message_stream(message)
+            async for chunk in response:
+                if usage is not None:
+                    usage.update_from(chunk.usage_metadata)
+                if chunk.text:
+                    yield chunk.text
+
+    async def test_api_key(self, api_key: str) -> bool:
+        try:
+            await self.list_models(api_key)
+            return True
+        except Exception:
+            return False
+
+    async def list_models(self, api_key: str) -> list[str]:
+        try:
+            with gemini_client_pool.use(api_key) as client:
+                pager = await client.aio.models.list()
+                models = []
+                async for model in pager:
+                    actions = model.supported_actions or []
+                    if model.name and (not actions or "generateContent" in actions):
+                        models.append(model.name.removeprefix("models/"))
+                return models
+        except Exception as e:
+            # Отклонённый ключ не должен занимать место в пуле. Лимиты и сбои
+            # API не повод выбрасывать клиент; занятый клиент пул закроет
+            # только после завершения его запросов
+            if is_auth_error(e):
+                gemini_client_pool.discard(api_key)
+            raise
+
+    async def close(self) -> None:
+        await gemini_client_pool.close()
+
+
+class FakeProvider(LLMProvider):
+    """
+    Офлайн провайдер с детерминированным ответом.
+
+    Текст ответа зависит только от seed, модели и промпта. Задержки
+    (TTFT, между чанками), размер чанка и доля ошибок настраиваются.
+    Ошибки имитируют 503 от Gemini, чтобы срабатывал fallback.
+    """
+
+    name = "fake"
+
+    _WORDS = (
+        "lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing",
+        "elit", "sed", "do", "eiusmod", "tempor", "incididunt", "ut", "labore",
+        "et", "dolore", "magna", "aliqua", "enim", "ad", "minim", "veniam",
+    )
+
+    def __init__(
+        self,
+        ttft: float,
+        inter_token_latency: float,
+        error_rate: float,
+        chunk_size: int,
+        response_words: int,
+        seed: int,
+    ):
+        self.ttft = ttft
+        self.inter_token_latency = inter_token_latency
+        self.error_rate = error_rate
+        self.chunk_size = max(chunk_size, 1)
+        self.response_words = response_words
+        self.seed = seed
+        # Последовательность ошибок детерминирована для заданного seed
+        self._error_rng = random.Random(seed)
+
+    def _response_text(self, message: str, model: str) -> str:
+        digest = hashlib.sha256(f"{self.seed}:{model}:{message}".encode("utf-8")).digest()
+        rng = random.Random(digest)
+        return " ".join(rng.choice(self._WORDS) for _ in range(self.response_words)) + "."
+
+    async def stream(
+        self,
+        message: str,
+        model: str,
+        api_key: str | None,
+        system_prompt: str | None,
+        history: list[types.Content] | None,
+        usage: TokenUsage | None = None,
+    ) -> AsyncGenerator[str, None]:
+        await asyncio.sleep(self.ttft)
+        if self.error_rate > 0 and self._error_rng.random() < self.error_rate:
+            raise errors.ServerError(
+                503,
+                {"error": {"code": 503, "message": "Fake provider error", "status": "UNAVAILABLE"}},
+            )
+
+        text = self._response_text(message, model)
+        for start in range(0, len(text), self.chunk_size):
+            if start:
+                await asyncio.sleep(self.inter_token_latency)
+            yield text[start:start + self.chunk_size]
+
+        if usage is not None:
+            prompt_tokens = estimate_tokens(message) + estimate_tokens(system_prompt or "")
+            for content in history or []:
+                for part in content.parts or []:
+                    prompt_tokens += estimate_tokens(part.text or "")
+            usage.prompt_tokens = prompt_tokens
+            usage.completion_tokens = estimate_tokens(text)
+
+    async def test_api_key(self, api_key: str) -> bool:
+        return True
+
+    async def list_models(self, api_key: str) -> list[str]:
+        return list(UserSettings.AVAILABLE_MODELS)
+
+
+def create_provider(config: Settings) -> LLMProvider:
+    """Создаёт провайдер по настройке LLM_PROVIDER."""
+    if config.LLM_PROVIDER == "fake":
+        return FakeProvider(
+            ttft=config.FAKE_PROVIDER_TTFT_MS / 1000,
+            inter_token_latency=config.FAKE_PROVIDER_INTER_TOKEN_MS / 1000,
+            error_rate=config.FAKE_PROVIDER_ERROR_RATE,
+            chunk_size=config.FAKE_PROVIDER_CHUNK_SIZE,
+            response_words=config.FAKE_PROVIDER_RESPONSE_WORDS,
+            seed=config.FAKE_PROVIDER_SEED,
+        )
+    return GeminiProvider()
+
+
+# Глобальный провайдер
+llm_provider = create_provider(settings)
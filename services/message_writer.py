@@ -0,0 +1,242 @@
+"""
+Write-behind буфер записи сообщений.
+
+Вместо отдельной транзакции на каждое сообщение запись копится со всех
+текущих запросов и сбрасывается одной транзакцией: multi-row INSERT новых
+сообщений, executemany UPDATE ответов по первичному ключу и сводки чатов.
+Сброс - раз в интервал или при наборе пачки заданного размера.
+
+Вызывающий ждёт commit пачки со своей записью: к моменту события done
+ответ уже сохранён. Если пачка не записалась, записи повторяются по одной
+в отдельных транзакциях: ошибку получает только тот, чья запись её вызвала.
+
+Буфер опционален (MESSAGE_WRITE_BEHIND_ENABLED): при выключенном
+каждая запись идёт собственной короткой транзакцией.
+"""
+
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import insert, update
+
+from core.config import settings
+from core.database import async_session_factory
+from models.message import Message
+from services.chat_summaries import record_chat_activity
+
+logger = logging.getLogger(__name__)
+
+
+def message_row(message: Message) -> dict:
+    """
+    Строка для INSERT из сообщения со всеми заполненными колонками.
+
+    Незаполненные колонки с серверным значением по умолчанию (updated_at)
+    в строку не попадают, чтобы не вставлять NULL.
+    """
+    row = {}
+    for column in Message.__table__.columns:
+        value = getattr(message, column.key)
+        if value is None and column.server_default is not None:
+            continue
+        row[column.key] = value
+    return row
+
+
+@dataclass
+class _PendingWrite:
+    """Записи одного вызова insert/update и future ожидающего их commit."""
+
+    inserts: list[dict]
+    updates: list[dict]
+    future: asyncio.Future
+
+    @property
+    def rows(self) -> int:
+        return len(self.inserts) + len(self.updates)
+
+
+class MessageWriteBuffer:
+    """Копит записи сообщений и сбрасывает их одной транзакцией."""
+
+    def __init__(self, enabled: bool, max_rows: int, flush_interval: float):
+        self.enabled = enabled
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self._pending: list[_PendingWrite] = []
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        # Метрики
+        self.flushes = 0
+        self.rows_written = 0
+        self.failed_flushes = 0
+        self.failed_writes = 0
+        self.last_batch_rows = 0
+
+    async def insert(self, *rows: dict) -> None:
+        """
+        Добавляет новые сообщения и ждёт их commit.
+
+        Строки должны содержать все колонки messages, включая id и created_at.
+
+        Raises:
+            Exception: Ошибка записи пачки
+        """
+        await self._wait_flush(list(rows), [])
+
+    async def update(
+        self,
+        message_id: uuid.UUID,
+        chat_id: uuid.UUID,
+        created_at: datetime,
+        values: dict,
+        final: bool,
+    ) -> None:
+        """
+        Добавляет обновление сообщения и ждёт его commit.
+
+        Несколько обновлений одного сообщения в пачке схлопываются в последнее.
+
+        Args:
+            message_id: ID сообщения
+            chat_id: ID чата (для сводки)
+            created_at: Время создания сообщения (для сводки)
+            values: Новые значения колонок
+            final: Итоговая запись ответа - обновляет превью чата
+
+        Raises:
+            Exception: Ошибка записи пачки
+        """
+        item = {
+            "values": {"id": message_id, **values},
+            "chat_id": chat_id,
+            "final": final,
+            "at": created_at,
+        }
+        await self._wait_flush([], [item])
+
+    @property
+    def pending_rows(self) -> int:
+        return sum(write.rows for write in self._pending)
+
+    async def _wait_flush(self, inserts: list[dict], updates: list[dict]) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_PendingWrite(inserts, updates, future))
+        if self.pending_rows >= self.max_rows:
+            self._full.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        await future
+
+    async def _run(self) -> None:
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Записывает накопленные сообщения одной транзакцией."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+
+        inserts = [row for write in pending for row in write.inserts]
+        # Несколько обновлений одного сообщения схлопываются в последнее
+        updates: dict[uuid.UUID, dict] = {}
+        for write in pending:
+            for item in write.updates:
+                updates[item["values"]["id"]] = item
+
+        try:
+            await self._write(inserts, list(updates.values()))
+        except Exception:
+            self.failed_flushes += 1
+            logger.exception(
+                "Не удалось записать пачку сообщений (%d строк), повтор по одной записи",
+                len(inserts) + len(updates),
+            )
+            await self._write_each(pending)
+            return
+
+        self.flushes += 1
+        self.last_batch_rows = len(inserts) + len(updates)
+        self.rows_written += self.last_batch_rows
+        for write in pending:
+            if not write.future.done():
+                write.future.set_result(None)
+
+    async def _write_each(self, pending: list[_PendingWrite]) -> None:
+        """Повторяет записи упавшей пачки по одной, в порядке поступления."""
+        for write in pending:
+            try:
+                await self._write(write.inserts, write.updates)
+            except Exception as e:
+                self.failed_writes += 1
+                if not write.future.done():
+                    write.future.set_exception(e)
+                continue
+            self.rows_written += write.rows
+            if not write.future.done():
+                write.future.set_result(None)
+
+    async def _write(self, inserts: list[dict], updates: list[dict]) -> None:
+        # Сводка по чатам: (добавлено, текст последнего сообщения, его время)
+        activity: dict[uuid.UUID, list] = {}
+        for row in inserts:
+            entry = activity.setdefault(row["chat_id"], [0, None, row["created_at"]])
+            entry[0] += 1
+            if row["created_at"] >= entry[2]:
+                entry[1], entry[2] = row["content"], row["created_at"]
+        for item in updates:
+            if not item["final"]:
+                continue
+            entry = activity.setdefault(item["chat_id"], [0, None, item["at"]])
+            if item["at"] >= entry[2]:
+                entry[1], entry[2] = item["values"].get("content"), item["at"]
+
+        async with async_session_factory() as session:
+            if inserts:
+                await session.execute(insert(Message), inserts)
+            if updates:
+                await session.execute(update(Message), [item["values"] for item in updates])
+            # В порядке chat_id, чтобы параллельные пачки не взаимоблокировались
+            for chat_id in sorted(activity):
+                added, last_content, last_at = activity[chat_id]
+                await record_chat_activity(session, chat_id, added, last_content, last_at)
+            await session.commit()
+
+    async def close(self) -> None:
+        """Дописывает остаток буфера при остановке приложения."""
+        # Не отменяем задачу: прерванный сброс оставил бы ожидающих без ответа
+        if self._task is not None and not self._task.done():
+            self._full.set()
+            await self._task
+        await self.flush()
+
+    def stats(self) -> dict:
+        """Метрики буфера для мониторинга."""
+        return {
+            "enabled": self.enabled,
+            "pending_rows": self.pending_rows,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "failed_writes": self.failed_writes,
+            "rows_written": self.rows_written,
+            "last_batch_rows": self.last_batch_rows,
+            "avg_batch_rows": round(self.rows_written / self.flushes, 1) if self.flushes else 0.0,
+        }
+
+
+# Глобальный буфер записи сообщений
+message_write_buffer = MessageWriteBuffer(
+    enabled=settings.MESSAGE_WRITE_BEHIND_ENABLED,
+    max_rows=settings.MESSAGE_WRITE_BEHIND_MAX_ROWS,
+    flush_interval=settings.MESSAGE_WRITE_BEHIND_FLUSH_MS / 1000,
+)
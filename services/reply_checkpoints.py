@@ -0,0 +1,193 @@
+"""
+Checkpoint частичных ответов ассистента во время стриминга.
+
+Строка ответа создаётся в статусе streaming до первого чанка и периодически
+обновляется на месте (UPDATE по первичному ключу) - каждые N токенов
+или T миллисекунд, смотря что наступит раньше. Если воркер упадёт посреди
+генерации, в БД останется последний checkpoint, а не пустота.
+
+Каждый checkpoint обновляет updated_at. Строки в статусе streaming,
+которые давно не обновлялись (воркер упал), переводятся в failed
+при старте приложения и периодической проверкой.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+
+from core.config import settings
+from core.database import async_session_factory
+from models.message import Message, MessageRole, MessageStatus
+from services.chat_summaries import record_chat_activity
+from services.message_writer import message_row, message_write_buffer
+from services.token_accounting import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class ReplyCheckpointer:
+    """
+    Накапливает ответ ассистента и сохраняет его checkpoint'ами.
+
+    Каждая запись идёт в собственной короткой сессии (или общей пачкой
+    через write-behind буфер), поэтому соединение с БД не удерживается
+    между чанками.
+    """
+
+    def __init__(self, chat_id: uuid.UUID, every_tokens: int, interval: float):
+        self.chat_id = chat_id
+        self.every_tokens = every_tokens
+        self.interval = interval
+        self.message_id: uuid.UUID | None = None
+        self.created_at: datetime | None = None
+        self.parts: list[str] = []
+        self.checkpoints = 0
+        self._tokens_since = 0
+        self._last_checkpoint = time.monotonic()
+
+    @property
+    def content(self) -> str:
+        return "".join(self.parts)
+
+    async def start(self) -> None:
+        """Создаёт строку ответа в статусе streaming."""
+        message = Message(
+            id=uuid.uuid4(),
+            chat_id=self.chat_id,
+            role=MessageRole.ASSISTANT,
+            content="",
+            token_count=None,
+            status=MessageStatus.STREAMING,
+            created_at=datetime.now(timezone.utc),
+        )
+        if message_write_buffer.enabled:
+            await message_write_buffer.insert(message_row(message))
+        else:
+            async with async_session_factory() as session:
+                session.add(message)
+                await record_chat_activity(
+                    session, self.chat_id, added=1, last_content=None,
+                    last_message_at=message.created_at,
+                )
+                await session.commit()
+        self.message_id = message.id
+        self.created_at = message.created_at
+        self._last_checkpoint = time.monotonic()
+
+    async def append(self, chunk: str) -> None:
+        """Добавляет чанк и пишет checkpoint, если пора."""
+        self.parts.append(chunk)
+        self._tokens_since += estimate_tokens(chunk)
+
+        due_by_tokens = self.every_tokens > 0 and self._tokens_since >= self.every_tokens
+        due_by_time = (
+            self.interval > 0
+            and time.monotonic() - self._last_checkpoint >= self.interval
+        )
+        if due_by_tokens or due_by_time:
+            await self._write(MessageStatus.STREAMING, None)
+            self.checkpoints += 1
+
+    async def finish(self, status: MessageStatus, token_count: int | None = None) -> int:
+        """
+        Записывает итоговый ответ и статус.
+
+        Args:
+            status: Итоговый статус (complete/interrupted/failed)
+            token_count: Точное число токенов (иначе оценка)
+
+        Returns:
+            Записанный token_count
+        """
+        if token_count is None:
+            token_count = estimate_tokens(self.content)
+        await self._write(status, token_count)
+        return token_count
+
+    async def _write(self, status: MessageStatus, token_count: int | None) -> None:
+        if self.message_id is None:
+            return
+        # updated_at - признак жизни генерации для поиска зависших ответов
+        values = {
+            "content": self.content,
+            "status": status,
+            "updated_at": datetime.now(timezone.utc),
+        }
+        if token_count is not None:
+            values["token_count"] = token_count
+        if message_write_buffer.enabled:
+            await message_write_buffer.update(
+                self.message_id,
+                self.chat_id,
+                self.created_at,
+                values,
+                final=status != MessageStatus.STREAMING,
+            )
+        else:
+            await self._write_direct(status, values)
+        self._tokens_since = 0
+        self._last_checkpoint = time.monotonic()
+
+    async def _write_direct(self, status: MessageStatus, values: dict) -> None:
+        async with async_session_factory() as session:
+            await session.execute(
+                update(Message).where(Message.id == self.message_id).values(**values)
+            )
+            if status != MessageStatus.STREAMING:
+                # Итоговый ответ становится превью чата
+                await record_chat_activity(
+                    session, self.chat_id, added=0, last_content=self.content,
+                    last_message_at=self.created_at,
+                )
+            await session.commit()
+
+
+def create_checkpointer(chat_id: uuid.UUID) -> ReplyCheckpointer:
+    """Checkpointer с частотой записи из настроек."""
+    return ReplyCheckpointer(
+        chat_id,
+        every_tokens=settings.STREAM_CHECKPOINT_TOKENS,
+        interval=settings.STREAM_CHECKPOINT_INTERVAL_MS / 1000,
+    )
+
+
+async def finalize_orphaned_messages(older_than_seconds: float) -> int:
+    """
+    Переводит зависшие streaming ответы в failed.
+
+    Зависшим считается ответ без checkpoint'ов дольше older_than_seconds:
+    длинную генерацию живого воркера, который продолжает писать
+    checkpoint'ы, не трогаем независимо от её возраста.
+
+    Returns:
+        Количество финализированных сообщений
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than_seconds)
+    async with async_session_factory() as session:
+        result = await session.execute(
+            update(Message)
+            .where(
+                Message.status == MessageStatus.STREAMING,
+                Message.updated_at < cutoff,
+            )
+            .values(status=MessageStatus.FAILED)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+    if result.rowcount:
+        logger.warning("Финализировано зависших ответов: %d", result.rowcount)
+    return result.rowcount
+
+
+async def run_orphan_sweeper(interval: float, older_than_seconds: float) -> None:
+    """Периодически финализирует зависшие ответы (фоновая задача)."""
+    while True:
+        try:
+            await finalize_orphaned_messages(older_than_seconds)
+        except Exception:
+            logger.exception("Не удалось финализировать зависшие ответы")
+        await asyncio.sleep(interval)
@@ -0,0 +1,294 @@
+"""
+Планировщик upstream запросов к Gemini.
+
+Поддерживает:
+- Token bucket лимиты на API ключ: запросы в минуту (RPM) и токены в минуту (TPM)
+- Взвешенную справедливую очередь (WFQ) между пользователями одного ключа
+- Ограничение глубины очереди с быстрым отказом
+- Удаление состояния простаивающего ключа, когда его лимиты полностью восстановились
+- Метрики времени ожидания (включая p95/p99) и глубины очереди
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from core.config import settings
+from core.metrics import percentile
+from services.gemini_clients import fingerprint_api_key
+
+
+class SchedulerRejected(Exception):
+    """Очередь к API ключу переполнена - запрос отклонён без ожидания."""
+
+
+class TokenBucket:
+    """Token bucket с равномерным пополнением."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Сколько секунд ждать, пока в корзине наберётся amount токенов."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+    def time_until_full(self, now: float) -> float:
+        """Сколько секунд до полного восстановления корзины."""
+        return self.time_until(self.capacity, now)
+
+
+@dataclass(order=True)
+class _Waiter:
+    """Запрос в очереди: упорядочен по виртуальному времени завершения."""
+
+    finish_tag: float
+    seq: int
+    tokens: int = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class _KeyQueue:
+    """Очередь и лимиты одного API ключа."""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = TokenBucket(rpm)
+        self.tpm = TokenBucket(tpm)
+        self.heap: list[_Waiter] = []
+        self.virtual_time = 0.0
+        self.user_finish: dict[str, float] = {}
+        self.dispatcher: asyncio.Task | None = None
+        self.wakeup = asyncio.Event()
+
+
+class GeminiScheduler:
+    """Справедливый планировщик с rate limit на каждый API ключ."""
+
+    def __init__(
+        self,
+        enabled: bool,
+        rpm_limit: int,
+        tpm_limit: int,
+        max_queue_depth: int,
+        latency_window: int = 1024,
+    ):
+        self.enabled = enabled
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.max_queue_depth = max_queue_depth
+        self._queues: dict[str, _KeyQueue] = {}
+        self._seq = itertools.count()
+
+        # Метрики
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._wait_samples: deque[float] = deque(maxlen=latency_window)
+
+    async def acquire(
+        self,
+        api_key: str | None,
+        user_id: str | None,
+        tokens: int,
+        weight: float = 1.0,
+    ) -> None:
+        """
+        Ждёт разрешения на upstream запрос.
+
+        Args:
+            api_key: API ключ, на который расходуется лимит
+            user_id: Пользователь (единица справедливого распределения)
+            tokens: Оценка токенов запроса для TPM лимита
+            weight: Вес пользователя в справедливой очереди
+
+        Raises:
+            SchedulerRejected: Если очередь ключа переполнена
+        """
+        if not self.enabled:
+            return
+
+        key = fingerprint_api_key(api_key)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = _KeyQueue(self.rpm_limit, self.tpm_limit)
+            self._queues[key] = queue
+
+        # WFQ: тег завершения = max(виртуальное время, тег пользователя) + стоимость / вес
+        flow = user_id or "anonymous"
+        start = max(queue.virtual_time, queue.user_finish.get(flow, 0.0))
+        finish_tag = start + max(tokens, 1) / max(weight, 1e-6)
+        loop = asyncio.get_running_loop()
+
+        # Никто не ждёт и лимитов хватает - пропускаем сразу, без очереди:
+        # иначе всплеск запросов за один такт event loop упрётся в глубину
+        # очереди раньше, чем диспетчер успеет её разобрать
+        now = time.monotonic()
+        if (
+            not self._waiting(queue)
+            and queue.rpm.time_until(1, now) == 0
+            and queue.tpm.time_until(tokens, now) == 0
+        ):
+            queue.rpm.consume(1)
+            queue.tpm.consume(tokens)
+            queue.user_finish[flow] = finish_tag
+            queue.virtual_time = finish_tag
+            self._record_wait(0.0)
+            self._ensure_dispatcher(key, queue, loop)
+            return
+
+        # В очереди только запросы, ждущие пополнения лимитов
+        if self._waiting(queue) >= self.max_queue_depth:
+            self.rejected += 1
+            raise SchedulerRejected("Слишком много запросов к Gemini, попробуйте позже")
+
+        queue.user_finish[flow] = finish_tag
+        waiter = _Waiter(
+            finish_tag=finish_tag,
+            seq=next(self._seq),
+            tokens=tokens,
+            enqueued_at=now,
+            future=loop.create_future(),
+        )
+        heapq.heappush(queue.heap, waiter)
+        queue.wakeup.set()
+        self._ensure_dispatcher(key, queue, loop)
+
+        await waiter.future
+
+    @staticmethod
+    def _waiting(queue: _KeyQueue) -> int:
+        """Запросы ключа, ждущие в очереди (без отменённых)."""
+        return sum(1 for waiter in queue.heap if not waiter.future.done())
+
+    def _ensure_dispatcher(
+        self, key: str, queue: _KeyQueue, loop: asyncio.AbstractEventLoop
+    ) -> None:
+        if queue.dispatcher is None or queue.dispatcher.done():
+            queue.dispatcher = loop.create_task(self._dispatch(key, queue))
+
+    async def _dispatch(self, key: str, queue: _KeyQueue) -> None:
+        """
+        Выпускает запросы ключа в порядке WFQ по мере пополнения лимитов.
+
+        Когда очередь пуста, ждёт полного восстановления лимитов ключа
+        и удаляет его состояние: иначе словарь очередей растёт с каждым
+        новым ключом. Удалять раньше нельзя - новая очередь начнёт
+        с полными корзинами и лимит можно будет обойти.
+        """
+        while True:
+            await self._drain(queue)
+
+            # Очередь пуста - состояние справедливости больше не нужно
+            queue.user_finish.clear()
+            queue.virtual_time = 0.0
+
+            now = time.monotonic()
+            idle = max(queue.rpm.time_until_full(now), queue.tpm.time_until_full(now))
+            if idle > 0:
+                queue.wakeup.clear()
+                try:
+                    await asyncio.wait_for(queue.wakeup.wait(), timeout=idle)
+                except asyncio.TimeoutError:
+                    pass
+                # Пока ждали, запросы могли пройти без очереди - проверяем заново
+                continue
+
+            if self._queues.get(key) is queue:
+                del self._queues[key]
+            return
+
+    async def _drain(self, queue: _KeyQueue) -> None:
+        while queue.heap:
+            head = queue.heap[0]
+            if head.future.done():
+                # Запрос отменён (клиент отключился) - пропускаем
+                heapq.heappop(queue.heap)
+                continue
+
+            now = time.monotonic()
+            delay = max(
+                queue.rpm.time_until(1, now),
+                queue.tpm.time_until(head.tokens, now),
+            )
+            if delay > 0:
+                queue.wakeup.clear()
+                try:
+                    await asyncio.wait_for(queue.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(queue.heap)
+            queue.rpm.consume(1)
+            queue.tpm.consume(head.tokens)
+            queue.virtual_time = head.finish_tag
+            self._record_wait(now - head.enqueued_at)
+            head.future.set_result(None)
+
+    def _record_wait(self, wait: float) -> None:
+        self.admitted += 1
+        self.wait_seconds_total += wait
+        self.wait_seconds_max = max(self.wait_seconds_max, wait)
+        self._wait_samples.append(wait)
+
+    async def close(self) -> None:
+        """Останавливает диспетчеры и отменяет ожидающие запросы."""
+        for queue in self._queues.values():
+            for waiter in queue.heap:
+                waiter.future.cancel()
+            queue.heap.clear()
+            if queue.dispatcher is not None:
+                queue.dispatcher.cancel()
+        tasks = [q.dispatcher for q in self._queues.values() if q.dispatcher]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._queues.clear()
+
+    def stats(self) -> dict:
+        """Метрики очереди для мониторинга и подбора лимитов."""
+        depths = {key[:12]: self._waiting(q) for key, q in self._queues.items() if q.heap}
+        return {
+            "enabled": self.enabled,
+            "rpm_limit": self.rpm_limit,
+            "tpm_limit": self.tpm_limit,
+            "max_queue_depth": self.max_queue_depth,
+            "queue_depth": sum(depths.values()),
+            "queue_depth_by_key": depths,
+            "tracked_keys": len(self._queues),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_seconds_avg": (
+                round(self.wait_seconds_total / self.admitted, 4) if self.admitted else 0.0
+            ),
+            "wait_seconds_p95": round(percentile(self._wait_samples, 0.95), 4),
+            "wait_seconds_p99": round(percentile(self._wait_samples, 0.99), 4),
+            "wait_seconds_max": round(self.wait_seconds_max, 4),
+        }
+
+
+# Глобальный планировщик
+gemini_scheduler = GeminiScheduler(
+    enabled=settings.SCHEDULER_ENABLED,
+    rpm_limit=settings.GEMINI_RPM_LIMIT,
+    tpm_limit=settings.GEMINI_TPM_LIMIT,
+    max_queue_depth=settings.GEMINI_QUEUE_MAX_DEPTH,
+    latency_window=settings.SCHEDULER_LATENCY_WINDOW,
+)
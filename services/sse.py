@@ -0,0 +1,122 @@
+"""
+Кодирование и коалесцирование Server-Sent Events.
+
+Содержит:
+- Быстрый кодировщик SSE событий: заранее собранные префиксы и суффиксы,
+  без построения словаря и форматирования времени на каждое событие
+- Коалесцирование чанков: токены копятся в одно событие по окну времени
+  или порогу размера, первый чанк отправляется сразу (TTFT не страдает)
+"""
+
+import asyncio
+import json
+from collections.abc import AsyncGenerator, AsyncIterator
+
+_CHUNK_PREFIX = 'data: {"type":"chunk","content":'
+_EVENT_SUFFIX = "}\n\n"
+
+DONE_EVENT = 'data: {"type":"done"}\n\n'
+# Генерация отменена, частичный ответ сохранён со статусом interrupted
+INTERRUPTED_EVENT = 'data: {"type":"interrupted"}\n\n'
+
+_encode_string = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def encode_chunk_event(text: str) -> str:
+    """SSE событие с чанком текста."""
+    return _CHUNK_PREFIX + _encode_string(text) + _EVENT_SUFFIX
+
+
+def encode_error_event(message: str) -> str:
+    """SSE событие с ошибкой."""
+    return 'data: {"type":"error","message":' + _encode_string(message) + _EVENT_SUFFIX
+
+
+def encode_event(data: dict) -> str:
+    """SSE событие с произвольными данными (для редких служебных событий)."""
+    return "data: " + json.dumps(data, ensure_ascii=False, separators=(",", ":")) + "\n\n"
+
+
+async def _next_chunk(stream: AsyncIterator[str]) -> str | None:
+    return await anext(stream, None)
+
+
+async def _aclose(stream: AsyncIterator[str]) -> None:
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+async def coalesce_chunks(
+    stream: AsyncIterator[str],
+    window: float,
+    max_bytes: int,
+) -> AsyncGenerator[str, None]:
+    """
+    Объединяет мелкие чанки потока в более крупные.
+
+    Пачка отправляется, когда с момента прошлой отправки прошло window
+    секунд или накопилось max_bytes байт. Первый чанк отправляется сразу.
+
+    Args:
+        stream: Исходный поток чанков
+        window: Окно коалесцирования в секундах (0 - без коалесцирования)
+        max_bytes: Порог размера пачки в байтах UTF-8
+
+    Yields:
+        Объединённые чанки текста
+    """
+    if window <= 0:
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await _aclose(stream)
+        return
+
+    loop = asyncio.get_running_loop()
+    buffer: list[str] = []
+    buffered_bytes = 0
+    last_flush: float | None = None
+    pending: asyncio.Task | None = None
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.create_task(_next_chunk(stream))
+            timeout = None
+            if buffer:
+                timeout = max(0.0, last_flush + window - loop.time())
+            done, _ = await asyncio.wait((pending,), timeout=timeout)
+
+            if not done:
+                # Окно истекло, а новых чанков нет - отправляем накопленное
+                yield "".join(buffer)
+                buffer.clear()
+                buffered_bytes = 0
+                last_flush = loop.time()
+                continue
+
+            chunk = pending.result()
+            pending = None
+            if chunk is None:
+                break
+
+            buffer.append(chunk)
+            buffered_bytes += len(chunk.encode("utf-8"))
+            now = loop.time()
+            if last_flush is None or buffered_bytes >= max_bytes or now - last_flush >= window:
+                yield "".join(buffer)
+                buffer.clear()
+                buffered_bytes = 0
+                last_flush = now
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        # Закрываем upstream сразу, а не при сборке мусора: single-flight
+        # и планировщик освобождаются, как только потребитель остановился
+        await _aclose(stream)
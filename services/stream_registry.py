@@ -0,0 +1,260 @@
+"""
+Реестр возобновляемых потоков ответа.
+
+Генерация ответа идёт в фоновой задаче и не привязана к HTTP соединению.
+Каждое SSE событие получает монотонно растущий id и попадает в кольцевой
+буфер потока. Клиент, потерявший соединение, переподключается с заголовком
+Last-Event-ID: пропущенные события отдаются из буфера, дальше - вживую.
+
+Особенности:
+- Ограниченный буфер событий на поток (старые события вытесняются)
+- Если все подписчики потока и вкладки чата отключились и не вернулись
+  за grace период, генерация отменяется (upstream запрос прерывается)
+- Завершённый поток хранится ещё некоторое время для поздних переподключений
+- События дублируются в хаб чата для остальных вкладок и устройств
+"""
+
+import asyncio
+import uuid
+from collections import deque
+from collections.abc import AsyncGenerator, Callable, Coroutine
+from typing import Any
+
+from core.config import settings
+from services.chat_hub import ChatHub, chat_hub
+
+
+class StreamGone(Exception):
+    """Запрошенные события уже вытеснены из буфера потока."""
+
+
+class ResumableStream:
+    """Поток SSE событий одной генерации с кольцевым буфером."""
+
+    def __init__(
+        self,
+        chat_id: uuid.UUID,
+        user_id: uuid.UUID,
+        buffer_size: int,
+        on_event: Callable[[str], None] | None = None,
+        external_watchers: Callable[[], int] | None = None,
+        grace_seconds: float = 0.0,
+    ):
+        self.id = uuid.uuid4().hex
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.events: deque[tuple[int, str]] = deque(maxlen=buffer_size)
+        self.last_event_id = 0
+        self.finished = False
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+        self._cancel_handle: asyncio.TimerHandle | None = None
+        self._on_event = on_event
+        self._external_watchers = external_watchers
+        self.grace_seconds = grace_seconds
+
+    def publish(self, event: str) -> None:
+        """
+        Добавляет событие в буфер и будит подписчиков.
+
+        Args:
+            event: Закодированное SSE событие ("data: ...\\n\\n")
+        """
+        self.last_event_id += 1
+        self.events.append((self.last_event_id, event))
+        self._notify()
+        if self._on_event is not None:
+            self._on_event(event)
+
+    def finish(self) -> None:
+        self.finished = True
+        self._notify()
+
+    @property
+    def watchers(self) -> int:
+        """Подписчики потока и другие наблюдатели генерации (вкладки чата)."""
+        external = self._external_watchers() if self._external_watchers is not None else 0
+        return self.subscribers + external
+
+    def release(self) -> None:
+        """Наблюдатель ушёл: отменяет генерацию после grace периода, если смотреть некому."""
+        if self.watchers == 0 and not self.finished and self._cancel_handle is None:
+            self._schedule_cancel(self.grace_seconds)
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def can_resume(self, last_event_id: int) -> bool:
+        """Есть ли в буфере все события после last_event_id."""
+        if last_event_id >= self.last_event_id:
+            return True
+        return bool(self.events) and self.events[0][0] <= last_event_id + 1
+
+    async def subscribe(self, last_event_id: int = 0) -> AsyncGenerator[str, None]:
+        """
+        Отдаёт события после last_event_id, затем новые по мере поступления.
+
+        Args:
+            last_event_id: Последнее полученное клиентом событие
+
+        Yields:
+            SSE события с полем id
+
+        Raises:
+            StreamGone: Если подписчик отстал больше, чем вмещает буфер
+        """
+        self.subscribers += 1
+        if self._cancel_handle is not None:
+            self._cancel_handle.cancel()
+            self._cancel_handle = None
+        try:
+            cursor = last_event_id
+            while True:
+                if cursor < self.last_event_id:
+                    if not self.can_resume(cursor):
+                        raise StreamGone
+                    event_id, event = self.events[cursor + 1 - self.events[0][0]]
+                    cursor = event_id
+                    yield f"id: {event_id}\n{event}"
+                elif self.finished:
+                    return
+                else:
+                    await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            self.release()
+
+    def _schedule_cancel(self, delay: float) -> None:
+        if self.task is None:
+            return
+        if delay <= 0:
+            self.task.cancel()
+            return
+        self._cancel_handle = asyncio.get_running_loop().call_later(
+            delay, self._cancel_if_abandoned
+        )
+
+    def _cancel_if_abandoned(self) -> None:
+        self._cancel_handle = None
+        if self.watchers == 0 and self.task is not None:
+            self.task.cancel()
+
+
+class StreamRegistry:
+    """Активные и недавно завершённые потоки, индексированные по id."""
+
+    def __init__(
+        self,
+        buffer_size: int,
+        grace_seconds: float,
+        retention_seconds: float,
+        hub: ChatHub | None = None,
+    ):
+        self.buffer_size = buffer_size
+        self.grace_seconds = grace_seconds
+        self.retention_seconds = retention_seconds
+        self.hub = hub
+        self._streams: dict[str, ResumableStream] = {}
+        self._active_by_chat: dict[uuid.UUID, ResumableStream] = {}
+
+    def start(
+        self,
+        chat_id: uuid.UUID,
+        user_id: uuid.UUID,
+        producer: Callable[[ResumableStream], Coroutine[Any, Any, None]],
+    ) -> ResumableStream:
+        """
+        Запускает генерацию в фоновой задаче.
+
+        Args:
+            chat_id: ID чата
+            user_id: Владелец потока (только он может переподключиться)
+            producer: Корутина, публикующая события в поток
+
+        Returns:
+            Зарегистрированный поток
+        """
+        on_event = None
+        external_watchers = None
+        if self.hub is not None:
+            on_event = lambda event: self.hub.publish(chat_id, event)
+            # Вкладки, подписанные на чат, тоже смотрят генерацию
+            external_watchers = lambda: self.hub.subscriber_count(chat_id)
+        stream = ResumableStream(
+            chat_id,
+            user_id,
+            self.buffer_size,
+            on_event,
+            external_watchers=external_watchers,
+            grace_seconds=self.grace_seconds,
+        )
+        self._streams[stream.id] = stream
+        self._active_by_chat[chat_id] = stream
+        loop = asyncio.get_running_loop()
+        stream.task = loop.create_task(producer(stream))
+        stream.task.add_done_callback(lambda task: self._finish(stream))
+        return stream
+
+    def _finish(self, stream: ResumableStream) -> None:
+        stream.finish()
+        if self._active_by_chat.get(stream.chat_id) is stream:
+            del self._active_by_chat[stream.chat_id]
+        # Держим хвост потока для клиентов, которые переподключатся позже
+        asyncio.get_running_loop().call_later(
+            self.retention_seconds, self._streams.pop, stream.id, None
+        )
+
+    def get(self, stream_id: str, user_id: uuid.UUID) -> ResumableStream | None:
+        """Поток пользователя по id или None."""
+        stream = self._streams.get(stream_id)
+        if stream is None or stream.user_id != user_id:
+            return None
+        return stream
+
+    def subscribe(
+        self, stream: ResumableStream, last_event_id: int = 0
+    ) -> AsyncGenerator[str, None]:
+        """Подписка на поток с grace периодом из настроек реестра."""
+        return stream.subscribe(last_event_id)
+
+    def subscribe_chat(self, chat_id: uuid.UUID) -> AsyncGenerator[str, None]:
+        """
+        Подписка на все генерации чата через хаб.
+
+        Если в чате идёт генерация, подписчик сначала получает
+        её уже отправленные события, затем новые.
+        """
+
+        def backlog() -> list[str]:
+            stream = self._active_by_chat.get(chat_id)
+            if stream is None or stream.finished:
+                return []
+            return [event for _, event in stream.events]
+
+        def on_leave() -> None:
+            stream = self._active_by_chat.get(chat_id)
+            if stream is not None:
+                stream.release()
+
+        return self.hub.subscribe(chat_id, backlog, on_leave)
+
+    async def close(self) -> None:
+        """Отменяет незавершённые генерации при остановке приложения."""
+        tasks = [s.task for s in self._streams.values() if s.task and not s.task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._streams.clear()
+        self._active_by_chat.clear()
+
+
+# Глобальный реестр потоков
+stream_registry = StreamRegistry(
+    buffer_size=settings.STREAM_RESUME_BUFFER_EVENTS,
+    grace_seconds=settings.STREAM_RESUME_GRACE_SECONDS,
+    retention_seconds=settings.STREAM_RESUME_RETENTION_SECONDS,
+    hub=chat_hub,
+)
@@ -0,0 +1,180 @@
+"""
+Учёт токенов сообщений (Message.token_count).
+
+Поддерживает:
+- Быструю локальную оценку числа токенов без обращения к API
+- Сбор usage metadata из потока Gemini
+- Пакетную запись счётчиков (один executemany UPDATE на пачку)
+- Backfill исторических сообщений чанками по ключу (keyset pagination)
+
+Backfill запускается командой:
+    uv run python -m services.token_accounting
+"""
+
+import asyncio
+import logging
+import math
+import re
+import uuid
+from dataclasses import dataclass
+
+from sqlalchemy import select, update
+
+from core.config import settings
+from core.database import async_session_factory
+from models.message import Message
+
+logger = logging.getLogger(__name__)
+
+# Слова (буквы/цифры) и отдельные знаки пунктуации
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Быстрая локальная оценка числа токенов.
+
+    Слово даёт примерно один токен на каждые 4 символа,
+    каждый знак пунктуации - отдельный токен.
+    """
+    if not text:
+        return 0
+    total = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        total += math.ceil((match.end() - match.start()) / 4)
+    return max(total, 1)
+
+
+@dataclass(slots=True)
+class TokenUsage:
+    """Счётчики токенов одного запроса, заполняются из usage metadata Gemini."""
+
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+
+    def update_from(self, usage_metadata) -> None:
+        """Обновляет счётчики из chunk.usage_metadata (последний чанк - итоговый)."""
+        if usage_metadata is None:
+            return
+        if usage_metadata.prompt_token_count is not None:
+            self.prompt_tokens = usage_metadata.prompt_token_count
+        if usage_metadata.candidates_token_count is not None:
+            self.completion_tokens = usage_metadata.candidates_token_count
+
+
+class TokenCountWriter:
+    """
+    Пакетная запись token_count.
+
+    Копит пары (message_id, token_count) и сбрасывает их одним
+    executemany UPDATE по первичному ключу - раз в интервал
+    или при наборе пачки заданного размера.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: dict[uuid.UUID, int] = {}
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def enqueue(self, message_id: uuid.UUID, token_count: int) -> None:
+        """Ставит счётчик сообщения в очередь на запись."""
+        self._pending[message_id] = token_count
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Записывает накопленные счётчики одним пакетом."""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            await write_token_counts(batch)
+        except Exception:
+            logger.exception("Не удалось записать token_count для %d сообщений", len(batch))
+
+    async def close(self) -> None:
+        """Дописывает остаток очереди при остановке приложения."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
+
+
+async def write_token_counts(counts: dict[uuid.UUID, int]) -> None:
+    """Пакетный UPDATE token_count по первичному ключу."""
+    async with async_session_factory() as session:
+        await session.execute(
+            update(Message),
+            [{"id": message_id, "token_count": count} for message_id, count in counts.items()],
+        )
+        await session.commit()
+
+
+async def backfill_token_counts(chunk_size: int = 1000) -> int:
+    """
+    Заполняет token_count у исторических сообщений.
+
+    Идёт по messages в порядке id чанками (keyset pagination),
+    без OFFSET и без длинных транзакций.
+
+    Returns:
+        Количество обновлённых сообщений
+    """
+    last_id: uuid.UUID | None = None
+    updated = 0
+
+    while True:
+        async with async_session_factory() as session:
+            query = (
+                select(Message.id, Message.content)
+                .where(Message.token_count.is_(None))
+                .order_by(Message.id)
+                .limit(chunk_size)
+            )
+            if last_id is not None:
+                query = query.where(Message.id > last_id)
+            rows = (await session.execute(query)).all()
+
+        if not rows:
+            return updated
+
+        await write_token_counts(
+            {message_id: estimate_tokens(content) for message_id, content in rows}
+        )
+        last_id = rows[-1][0]
+        updated += len(rows)
+        logger.info("token_count backfill: %d сообщений", updated)
+
+
+# Глобальный писатель счётчиков
+token_count_writer = TokenCountWriter(
+    batch_size=settings.TOKEN_COUNT_BATCH_SIZE,
+    flush_interval=settings.TOKEN_COUNT_FLUSH_INTERVAL_MS / 1000,
+)
+
+
+if __name__ == "__main__":
+    from core.database import close_db
+
+    async def _main() -> None:
+        try:
+            total = await backfill_token_counts(settings.TOKEN_COUNT_BACKFILL_CHUNK)
+            print(f"Обновлено сообщений: {total}")
+        finally:
+            await close_db()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,104 @@
+"""Тесты записи результатов пакетных заданий."""
+
+import asyncio
+import json
+import uuid
+
+from models.message import MessageRole
+from services import batch_jobs
+from services.batch_jobs import BatchChatContext, BatchJobManager
+
+
+class FakeSession:
+    """Сессия, которая запоминает закоммиченные строки вместо записи в БД."""
+
+    def __init__(self, committed: list[dict], fail_on: str | None):
+        self.committed = committed
+        self.fail_on = fail_on
+        self.rows: list[dict] = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, statement, rows):
+        if any(row["content"] == self.fail_on for row in rows):
+            raise RuntimeError("insert failed")
+        self.rows.extend(rows)
+
+    async def commit(self):
+        self.committed.extend(self.rows)
+
+
+def run_job(monkeypatch, prompts, insert_batch_size, fail_on=None, delays=None):
+    committed: list[dict] = []
+
+    async def stream_response(content, **kwargs):
+        await asyncio.sleep((delays or {}).get(content, 0))
+        yield f"ответ: {content}"
+
+    async def record_rows_activity(session, rows):
+        pass
+
+    monkeypatch.setattr(batch_jobs.gemini_service, "stream_response", stream_response)
+    monkeypatch.setattr(
+        batch_jobs, "async_session_factory", lambda: FakeSession(committed, fail_on)
+    )
+    monkeypatch.setattr(batch_jobs, "record_rows_activity", record_rows_activity)
+
+    chat_id = uuid.uuid4()
+
+    async def scenario():
+        manager = BatchJobManager(insert_batch_size=insert_batch_size, retention_seconds=60)
+        job = manager.start(
+            uuid.uuid4(),
+            [(chat_id, prompt) for prompt in prompts],
+            {chat_id: BatchChatContext("gemini-2.5-flash-lite", None, None, [])},
+            concurrency=len(prompts),
+        )
+        await job.task
+        return job
+
+    job = asyncio.run(scenario())
+    events = [json.loads(event) for event in job.events]
+    return job, events, committed
+
+
+def test_question_and_answer_rows_are_adjacent(monkeypatch):
+    prompts = ["первый", "второй", "третий", "четвёртый"]
+    delays = {"первый": 0.03, "второй": 0.0, "третий": 0.02, "четвёртый": 0.01}
+
+    job, _, committed = run_job(monkeypatch, prompts, insert_batch_size=4, delays=delays)
+
+    assert job.status == "complete"
+    assert job.completed == len(prompts)
+    ordered = sorted(committed, key=lambda row: row["created_at"])
+    assert len({row["created_at"] for row in ordered}) == len(ordered)
+    for question, answer in zip(ordered[::2], ordered[1::2]):
+        assert question["role"] == MessageRole.USER
+        assert answer["role"] == MessageRole.ASSISTANT
+        assert answer["content"] == f"ответ: {question['content']}"
+
+
+def test_failed_flush_marks_only_its_batch_failed(monkeypatch):
+    prompts = ["первый", "сломать", "третий"]
+    delays = {"первый": 0.0, "сломать": 0.01, "третий": 0.02}
+
+    job, events, committed = run_job(
+        monkeypatch, prompts, insert_batch_size=2, fail_on="сломать", delays=delays
+    )
+
+    assert job.status == "complete"
+    assert (job.completed, job.failed) == (2, 1)
+
+    errors = [event for event in events if event["type"] == "error"]
+    assert [event["index"] for event in errors] == [1]
+
+    results = [event for event in events if event["type"] == "result"]
+    assert sorted(event["index"] for event in results) == [0, 2]
+    committed_ids = {str(row["id"]) for row in committed}
+    assert all(event["message_id"] in committed_ids for event in results)
+
+    assert events[-1] == {"type": "done", "status": "complete", "completed": 2, "failed": 1}
@@ -0,0 +1,61 @@
+"""Тесты рассылки событий генерации подписчикам чата."""
+
+import asyncio
+import uuid
+
+from services.chat_hub import ChatHub
+from services.sse import encode_error_event
+
+
+def test_late_subscriber_gets_backlog_larger_than_its_queue_then_live_events():
+    hub = ChatHub(queue_size=2, keepalive_seconds=30)
+    chat_id = uuid.uuid4()
+    backlog = [f"event-{i}" for i in range(5)]
+
+    async def scenario():
+        subscription = hub.subscribe(chat_id, lambda: backlog)
+        try:
+            received = [await anext(subscription) for _ in backlog]
+            hub.publish(chat_id, "live")
+            received.append(await anext(subscription))
+        finally:
+            await subscription.aclose()
+        return received
+
+    assert asyncio.run(scenario()) == backlog + ["live"]
+    assert hub.subscriber_count(chat_id) == 0
+
+
+def test_slow_subscriber_is_dropped_without_affecting_others():
+    hub = ChatHub(queue_size=2, keepalive_seconds=30)
+    chat_id = uuid.uuid4()
+    left = []
+
+    async def scenario():
+        slow = hub.subscribe(chat_id, on_leave=lambda: left.append("slow"))
+        fast = hub.subscribe(chat_id)
+        # Регистрация подписчика происходит при первом шаге генератора
+        slow_first = asyncio.create_task(anext(slow))
+        fast_first = asyncio.create_task(anext(fast))
+        await asyncio.sleep(0)
+
+        fast_received = []
+        for i in range(4):
+            hub.publish(chat_id, f"event-{i}")
+            if i == 0:
+                fast_received.append(await fast_first)
+            else:
+                fast_received.append(await anext(fast))
+
+        slow_received = [await slow_first]
+        slow_received.extend([event async for event in slow])
+        await fast.aclose()
+        return slow_received, fast_received
+
+    slow_received, fast_received = asyncio.run(scenario())
+
+    assert fast_received == [f"event-{i}" for i in range(4)]
+    dropped_event = encode_error_event("Клиент не успевает читать события, подписка закрыта")
+    assert slow_received == ["event-0", dropped_event]
+    assert hub.dropped == 1
+    assert left == ["slow"]
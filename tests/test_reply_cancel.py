@@ -0,0 +1,93 @@
+"""Тесты отмены фоновой генерации ответа."""
+
+import asyncio
+import uuid
+
+from models.message import Message, MessageRole, MessageStatus
+from routers import chats
+from services.chat_hub import ChatHub
+from services.sse import INTERRUPTED_EVENT, encode_chunk_event
+from services.stream_registry import StreamRegistry
+
+
+class FakeCheckpointer:
+    def __init__(self):
+        self.content = ""
+        self.statuses: list[MessageStatus] = []
+
+    async def start(self) -> None:
+        pass
+
+    async def append(self, chunk: str) -> None:
+        self.content += chunk
+
+    async def finish(self, status: MessageStatus, token_count: int | None = None) -> int:
+        self.statuses.append(status)
+        return 0
+
+
+def test_cancelled_generation_publishes_interrupted_event_to_chat_subscribers(monkeypatch):
+    checkpointer = FakeCheckpointer()
+    upstream_closed = []
+
+    async def stream_response(message, **kwargs):
+        try:
+            yield "Привет"
+            await asyncio.Event().wait()
+        finally:
+            upstream_closed.append(True)
+
+    monkeypatch.setattr(chats, "create_checkpointer", lambda chat_id: checkpointer)
+    monkeypatch.setattr(chats.gemini_service, "stream_response", stream_response)
+
+    chat_id = uuid.uuid4()
+    user_id = uuid.uuid4()
+    user_message = Message(
+        id=uuid.uuid4(),
+        chat_id=chat_id,
+        role=MessageRole.USER,
+        content="Привет",
+        status=MessageStatus.COMPLETE,
+    )
+
+    async def scenario():
+        registry = StreamRegistry(
+            buffer_size=64,
+            grace_seconds=0,
+            retention_seconds=60,
+            hub=ChatHub(queue_size=16, keepalive_seconds=30),
+        )
+        stream = registry.start(
+            chat_id,
+            user_id,
+            lambda stream: chats.generate_reply(
+                stream,
+                chat_id=chat_id,
+                user_id=user_id,
+                user_message=user_message,
+                model="gemini-2.5-flash-lite",
+                api_key=None,
+                system_prompt=None,
+                history=[],
+                coalesce_window=0,
+                coalesce_bytes=1024,
+            ),
+        )
+        subscription = registry.subscribe_chat(chat_id)
+        received = []
+        try:
+            received.append(await asyncio.wait_for(anext(subscription), timeout=1))
+            stream.task.cancel()
+            received.append(await asyncio.wait_for(anext(subscription), timeout=1))
+            await asyncio.gather(stream.task, return_exceptions=True)
+        finally:
+            await subscription.aclose()
+        return received, [event for _, event in stream.events], stream.task.cancelled()
+
+    received, buffered, cancelled = asyncio.run(scenario())
+
+    assert received == [encode_chunk_event("Привет"), INTERRUPTED_EVENT]
+    assert buffered[-1] == INTERRUPTED_EVENT
+    assert cancelled
+    assert checkpointer.statuses == [MessageStatus.INTERRUPTED]
+    assert upstream_closed == [True]
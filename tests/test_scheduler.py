@@ -0,0 +1,96 @@
+"""Тесты допуска запросов планировщиком Gemini."""
+
+import asyncio
+
+from services.scheduler import GeminiScheduler, SchedulerRejected
+
+
+def make_scheduler(rpm: int, max_queue_depth: int) -> GeminiScheduler:
+    return GeminiScheduler(
+        enabled=True,
+        rpm_limit=rpm,
+        tpm_limit=1_000_000,
+        max_queue_depth=max_queue_depth,
+    )
+
+
+def test_same_tick_burst_within_rpm_is_admitted_without_queue():
+    async def scenario():
+        scheduler = make_scheduler(rpm=60, max_queue_depth=1)
+        try:
+            results = await asyncio.gather(
+                *(scheduler.acquire("key", f"user-{i}", tokens=10) for i in range(60)),
+                return_exceptions=True,
+            )
+            return results, scheduler.stats()
+        finally:
+            await scheduler.close()
+
+    results, stats = asyncio.run(scenario())
+
+    assert results == [None] * 60
+    assert stats["admitted"] == 60
+    assert stats["rejected"] == 0
+    assert stats["wait_seconds_max"] == 0.0
+
+
+def test_queue_depth_counts_only_requests_waiting_for_limits():
+    async def scenario():
+        scheduler = make_scheduler(rpm=5, max_queue_depth=2)
+        tasks = [
+            asyncio.create_task(scheduler.acquire("key", "user", tokens=10))
+            for _ in range(8)
+        ]
+        try:
+            await asyncio.sleep(0.05)
+            admitted = sum(1 for t in tasks if t.done() and t.exception() is None)
+            rejected = [t for t in tasks if t.done() and t.exception() is not None]
+            pending = sum(1 for t in tasks if not t.done())
+            return admitted, rejected, pending, scheduler.stats()
+        finally:
+            await scheduler.close()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    admitted, rejected, pending, stats = asyncio.run(scenario())
+
+    assert admitted == 5
+    assert pending == 2
+    assert len(rejected) == 1
+    assert isinstance(rejected[0].exception(), SchedulerRejected)
+    assert stats["queue_depth"] == 2
+
+
+def test_cancelled_waiter_frees_queue_slot():
+    async def scenario():
+        scheduler = make_scheduler(rpm=1, max_queue_depth=1)
+        try:
+            await scheduler.acquire("key", "user", tokens=10)
+            queued = asyncio.create_task(scheduler.acquire("key", "user", tokens=10))
+            await asyncio.sleep(0)
+            queued.cancel()
+            await asyncio.gather(queued, return_exceptions=True)
+
+            replacement = asyncio.create_task(scheduler.acquire("key", "user", tokens=10))
+            await asyncio.sleep(0.01)
+            return replacement.done(), scheduler.stats()
+        finally:
+            await scheduler.close()
+
+    replacement_done, stats = asyncio.run(scenario())
+
+    assert not replacement_done
+    assert stats["rejected"] == 0
+    assert stats["queue_depth"] == 1
+
+
+def test_disabled_scheduler_admits_everything():
+    scheduler = make_scheduler(rpm=1, max_queue_depth=0)
+    scheduler.enabled = False
+
+    async def scenario():
+        for _ in range(5):
+            await scheduler.acquire("key", "user", tokens=10)
+
+    asyncio.run(scenario())
+    assert scheduler.admitted == 0
+
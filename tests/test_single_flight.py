@@ -0,0 +1,63 @@
+"""Тесты объединения одинаковых одновременных запросов к Gemini."""
+
+import asyncio
+
+from core.config import settings
+from services.completion_cache import completion_cache
+from services.gemini_service import GeminiService, gemini_service
+from services.token_accounting import TokenUsage
+
+
+def patch_upstream(monkeypatch) -> list[str | None]:
+    """Подменяет upstream поток и возвращает список ключей, с которыми он вызывался."""
+    calls: list[str | None] = []
+
+    async def stream_resilient(
+        self, message, model_name, api_key, system_prompt, history, user_id=None, usage=None
+    ):
+        calls.append(api_key)
+        yield "Привет, "
+        await asyncio.sleep(0.01)
+        usage.prompt_tokens = 5
+        usage.completion_tokens = 2
+        yield "мир"
+
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_ENABLED", True)
+    monkeypatch.setattr(completion_cache, "enabled", False)
+    monkeypatch.setattr(GeminiService, "_stream_resilient", stream_resilient)
+    monkeypatch.setattr(gemini_service, "_in_flight", {})
+    return calls
+
+
+async def collect(api_key: str | None, usage: TokenUsage | None = None) -> str:
+    chunks = [
+        chunk
+        async for chunk in gemini_service.stream_response("Привет", api_key=api_key, usage=usage)
+    ]
+    return "".join(chunks)
+
+
+def test_identical_requests_share_one_upstream_stream(monkeypatch):
+    calls = patch_upstream(monkeypatch)
+    usages = [TokenUsage() for _ in range(3)]
+
+    async def scenario():
+        return await asyncio.gather(*(collect("key-a", usage) for usage in usages))
+
+    results = asyncio.run(scenario())
+
+    assert results == ["Привет, мир"] * 3
+    assert calls == ["key-a"]
+    assert all((u.prompt_tokens, u.completion_tokens) == (5, 2) for u in usages)
+
+
+def test_requests_with_different_api_keys_are_not_shared(monkeypatch):
+    calls = patch_upstream(monkeypatch)
+
+    async def scenario():
+        return await asyncio.gather(collect("key-a"), collect("key-b"), collect("key-a"))
+
+    results = asyncio.run(scenario())
+
+    assert results == ["Привет, мир"] * 3
+    assert sorted(calls) == ["key-a", "key-b"]
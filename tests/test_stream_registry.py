@@ -0,0 +1,70 @@
+"""Тесты возобновляемых потоков генерации."""
+
+import asyncio
+import uuid
+
+import pytest
+
+from services.stream_registry import StreamGone, StreamRegistry
+
+
+def make_registry(buffer_size: int = 64) -> StreamRegistry:
+    return StreamRegistry(buffer_size=buffer_size, grace_seconds=0, retention_seconds=60)
+
+
+def run_stream(registry: StreamRegistry, events: list[str], last_event_id: int) -> list[str]:
+    async def scenario():
+        release = asyncio.Event()
+
+        async def producer(stream):
+            for event in events:
+                stream.publish(event)
+            await release.wait()
+            stream.publish("live")
+
+        stream = registry.start(uuid.uuid4(), uuid.uuid4(), producer)
+        await asyncio.sleep(0)
+
+        received = []
+        subscription = registry.subscribe(stream, last_event_id)
+        try:
+            for _ in range(len(events) - last_event_id):
+                received.append(await anext(subscription))
+            release.set()
+            received.append(await anext(subscription))
+            await stream.task
+            received.extend([event async for event in subscription])
+        finally:
+            await subscription.aclose()
+        return received
+
+    return asyncio.run(scenario())
+
+
+def test_reconnect_replays_events_after_last_event_id_then_continues_live():
+    received = run_stream(make_registry(), ["a", "b", "c"], last_event_id=1)
+
+    assert received == ["id: 2\nb", "id: 3\nc", "id: 4\nlive"]
+
+
+def test_reconnect_behind_ring_buffer_raises_stream_gone():
+    with pytest.raises(StreamGone):
+        run_stream(make_registry(buffer_size=2), ["a", "b", "c", "d"], last_event_id=0)
+
+
+def test_stream_is_visible_only_to_its_owner():
+    registry = make_registry()
+    owner = uuid.uuid4()
+
+    async def scenario():
+        async def producer(stream):
+            stream.publish("a")
+
+        stream = registry.start(uuid.uuid4(), owner, producer)
+        await stream.task
+        return stream
+
+    stream = asyncio.run(scenario())
+
+    assert registry.get(stream.id, owner) is stream
+    assert registry.get(stream.id, uuid.uuid4()) is None